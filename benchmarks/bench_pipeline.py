@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+流水线基准：启动本地模拟站点（mock_site.py），以无头浏览器对其完整运行 run_single_url / run_batch / run_list_page
+（浏览器启动、导航与 CF 处理、解析、直链选优、下载），分阶段统计耗时，离线发现流水线级的性能回归。
+浏览器中对目标站的请求被改道到模拟站点，页面、Cookies 与解析逻辑与正式运行一致；需要 Playwright 与本机 Chrome。
+
+    python benchmarks/bench_pipeline.py                              # 打印各场景与各阶段耗时
+    python benchmarks/bench_pipeline.py --challenge                  # 每个新会话先经过模拟 CF 验证页
+    python benchmarks/bench_pipeline.py --save base.json             # 保存结果作为基线
+    python benchmarks/bench_pipeline.py --baseline base.json --check # 比基线慢超过容差或文件不完整时返回非 0
+"""
+import argparse
+import asyncio
+import atexit
+import builtins
+import functools
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+import mock_site  # noqa: E402
+
+# 探测缓存、主机画像等状态文件放到临时目录，基准之间互不影响，也不污染工作目录（须在导入包之前设置）
+_STATE_DIR = Path(tempfile.mkdtemp(prefix="wangver-bench-"))
+atexit.register(shutil.rmtree, _STATE_DIR, True)
+for _name, _file in (
+    ("WANGVER_PROBE_CACHE", "probe_cache.json"),
+    ("WANGVER_HOST_PROFILES", "host_profiles.json"),
+    ("WANGVER_SYNC_STATE", "sync_state.json"),
+    ("WANGVER_JOURNAL", "batch_journal.jsonl"),
+):
+    os.environ[_name] = str(_STATE_DIR / _file)
+
+from wangver_h_downloader import app  # noqa: E402
+from wangver_h_downloader.browser_cf import BrowserCFHandler  # noqa: E402
+
+SCENARIOS = ("single", "batch", "list")
+
+
+class StageTimer:
+    """替换流水线各阶段的函数/方法，记录每次调用耗时（并发调用各自计时）。"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def reset(self) -> None:
+        self.samples = defaultdict(list)
+
+    def wrap(self, owner, attr: str, stage: str) -> None:
+        original = getattr(owner, attr)
+        timer = self
+
+        if asyncio.iscoroutinefunction(original):
+            @functools.wraps(original)
+            async def timed(*args, **kwargs):
+                t0 = time.perf_counter()
+                try:
+                    return await original(*args, **kwargs)
+                finally:
+                    timer.samples[stage].append(time.perf_counter() - t0)
+        else:
+            @functools.wraps(original)
+            def timed(*args, **kwargs):
+                t0 = time.perf_counter()
+                try:
+                    return original(*args, **kwargs)
+                finally:
+                    timer.samples[stage].append(time.perf_counter() - t0)
+
+        setattr(owner, attr, timed)
+
+    def summary(self) -> dict:
+        return {
+            stage: {"count": len(v), "total": sum(v), "mean": statistics.mean(v), "max": max(v)}
+            for stage, v in self.samples.items()
+        }
+
+
+def install(site_url: str, timer: StageTimer) -> None:
+    """浏览器启动后把对目标站的请求改道到模拟站点，并给各阶段挂上计时。"""
+    original_start = BrowserCFHandler.start
+
+    async def start(self):
+        await original_start(self)
+
+        async def to_mock(route):
+            url = route.request.url
+            # 协议不同（https -> http），不能用 continue_ 改写，由 Playwright 代为请求后原样返回
+            response = await route.fetch(url=site_url + url[len(mock_site.SITE):])
+            await route.fulfill(response=response)
+
+        await self._context.route(f"{mock_site.SITE}/**", to_mock)
+
+    BrowserCFHandler.start = start
+    timer.wrap(BrowserCFHandler, "start", "browser start")
+    timer.wrap(BrowserCFHandler, "goto_and_handle_cf", "navigate + cf")
+    timer.wrap(BrowserCFHandler, "fetch_in_new_tab", "fetch tab")
+    timer.wrap(BrowserCFHandler, "close", "browser close")
+    timer.wrap(app, "parse_single_page_html", "parse")
+    timer.wrap(app, "_pick_source", "pick source")
+    timer.wrap(app, "_with_size", "probe size")
+    timer.wrap(app, "_download", "download")
+    # CF 提示中的“按 Enter 继续”自动确认
+    builtins.input = lambda *a, **k: ""
+
+
+async def run_scenario(name: str, args, output_dir: Path, profile: Path) -> int:
+    """运行一个场景，返回预期下载的文件数。"""
+    site = mock_site.SITE
+    common = dict(chunk_threads=args.chunk_threads, headless=True, user_data_dir=profile)
+    if name == "single":
+        await app.run_single_url(f"{site}/watch?v=1", output_dir, **common)
+        return 1
+    if name == "batch":
+        urls = [f"{site}/watch?v={i}" for i in range(1, args.videos + 1)]
+        await app.run_batch(urls, output_dir, max_concurrent_tasks=args.concurrency, **common)
+        return len(urls)
+    await app.run_list_page(f"{site}/search?query=mock", output_dir, max_concurrent_tasks=args.concurrency, **common)
+    return args.videos
+
+
+def check_outputs(output_dir: Path, expected: int, size: int) -> bool:
+    files = [p for p in output_dir.iterdir() if p.is_file() and p.suffix == ".mp4"]
+    return len(files) == expected and all(p.stat().st_size == size for p in files)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="下载流水线基准（本地模拟站点 + 无头浏览器）")
+    ap.add_argument("scenarios", nargs="*", metavar="SCENARIO", help=f"要运行的场景（默认全部）：{' / '.join(SCENARIOS)}")
+    ap.add_argument("-n", "--repeat", type=int, default=1, help="每个场景重复次数（总耗时取中位数）")
+    ap.add_argument("--videos", type=int, default=6, help="批量/列表场景的视频数")
+    ap.add_argument("--per-page", type=int, default=3, help="模拟搜索页每页视频数")
+    ap.add_argument("--media-mb", type=float, default=8, help="每个视频（1080p）的大小（MB）")
+    ap.add_argument("--media-rate-mb", type=float, default=0, help="模拟站点每条连接限速（MB/s，0 为不限）")
+    ap.add_argument("--page-latency", type=float, default=0.05, help="模拟页面响应延迟（秒）")
+    ap.add_argument("--challenge", action="store_true", help="新会话先经过模拟 CF 验证页")
+    ap.add_argument("-c", "--concurrency", type=int, default=app.DEFAULT_MAX_CONCURRENT_TASKS, help="同时下载数")
+    ap.add_argument("-t", "--chunk-threads", type=int, default=app.DEFAULT_CHUNK_THREADS, help="单文件分块并发数")
+    ap.add_argument("--save", type=Path, help="结果保存为 JSON（可作为之后的基线）")
+    ap.add_argument("--baseline", type=Path, help="与此前保存的结果比较总耗时")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="允许比基线慢的比例（默认 0.2）")
+    ap.add_argument("--check", action="store_true", help="超出基线容差或下载文件不完整时以非 0 退出")
+    ap.add_argument("-v", "--verbose", action="store_true", help="显示下载器自身的界面输出")
+    args = ap.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        ap.error(f"未知场景: {', '.join(sorted(unknown))}")
+    args.scenarios = args.scenarios or list(SCENARIOS)
+
+    config = mock_site.MockConfig(
+        videos=args.videos,
+        per_page=args.per_page,
+        media_bytes=int(args.media_mb * 1024 ** 2),
+        challenge=args.challenge,
+        page_latency=args.page_latency,
+        media_rate=int(args.media_rate_mb * 1024 ** 2),
+    )
+    server = mock_site.serve(config)
+    timer = StageTimer()
+    install(server.base_url, timer)
+    app.console.quiet = not args.verbose
+    size = mock_site.media_size(config, 1080)
+
+    results, failed = {}, False
+    try:
+        for name in args.scenarios:
+            totals, complete = [], True
+            timer.reset()
+            for _ in range(args.repeat):
+                # 每次运行用全新的浏览器配置与输出目录：不复用上次的 CF Cookies，也不跳过已下载的文件
+                work = Path(tempfile.mkdtemp(dir=_STATE_DIR))
+                output_dir = work / "out"
+                output_dir.mkdir()
+                t0 = time.perf_counter()
+                expected = asyncio.run(run_scenario(name, args, output_dir, work / "profile"))
+                totals.append(time.perf_counter() - t0)
+                complete &= check_outputs(output_dir, expected, size)
+                shutil.rmtree(work, ignore_errors=True)
+            results[name] = {"total": statistics.median(totals), "complete": complete, "stages": timer.summary()}
+            failed |= not complete
+    finally:
+        server.shutdown()
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))["scenarios"] if args.baseline else {}
+    print(f"{'场景 / 阶段':<18}{'次数':>6}{'总耗时':>10}{'平均':>10}{'最长':>10}  说明")
+    for name, r in results.items():
+        note = "" if r["complete"] else "文件不完整  ✗"
+        base = baseline.get(name, {}).get("total")
+        if base:
+            ratio = r["total"] / base - 1
+            regressed = ratio > args.tolerance
+            failed |= regressed
+            note = f"{note}  基线 {base:.2f}s（{ratio:+.0%}）{'  ✗' if regressed else ''}".strip()
+        print(f"{name:<18}{args.repeat:>6}{r['total']:>9.2f}s{'':>10}{'':>10}  {note}")
+        for stage, s in r["stages"].items():
+            print(f"  {stage:<16}{s['count']:>6}{s['total']:>9.2f}s{s['mean']:>9.3f}s{s['max']:>9.3f}s")
+
+    if args.save:
+        args.save.write_text(json.dumps({
+            "config": {k: getattr(config, k) for k in ("videos", "per_page", "media_bytes", "challenge", "page_latency", "media_rate")},
+            "scenarios": results,
+        }, ensure_ascii=False, indent=1), encoding="utf-8")
+    if args.check and failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+启动耗时基准：在全新子进程中测量各命令路径的导入/启动耗时，并检查重量级依赖未被提前加载。
+
+    python benchmarks/bench_startup.py              # 打印结果
+    python benchmarks/bench_startup.py --check      # 超出预算或加载了禁止的模块时返回非 0（CI 用）
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# 各场景：要执行的代码、该场景下不应出现的重量级模块、进程内导入耗时预算（毫秒）
+SCENARIOS = {
+    "help": (
+        "import sys; sys.argv = ['cli', '--help']\n"
+        "from wangver_h_downloader.cli import main\n"
+        "try:\n    main()\nexcept SystemExit:\n    pass\n",
+        ("rich", "playwright", "httpx", "aiofiles", "asyncio"),
+        60,
+    ),
+    "batch-parse": (
+        "import tempfile, pathlib\n"
+        "from wangver_h_downloader.parser import collect_urls_from_batch_file\n"
+        "p = pathlib.Path(tempfile.mkdtemp()) / 'urls.txt'\n"
+        "p.write_text(''.join(f'https://hanime1.me/watch?v={i}\\n' for i in range(100)))\n"
+        "assert len(collect_urls_from_batch_file(p)) == 100\n",
+        ("rich", "playwright", "httpx", "aiofiles"),
+        60,
+    ),
+    "resolve-only": (
+        "from wangver_h_downloader import app, browser_cf, parser\n",
+        ("httpx", "aiofiles"),
+        300,
+    ),
+}
+
+# 检查代码：打印本进程已加载的禁止模块与自身耗时
+_PROBE = (
+    "import sys, time, json\n"
+    "_t0 = time.perf_counter()\n"
+    "{code}"
+    "_ms = (time.perf_counter() - _t0) * 1000\n"
+    "print('\\n@@' + json.dumps({{'ms': _ms, 'loaded': [m for m in {forbidden!r} if m in sys.modules]}}))\n"
+)
+
+
+def run_scenario(code: str, forbidden: tuple) -> tuple[float, float, list]:
+    """返回 (进程总耗时 ms, 进程内导入耗时 ms, 已加载的禁止模块)。"""
+    script = _PROBE.format(code=code, forbidden=forbidden)
+    t0 = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    ).stdout
+    wall = (time.perf_counter() - t0) * 1000
+    probe = json.loads(out.rsplit("@@", 1)[1])
+    return wall, probe["ms"], probe["loaded"]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="CLI 启动耗时基准")
+    ap.add_argument("-n", "--repeat", type=int, default=5, help="每个场景重复次数（取中位数）")
+    ap.add_argument("--budget-scale", type=float, default=1.0, help="预算倍率（较慢的机器可调大）")
+    ap.add_argument("--check", action="store_true", help="超出预算或加载了禁止模块时以非 0 退出")
+    args = ap.parse_args()
+
+    failed = False
+    print(f"{'场景':<14}{'进程总耗时':>12}{'导入耗时':>12}  禁止模块")
+    for name, (code, forbidden, budget) in SCENARIOS.items():
+        walls, imports, loaded = [], [], []
+        for _ in range(args.repeat):
+            wall, ms, loaded = run_scenario(code, forbidden)
+            walls.append(wall)
+            imports.append(ms)
+        wall_med, import_med = statistics.median(walls), statistics.median(imports)
+        bad = bool(loaded) or import_med > budget * args.budget_scale
+        failed |= bad
+        print(f"{name:<14}{wall_med:>10.1f}ms{import_med:>10.1f}ms  {', '.join(loaded) or '-'}{'  ✗' if bad else ''}")
+    if args.check and failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
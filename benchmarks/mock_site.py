@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+本地模拟站点（流水线基准与离线回归用）：模仿目标站的视频页（含多画质 <source> 与 #video-playlist-wrapper 播放列表）、
+分页搜索页、可选的 CF 验证页（403 + CF_INDICATOR_TEXTS 特征，数秒后自动写入 cf_clearance 并刷新），
+以及支持 Range 的媒体文件。页面中的链接使用真实站点地址，由基准脚本在浏览器中改道到本站点。
+
+    python benchmarks/mock_site.py --port 8765 --videos 12 --media-mb 8 --challenge
+"""
+import argparse
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+SITE = "https://hanime1.me"
+CF_TEXT = "Just a moment"
+
+
+@dataclass
+class MockConfig:
+    videos: int = 12                  # 视频总数（watch?v=1..videos）
+    per_page: int = 6                 # 搜索页每页视频数
+    media_bytes: int = 8 * 1024 * 1024   # 1080p 媒体大小；其它画质按比例缩小
+    challenge: bool = False           # 未带 cf_clearance 的页面请求先返回验证页
+    challenge_delay: float = 1.0      # 验证页自动通过前的秒数
+    page_latency: float = 0.05        # 页面响应延迟（秒），模拟站点与代理往返
+    media_rate: int = 0               # 每条连接的媒体限速（字节/秒，0 为不限）
+
+
+_BLOCK = bytes(range(256)) * 4096   # 1 MiB 重复样式，媒体内容按偏移可重算，便于校验
+
+
+def media_content(size: int) -> bytes:
+    """媒体文件内容（确定性，按偏移取样式）。"""
+    return (_BLOCK * (size // len(_BLOCK) + 1))[:size]
+
+
+def media_size(config: MockConfig, quality: int) -> int:
+    return config.media_bytes * quality // 1080
+
+
+def _watch_html(config: MockConfig, base: str, n: int) -> str:
+    sources = "\n".join(
+        f'<source src="{base}/media/{n}-{q}p.mp4" type="video/mp4" size="{q}">' for q in (1080, 720)
+    )
+    playlist = "\n".join(
+        f'<div class="item"><a class="overlay" href="{SITE}/watch?v={i}"></a><div>Mock Video {i:03d}</div></div>'
+        for i in range(1, config.videos + 1)
+    )
+    return (
+        f"<html><head><title>Mock Video {n:03d} - H動漫裏番線上看 - Hanime1.me</title></head><body>"
+        f'<video id="player">{sources}</video>'
+        f'<div id="video-playlist-wrapper">{playlist}</div>'
+        "</body></html>"
+    )
+
+
+def _search_html(config: MockConfig, query: str, page: int) -> str:
+    first = (page - 1) * config.per_page + 1
+    last = min(config.videos, page * config.per_page)
+    cards = "\n".join(
+        f'<div class="card"><a href="{SITE}/watch?v={i}">Mock Video {i:03d}</a></div>' for i in range(first, last + 1)
+    )
+    pages = -(-config.videos // config.per_page)
+    pager = " ".join(f'<a href="{SITE}/search?query={query}&amp;page={p}">{p}</a>' for p in range(1, pages + 1))
+    return (
+        f"<html><head><title>搜索 {query} 第 {page} 页</title></head><body>"
+        f'<div class="results">{cards}</div><div class="pagination">{pager}</div>'
+        "</body></html>"
+    )
+
+
+def _challenge_html(delay: float) -> str:
+    return (
+        f"<html><head><title>{CF_TEXT}...</title></head><body>"
+        f'<div id="challenge-running">{CF_TEXT}... Checking your browser</div>'
+        "<script>setTimeout(function () {"
+        'document.cookie = "cf_clearance=mock; path=/; max-age=3600"; location.reload();'
+        f"}}, {int(delay * 1000)});</script>"
+        "</body></html>"
+    )
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "MockServer"
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Optional[dict] = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _page(self, html: str) -> None:
+        config = self.server.config
+        if config.page_latency:
+            time.sleep(config.page_latency)
+        if config.challenge and "cf_clearance=" not in (self.headers.get("Cookie") or ""):
+            self._send(403, _challenge_html(config.challenge_delay).encode(), "text/html; charset=utf-8")
+            return
+        self._send(200, html.encode(), "text/html; charset=utf-8")
+
+    def do_HEAD(self) -> None:
+        self.do_GET()
+
+    def do_GET(self) -> None:
+        config = self.server.config
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == "/watch":
+            n = int((query.get("v") or ["0"])[0] or 0)
+            if 1 <= n <= config.videos:
+                self._page(_watch_html(config, self.server.base_url, n))
+                return
+        elif url.path == "/search":
+            page = int((query.get("page") or ["1"])[0] or 1)
+            self._page(_search_html(config, (query.get("query") or [""])[0], page))
+            return
+        else:
+            m = re.fullmatch(r"/media/(\d+)-(\d+)p\.mp4", url.path)
+            if m:
+                self._media(media_size(config, int(m.group(2))))
+                return
+        self._send(404, b"not found", "text/plain")
+
+    def _media(self, size: int) -> None:
+        start, end, status = 0, size - 1, 200
+        m = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range") or "")
+        if m:
+            start = int(m.group(1))
+            end = min(int(m.group(2)) if m.group(2) else size - 1, size - 1)
+            status = 206
+        if start >= size:
+            self._send(416, b"", "video/mp4", {"Content-Range": f"bytes */{size}"})
+            return
+        self.send_response(status)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if self.command == "HEAD":
+            return
+        data = memoryview(self.server.media(size))[start:end + 1]
+        rate = self.server.config.media_rate
+        step = 64 * 1024
+        try:
+            for i in range(0, len(data), step):
+                self.wfile.write(data[i:i + step])
+                if rate:
+                    time.sleep(step / rate)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], config: MockConfig):
+        super().__init__(address, MockHandler)
+        self.config = config
+        self._media_cache: dict = {}
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def media(self, size: int) -> bytes:
+        if size not in self._media_cache:
+            self._media_cache[size] = media_content(size)
+        return self._media_cache[size]
+
+
+def serve(config: Optional[MockConfig] = None, host: str = "127.0.0.1", port: int = 0) -> MockServer:
+    """在后台线程启动模拟站点，返回服务器（base_url 为其地址，用完调用 shutdown()）。"""
+    server = MockServer((host, port), config or MockConfig())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="本地模拟站点")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--videos", type=int, default=MockConfig.videos)
+    ap.add_argument("--per-page", type=int, default=MockConfig.per_page)
+    ap.add_argument("--media-mb", type=float, default=MockConfig.media_bytes / 1024 ** 2)
+    ap.add_argument("--challenge", action="store_true", help="未带 cf_clearance 的页面请求先返回模拟 CF 验证页")
+    ap.add_argument("--challenge-delay", type=float, default=MockConfig.challenge_delay)
+    ap.add_argument("--page-latency", type=float, default=MockConfig.page_latency)
+    ap.add_argument("--media-rate-mb", type=float, default=0, help="每条连接的媒体限速（MB/s，0 为不限）")
+    args = ap.parse_args()
+    config = MockConfig(
+        videos=args.videos,
+        per_page=args.per_page,
+        media_bytes=int(args.media_mb * 1024 ** 2),
+        challenge=args.challenge,
+        challenge_delay=args.challenge_delay,
+        page_latency=args.page_latency,
+        media_rate=int(args.media_rate_mb * 1024 ** 2),
+    )
+    server = MockServer((args.host, args.port), config)
+    print(f"模拟站点: {server.base_url}（视频 1..{config.videos}，搜索页 /search?query=mock）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
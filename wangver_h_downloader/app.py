@@ -0,0 +1,1508 @@
+"""
+Rich 终端界面与下载流程：主菜单、交互式流程、统一进度与结果展示。
+由 cli.py 按需导入；浏览器（Playwright）与下载引擎（httpx）在流程真正需要时才加载。
+"""
+import asyncio
+import itertools
+import sys
+import time
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import TYPE_CHECKING, AsyncIterable, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from rich.console import Console, Group
+from rich.panel import Panel
+from rich.progress import (
+    Progress,
+    SpinnerColumn,
+    TextColumn,
+    BarColumn,
+    DownloadColumn,
+    TaskProgressColumn,
+    TimeRemainingColumn,
+)
+from rich.prompt import Prompt, IntPrompt, Confirm
+from rich.rule import Rule
+from rich.table import Table
+from rich.text import Text
+from rich import box
+
+from . import events
+from . import ui_theme as theme
+from .config import (
+    DEFAULT_OUTPUT_DIR,
+    DEFAULT_USER_DATA_DIR,
+    DEFAULT_MAX_CONCURRENT_TASKS,
+    DEFAULT_CHUNK_THREADS,
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_MEMORY_BUDGET,
+    DEFAULT_QUALITY,
+    DEFAULT_BROWSER_IDLE_TIMEOUT,
+    DEFAULT_MAX_LIST_PAGES,
+    DEFAULT_SCHEDULE_POLICY,
+    DEFAULT_MIN_FREE_BYTES,
+    DEFAULT_POSTPROCESS_STEPS,
+    DEFAULT_POSTPROCESS_WORKERS,
+    DEFAULT_DOWNLOAD_BACKEND,
+    DEFAULT_RESOLVE_CONCURRENCY,
+    DEFAULT_SCRATCH_DIR,
+    DEFAULT_MOVE_WORKERS,
+    PART_SUFFIX,
+    STREAM_CHUNK_SIZE,
+    RESOLVE_AHEAD,
+    QUEUE_HEARTBEAT_SECONDS,
+    QUEUE_POLL_INTERVAL,
+    QUALITY_OPTIONS,
+    TARGET_BASE_URL,
+)
+from .parser import (
+    VideoTarget,
+    parse_single_page_html,
+    collect_urls_from_batch_file,
+    iter_batch_urls,
+    extract_list_page_video_links,
+    _is_list_page,
+)
+from .sync_state import SyncState, STATUS_DONE, STATUS_FAILED
+from .file_manager import build_output_path, find_part_file, part_bytes_done
+
+if TYPE_CHECKING:
+    from .browser_cf import BrowserSession, SessionCredentials
+    from .streaming import StreamState
+    from .work_queue import SharedWorkQueue
+    from .calibrate import HostProfile
+    from .journal import BatchJournal
+
+
+# 全局控制台（单例）
+console = Console(force_terminal=True, no_color=False)
+
+
+def _cf_alert_rich(message: str) -> None:
+    """CF 触发时在 Rich 控制台输出醒目提示（事件流模式下同时输出 cf_challenge 事件）。"""
+    events.emit(events.EVENT_CF_CHALLENGE, message=message)
+    console.print()
+    console.print(Panel(
+        Text(message, style="bold red"),
+        title="[bold]🚨 Cloudflare 拦截[/bold]",
+        border_style="red",
+        box=box.DOUBLE,
+        padding=(1, 2),
+    ))
+    console.print("[dim]请在弹出窗口中完成验证后，回到此处按 Enter 继续。[/]")
+    console.print()
+
+
+def show_banner() -> None:
+    """显示应用横幅。"""
+    title = Text("WangVer H-Downloader", style="bold magenta")
+    subtitle = Text("专为 hanime1.me 定制 · 浏览器过 CF + 多线程下载", style="dim white")
+    console.print()
+    console.print(Rule(style="cyan"))
+    console.print(Panel(
+        Group(title, Text(), subtitle),
+        border_style="blue",
+        box=box.ROUNDED,
+        padding=(1, 3),
+    ))
+    console.print(Rule(style="cyan"))
+    console.print()
+
+
+def show_main_menu() -> str:
+    """显示主菜单并返回用户选择。"""
+    table = Table.grid(expand=True)
+    table.add_column(style="bold yellow", width=4)
+    table.add_column(style="dim white")
+    table.add_row("1", "单链接下载 — 输入一集视频页 URL")
+    table.add_row("2", "批量下载 — 从 .txt 文件导入多个链接")
+    table.add_row("3", "列表页下载 — 输入系列/列表页 URL 自动抓取全部")
+    table.add_row("4", "设置 — 输出目录、并发数、画质等")
+    table.add_row("0", "退出")
+    console.print(Panel(
+        table,
+        title="[bold blue] 请选择操作[/]",
+        border_style="blue",
+        box=box.ROUNDED,
+        padding=(1, 2),
+    ))
+    return Prompt.ask(
+        "[cyan]请输入选项[/]",
+        choices=["0", "1", "2", "3", "4"],
+        default="1",
+    )
+
+
+def prompt_settings(
+    default_output: Path,
+    default_max_tasks: int,
+    default_chunk_threads: int,
+    default_quality: str,
+) -> tuple:
+    """交互式设置并返回 (output_dir, max_tasks, chunk_threads, quality)。"""
+    console.print(Panel(
+        "[dim]修改以下设置（直接回车保留当前值）[/]",
+        border_style="blue",
+        box=box.ROUNDED,
+    ))
+    out = Prompt.ask("  输出目录", default=str(default_output))
+    output_dir = Path(out).expanduser().resolve()
+    output_dir.mkdir(parents=True, exist_ok=True)
+    max_tasks = IntPrompt.ask("  最大并行下载数", default=default_max_tasks)
+    chunk_threads = IntPrompt.ask("  单任务分块线程数", default=default_chunk_threads)
+    quality = Prompt.ask(
+        f"  画质 [{'/'.join(QUALITY_OPTIONS)}]",
+        default=default_quality,
+        choices=list(QUALITY_OPTIONS),
+    )
+    console.print("[green]已更新设置[/]")
+    return output_dir, max_tasks, chunk_threads, quality
+
+
+class _NullProgress:
+    """事件流模式下替代进度条：不渲染，省去 Rich 刷新开销。"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+    def add_task(self, *args, **kwargs) -> int:
+        return 0
+
+    def update(self, *args, **kwargs) -> None:
+        pass
+
+
+def create_progress(description: str = "下载中") -> Progress:
+    """创建统一风格的进度条；事件流模式下返回不渲染的替身。"""
+    if events.enabled():
+        return _NullProgress()
+    return Progress(
+        SpinnerColumn(style="cyan"),
+        TextColumn("[bold]{task.description}", style="cyan"),
+        BarColumn(bar_width=40, style="bar.back", complete_style="bar.complete"),
+        TaskProgressColumn(),
+        DownloadColumn(),
+        TimeRemainingColumn(),
+        console=console,
+        expand=True,
+    )
+
+
+def show_result_table(success: List[str], failed: List[str], output_dir: Path) -> None:
+    """用表格展示下载结果汇总。"""
+    table = Table(title="下载结果", box=box.ROUNDED, border_style="blue")
+    table.add_column("状态", style="bold", width=6)
+    table.add_column("文件 / 说明")
+    for name in success:
+        table.add_row("[green]成功[/]", name)
+    for name in failed:
+        table.add_row("[red]失败[/]", name)
+    if success:
+        table.add_row("[dim]保存位置[/]", str(output_dir), end_section=True)
+    console.print(Panel(table, border_style="blue", box=box.ROUNDED))
+    console.print()
+
+
+def show_usage() -> None:
+    """--no-ui 且未给出 URL 时，在帮助信息后展示用法示例。"""
+    console.print()
+    console.print(Panel(
+        "[dim]示例：[/]\n"
+        "  单集   python -m wangver_h_downloader.cli \"https://hanime1.me/watch/xxx\"\n"
+        "  批量   python -m wangver_h_downloader.cli -b urls.txt -o ./downloads\n"
+        "  列表   python -m wangver_h_downloader.cli \"https://hanime1.me/videos/...\"\n\n"
+        "[bold]直接运行不加参数将进入交互式菜单。[/]",
+        title="用法",
+        border_style="blue",
+        box=box.ROUNDED,
+    ))
+
+
+@dataclass
+class RunOptions:
+    """
+    下载流程的运行选项：由 cli 按命令行参数构建，传给各 run_* 流程并逐层传到解析、调度与下载；
+    未传入时使用默认值。
+    """
+    # 浏览器请求过滤（--no-block-requests 关闭）
+    block_requests: bool = True
+    # 解析后并发探测候选直链选优（--no-probe 关闭）
+    probe_sources: bool = True
+    # 批量任务调度策略与最低保留磁盘空间（--schedule / --min-free-gb）
+    schedule_policy: str = DEFAULT_SCHEDULE_POLICY
+    min_free_bytes: int = DEFAULT_MIN_FREE_BYTES
+    # 下载完成后的后处理步骤与进程数（--post / --post-workers）
+    post_steps: tuple = DEFAULT_POSTPROCESS_STEPS
+    post_workers: int = DEFAULT_POSTPROCESS_WORKERS
+    # 下载后端（--backend）及其构造参数（如 aria2 的 rpc_url / secret）
+    download_backend: str = DEFAULT_DOWNLOAD_BACKEND
+    backend_options: dict = field(default_factory=dict)
+    # 按主机套用 calibrate 测得的分块参数（显式指定 --chunk-threads 时关闭）
+    use_host_profiles: bool = True
+    # 得知直链主机后在后台预先解析 DNS、建立连接（--no-prewarm 关闭）
+    prewarm_connections: bool = True
+    # 全局在途内存预算（字节，0 为不限制；--memory-budget-mb）
+    memory_budget_bytes: int = DEFAULT_MEMORY_BUDGET
+    # 媒体下载线路（代理 URL，None 为系统/环境代理的默认线路；--proxy / --proxy-file）；
+    # 浏览器解析页面不受影响，始终走默认线路
+    download_proxies: Tuple[Optional[str], ...] = ()
+    # 本地暂存目录与后台搬运线程数（--scratch-dir / --move-workers）；None 为直接写输出目录
+    scratch_dir: Optional[Path] = DEFAULT_SCRATCH_DIR
+    move_workers: int = DEFAULT_MOVE_WORKERS
+
+
+async def run_single(
+    target: VideoTarget,
+    output_dir: Path,
+    credentials: Optional["SessionCredentials"],
+    chunk_threads: int = DEFAULT_CHUNK_THREADS,
+    stream_port: Optional[int] = None,
+    options: Optional[RunOptions] = None,
+) -> Optional[Path]:
+    """
+    单链接：根据已解析的 target 下载。
+    stream_port 不为 None 时边下边播：在本机该端口（0 为随机）提供播放地址，分块优先下载播放位置附近的区间；
+    下载完成后播放服务继续运行，交互终端中按 Enter 关闭。m3u8 直链不支持，照常下载。
+    options：运行选项（见 RunOptions），默认全部取默认值。
+    """
+    options = options or RunOptions()
+    console.print(Panel(
+        f"[cyan]{target.title}[/]\n[dim]{target.direct_url[:80]}...[/]",
+        title="解析结果",
+        border_style="blue",
+        box=box.ROUNDED,
+    ))
+    stream = server = None
+    if stream_port is not None:
+        if ".m3u8" in target.direct_url.lower():
+            console.print("[yellow]m3u8 直链不支持边下边播，改为普通下载。[/]")
+        else:
+            from .streaming import StreamServer, StreamState
+
+            stream = StreamState()
+            server = await StreamServer(
+                stream,
+                _final_path(target, output_dir).name,
+                on_error=lambda e: console.print(f"[yellow]播放服务出错: {e}[/]"),
+            ).start(stream_port)
+            console.print(Panel(
+                f"[cyan]{server.url}[/]\n[dim]用播放器打开，例如: mpv {server.url}[/]",
+                title="边下边播",
+                border_style="green",
+                box=box.ROUNDED,
+            ))
+            events.emit(events.EVENT_STREAMING, url=target.url, title=target.title, address=server.url)
+    try:
+        with create_progress(target.title) as progress:
+            task_id = progress.add_task(target.title, total=None)
+            received = [0]
+
+            def cb(n: int):
+                received[0] += n
+                progress.update(task_id, completed=received[0])
+
+            path = await _download(options, target, output_dir, credentials, chunk_threads, cb, stream=stream)
+        mover = _new_mover(options)
+        if mover is not None:
+            try:
+                path = await (await _move_to_output(mover, target, path, output_dir))
+            finally:
+                await mover.drain()
+            if stream is not None:
+                stream.finish(path)
+        console.print(f"[green]✓ 已保存: {path}[/]")
+        pp = _new_postprocessor(options)
+        if pp is not None:
+            pp.submit(path, _postprocess_meta(target, credentials))
+            await pp.drain()
+        if server is not None and not console.quiet and sys.stdin.isatty():
+            # 下载已完成，播放器可能还在播放：保留播放服务直到用户确认
+            await asyncio.to_thread(input, "播放结束后按 Enter 关闭播放服务...")
+        return path
+    finally:
+        if server is not None:
+            await server.close()
+
+
+def _memory_budget(options: RunOptions):
+    """本进程共享的下载内存预算；首次调用时按 options.memory_budget_bytes 创建。"""
+    from .downloader import get_memory_budget, set_memory_budget
+
+    budget = get_memory_budget()
+    if budget.limit != options.memory_budget_bytes and budget.used == 0:
+        budget = set_memory_budget(options.memory_budget_bytes)
+    return budget
+
+
+def _proxy_pool(options: RunOptions):
+    """本进程共享的下载线路池；首次调用时按 options.download_proxies 创建。"""
+    from .downloader import get_proxy_pool, set_proxy_pool
+
+    pool = get_proxy_pool()
+    wanted = list(options.download_proxies or (None,))
+    if pool.proxies != wanted:
+        pool = set_proxy_pool(wanted)
+    return pool
+
+
+def _final_path(target: VideoTarget, directory: Path) -> Path:
+    """target 在 directory 中的最终文件路径（与下载引擎的命名一致）。"""
+    ext = ".m3u8" if ".m3u8" in target.direct_url.lower() else ".mp4"
+    return build_output_path(directory, target.title, ext)
+
+
+def _staging_dir(options: RunOptions, output_dir: Path) -> Path:
+    """下载写入的目录：启用暂存时为暂存目录，否则即输出目录。"""
+    return options.scratch_dir if options.scratch_dir is not None else output_dir
+
+
+def _new_mover(options: RunOptions):
+    """启用暂存目录时创建后台搬运器，否则返回 None。"""
+    if options.scratch_dir is None:
+        return None
+    from .staging import Mover
+
+    return Mover(options.move_workers)
+
+
+async def _move_to_output(
+    mover, target: VideoTarget, path: Path, output_dir: Path,
+) -> "asyncio.Future[Path]":
+    """
+    校验暂存目录中已完成的文件（已知大小时须一致）后交给搬运器移到输出目录；搬运排队已满时等待。
+    返回的 Future 完成时文件已在输出目录，同时输出 moved 事件（失败时为 stage=move 的 failed 事件）。
+    """
+    size = path.stat().st_size
+    if target.size and path.suffix == ".mp4" and size != target.size:
+        reason = f"文件大小不符: 期望 {target.size}，实际 {size}"
+        events.emit(events.EVENT_FAILED, url=target.url, title=target.title, stage="download", reason=reason)
+        raise OSError(reason)
+    dest = _final_path(target, output_dir)
+    started = time.monotonic()
+    fut = await mover.submit(path, dest)
+
+    def on_done(f: "asyncio.Future[Path]") -> None:
+        if f.cancelled():
+            return
+        e = f.exception()
+        if e is not None:
+            events.emit(
+                events.EVENT_FAILED, url=target.url, title=target.title, stage="move", reason=str(e) or type(e).__name__,
+            )
+            return
+        events.emit(
+            events.EVENT_MOVED,
+            url=target.url,
+            title=target.title,
+            path=str(dest),
+            bytes=size,
+            duration=round(time.monotonic() - started, 3),
+        )
+
+    fut.add_done_callback(on_done)
+    return fut
+
+
+def _prewarm(
+    options: RunOptions,
+    target: VideoTarget,
+    credentials: Optional["SessionCredentials"],
+    connections: int = DEFAULT_CHUNK_THREADS,
+) -> None:
+    """在后台为 target 的直链（含镜像）主机预热连接，任务开始下载时首字节无需等待握手。"""
+    if not options.prewarm_connections or options.download_backend != "httpx":
+        return
+    from .connections import get_client_pool
+
+    headers = credentials.headers() if credentials else {}
+    # 使用代理池时，预热的连接按线路平分
+    proxies = _proxy_pool(options).proxies
+    per_proxy = max(1, -(-connections // len(proxies)))
+    for proxy in proxies:
+        get_client_pool().prewarm_soon([target.direct_url, *target.sources], headers, per_proxy, proxy)
+
+
+def _flush_probe_cache() -> None:
+    """把本次运行的探测结果写回缓存文件（未用过探测时不导入 probe）。"""
+    probe = sys.modules.get(f"{__package__}.probe")
+    if probe is not None and probe._default_cache is not None:
+        probe._default_cache.flush()
+
+
+async def _close_connections() -> None:
+    """关闭共享的下载连接池（未用过下载引擎时不导入 httpx）。"""
+    connections = sys.modules.get(f"{__package__}.connections")
+    if connections is not None and connections._client_pool is not None:
+        await connections._client_pool.aclose()
+
+
+def _new_session(
+    options: RunOptions,
+    user_data_dir: Optional[Path] = None,
+    headless: bool = False,
+    idle_timeout: Optional[float] = DEFAULT_BROWSER_IDLE_TIMEOUT,
+) -> "BrowserSession":
+    """创建带 Rich CF 提示的浏览器会话。"""
+    from .browser_cf import BrowserSession
+
+    return BrowserSession(
+        user_data_dir=user_data_dir or DEFAULT_USER_DATA_DIR,
+        headless=headless,
+        on_cf_triggered=_cf_alert_rich,
+        idle_timeout=idle_timeout,
+        block_requests=options.block_requests,
+    )
+
+
+def _emit_resolved(target: VideoTarget) -> None:
+    events.emit(
+        events.EVENT_RESOLVED,
+        url=target.url,
+        title=target.title,
+        direct_url=target.direct_url,
+        size=target.size or None,
+        sources=len(target.sources) or 1,
+    )
+
+
+async def _download(
+    options: RunOptions,
+    target: VideoTarget,
+    output_dir: Path,
+    credentials: Optional["SessionCredentials"],
+    chunk_threads: int,
+    progress_callback: Callable[[int], None],
+    resume_from: int = 0,
+    stream: Optional["StreamState"] = None,
+) -> Path:
+    """
+    用所选后端下载 target（含镜像直链），返回最终文件路径。直链主机有校准结果时套用其分块参数。
+    同时输出事件：started、下载期间定时 progress、completed 或 failed（失败时照常抛出异常）。
+    resume_from 为断点续传时已有的字节数。
+    启用暂存目录时下载到暂存目录并返回其中的路径，由调用方交给 _move_to_output 移到输出目录；
+    暂存目录中已有上次下载完成、尚未移走的文件时直接返回它。
+    stream：边下边播状态，给出时绕过后端直接用进程内引擎按播放位置调度分块（分块大小为 STREAM_CHUNK_SIZE）。
+    """
+    from .backends import get_backend
+
+    # 准备阶段（后端选择、校准参数等）出错同样输出 failed 事件；下载引擎内部的事件（如分块重试）通过上下文归属到该视频
+    token = events.current_url.set(target.url)
+    sampler = backend = None
+    try:
+        staging = _staging_dir(options, output_dir)
+        if staging != output_dir:
+            leftover = _final_path(target, staging)
+            if leftover.exists() and (not target.size or leftover.stat().st_size == target.size):
+                if stream is not None:
+                    stream.finish(leftover)
+                # 本次无需下载，同样输出 completed，事件流中每个视频都有终态
+                events.emit(
+                    events.EVENT_COMPLETED,
+                    url=target.url,
+                    title=target.title,
+                    path=str(leftover),
+                    bytes=0,
+                    size=leftover.stat().st_size,
+                    duration=0,
+                    throughput=None,
+                )
+                return leftover
+
+        chunk_size = DEFAULT_CHUNK_SIZE
+        if options.use_host_profiles:
+            from .calibrate import get_default_store
+
+            profile = get_default_store().for_url(target.direct_url)
+            if profile is not None:
+                chunk_threads, chunk_size = profile.chunk_threads, profile.chunk_size
+        if stream is not None:
+            chunk_size = STREAM_CHUNK_SIZE
+        backend = get_backend(options.download_backend, **options.backend_options)
+        budget = _memory_budget(options)
+        _proxy_pool(options)
+        sampler = events.ProgressSampler(target.size, resume_from, extra=lambda: {"buffered": budget.used})
+
+        def cb(n: int):
+            sampler.add(n)
+            progress_callback(n)
+
+        events.emit(
+            events.EVENT_STARTED,
+            title=target.title,
+            direct_url=target.direct_url,
+            size=target.size or None,
+            resume_from=resume_from,
+        )
+        started = time.monotonic()
+        sampler.start()
+        if stream is not None:
+            from .downloader import download_task
+
+            path = await download_task(
+                target.direct_url,
+                target.title,
+                staging,
+                credentials,
+                chunk_size=chunk_size,
+                chunk_threads=chunk_threads,
+                progress_callback=cb,
+                mirrors=target.sources,
+                stream=stream,
+            )
+        else:
+            path = await backend.download(
+                target.direct_url,
+                target.title,
+                staging,
+                credentials,
+                progress_callback=cb,
+                mirrors=target.sources,
+                chunk_threads=chunk_threads,
+                size=target.size,
+                chunk_size=chunk_size,
+            )
+    except Exception as e:
+        events.emit(events.EVENT_FAILED, title=target.title, stage="download", reason=str(e) or type(e).__name__)
+        raise
+    finally:
+        if sampler is not None:
+            sampler.stop()
+        if backend is not None:
+            await backend.aclose()
+        events.current_url.reset(token)
+    duration = time.monotonic() - started
+    written = sampler.completed - resume_from
+    events.emit(
+        events.EVENT_COMPLETED,
+        url=target.url,
+        title=target.title,
+        path=str(path),
+        bytes=written,
+        size=path.stat().st_size if path.exists() else None,
+        duration=round(duration, 3),
+        throughput=round(written / duration, 1) if duration > 0 else None,
+    )
+    return path
+
+
+async def run_single_url(
+    page_url: str,
+    output_dir: Path,
+    chunk_threads: int = DEFAULT_CHUNK_THREADS,
+    preferred_quality: str = DEFAULT_QUALITY,
+    user_data_dir: Optional[Path] = None,
+    headless: bool = False,
+    session: Optional["BrowserSession"] = None,
+    stream_port: Optional[int] = None,
+    options: Optional[RunOptions] = None,
+) -> Optional[VideoTarget]:
+    """
+    单集：打开页面解析直链 -> 下载。未传入 session 时自建并在解析后立即关闭浏览器。
+    stream_port：边下边播的本机端口（见 run_single）；options：运行选项（见 RunOptions）。
+    """
+    options = options or RunOptions()
+    own_session = session is None
+    if own_session:
+        session = _new_session(options, user_data_dir, headless)
+    try:
+        async with session.use() as handler:
+            creds = await handler.goto_and_handle_cf(page_url, wait_for_enter=True)
+            html = await handler.get_page_content()
+        target = parse_single_page_html(html, page_url, preferred_quality=preferred_quality)
+        if target and not target.candidates:
+            # 无需探测选优：直链主机已确定，关闭浏览器的同时预热连接
+            _prewarm(options, target, creds, chunk_threads)
+        if own_session:
+            # 已取得凭证与解析结果，关闭浏览器后再下载
+            await session.close()
+        if not target:
+            console.print("[red]无法从页面解析出视频直链或标题。[/]")
+            events.emit(events.EVENT_FAILED, url=page_url, stage="resolve", reason="无法解析直链")
+            return None
+        if target.candidates:
+            # 选优后才知道直链主机
+            target = await _pick_source(options, target, creds, preferred_quality)
+            _prewarm(options, target, creds, chunk_threads)
+        _emit_resolved(target)
+        await run_single(
+            target, output_dir, creds, chunk_threads=chunk_threads, stream_port=stream_port, options=options,
+        )
+        return target
+    finally:
+        if own_session:
+            await session.close()
+        _flush_probe_cache()
+        await _close_connections()
+
+
+async def _pick_source(
+    options: RunOptions,
+    target: VideoTarget,
+    credentials: Optional["SessionCredentials"],
+    preferred_quality: str,
+) -> VideoTarget:
+    """按 options.probe_sources 开关探测候选直链选优；探测异常时沿用解析出的直链。"""
+    if not options.probe_sources or not target.candidates:
+        return target
+    from .probe import get_default_cache, select_best_source
+
+    try:
+        return await select_best_source(target, credentials, preferred_quality, get_default_cache())
+    except Exception as e:
+        console.print(f"[yellow]直链探测失败，沿用解析结果: {e}[/]")
+        return target
+
+
+def _new_postprocessor(options: RunOptions):
+    """按 options.post_steps 创建后处理阶段；未配置步骤时返回 None。"""
+    if not options.post_steps:
+        return None
+    from .postprocess import PostProcessor
+
+    def on_done(result) -> None:
+        failed = [f"{name}: {msg}" for name, ok, msg in result.steps if not ok]
+        if failed:
+            console.print(f"[yellow]后处理有误 {result.path.name}: {'; '.join(failed)}[/]")
+        else:
+            console.print(f"[green]✓ 后处理完成: {result.path.name}[/]")
+
+    return PostProcessor(options.post_steps, workers=options.post_workers, on_done=on_done)
+
+
+def _postprocess_meta(target: VideoTarget, credentials: Optional["SessionCredentials"]) -> dict:
+    """后处理所需信息（需可在进程间传递）；请求头仅供 hls 步骤拉取分片。"""
+    headers = credentials.headers() if credentials else {}
+    return {
+        "title": target.title,
+        "source_url": target.url,
+        "direct_url": target.direct_url,
+        "headers": headers,
+    }
+
+
+async def _with_size(target: VideoTarget, credentials: Optional["SessionCredentials"]) -> VideoTarget:
+    """调度前确保已知文件大小；探测失败时保持未知（0）。"""
+    if target.size:
+        return target
+    from .probe import probe_size
+
+    try:
+        return await probe_size(target, credentials)
+    except Exception:
+        return target
+
+
+def _part_path(options: RunOptions, target: VideoTarget, output_dir: Path) -> Path:
+    """该目标下载时写入的 .part 文件（已有时为找到的文件，启用暂存时在暂存目录中）。"""
+    staged = _final_path(target, _staging_dir(options, output_dir))
+    part = find_part_file(staged.parent, staged.stem, staged.suffix)
+    return part if part is not None else staged.with_name(staged.name + PART_SUFFIX)
+
+
+def _bytes_to_write(options: RunOptions, target: VideoTarget, output_dir: Path) -> int:
+    """该目标还需写入的字节数：总大小减去已有 .part（断点续传，启用暂存时在暂存目录中）的大小；未知返回 0。"""
+    if not target.size:
+        return 0
+    final = _final_path(target, output_dir)
+    staged = _final_path(target, _staging_dir(options, output_dir))
+    if final.exists() or staged.exists():
+        return 0
+    part = find_part_file(staged.parent, final.stem, final.suffix)
+    done = part_bytes_done(part) if part is not None and part.name.endswith(PART_SUFFIX) else 0
+    return max(0, target.size - done)
+
+
+async def stream_batch_urls(source, priorities: Optional[Dict[str, int]] = None) -> AsyncIterator[str]:
+    """
+    流式读取批量文件或标准输入（"-"）中的 URL（见 parser.iter_batch_urls），供 run_batch 边读边处理。
+    读取在线程中进行，不阻塞下载；非 0 的优先级写入 priorities（{URL: 优先级}）。
+    """
+    it = iter_batch_urls(source)
+    # 标准输入逐行交付（生产者可能很慢）；文件按批读取以减少线程切换
+    batch_size = 1 if str(source) == "-" else 256
+    try:
+        while True:
+            batch = await asyncio.to_thread(lambda: list(itertools.islice(it, batch_size)))
+            if not batch:
+                return
+            for url, priority in batch:
+                if priority and priorities is not None:
+                    priorities[url] = priority
+                yield url
+    finally:
+        try:
+            it.close()
+        except ValueError:
+            # 取消时读取线程可能仍在执行生成器，交给垃圾回收关闭文件
+            pass
+
+
+# run_batch 的输入元素：待解析页面 URL，或已解析目标及其凭证
+BatchItem = Union[str, Tuple[VideoTarget, Optional["SessionCredentials"]]]
+
+
+async def resume_batch_items(
+    journal: "BatchJournal", source=None, priorities: Optional[Dict[str, int]] = None,
+) -> AsyncIterator[BatchItem]:
+    """
+    --resume 的输入：先是日志中未完成的条目（解析结果新鲜的直接下载，可能过期的重新解析），
+    再从 source（批量文件；标准输入无法重读）中读取日志里没有的 URL，即中断时尚未读到的部分。
+    """
+    for item, priority in journal.resume_items():
+        if priority and priorities is not None:
+            priorities[item if isinstance(item, str) else item[0].url] = priority
+        yield item
+    if source is None or str(source) == "-" or not Path(source).is_file():
+        return
+    rest = stream_batch_urls(source, priorities)
+    try:
+        async for url in rest:
+            if url not in journal:
+                yield url
+    finally:
+        await rest.aclose()
+
+
+async def _iter_urls(urls: Union[Iterable[BatchItem], AsyncIterable[BatchItem]]) -> AsyncIterator[BatchItem]:
+    """统一遍历同步列表或异步流（如分页抓取）中的 URL。"""
+    if hasattr(urls, "__aiter__"):
+        async for u in urls:
+            yield u
+    else:
+        for u in urls:
+            yield u
+
+
+async def run_batch(
+    urls: Union[Iterable[BatchItem], AsyncIterable[BatchItem]],
+    output_dir: Path,
+    max_concurrent_tasks: int = DEFAULT_MAX_CONCURRENT_TASKS,
+    chunk_threads: int = DEFAULT_CHUNK_THREADS,
+    preferred_quality: str = DEFAULT_QUALITY,
+    user_data_dir: Optional[Path] = None,
+    headless: bool = False,
+    session: Optional["BrowserSession"] = None,
+    on_result: Optional[Callable[[str, Optional[VideoTarget], bool], None]] = None,
+    priorities: Optional[Dict[str, int]] = None,
+    journal: Optional["BatchJournal"] = None,
+    options: Optional[RunOptions] = None,
+) -> List[str]:
+    """
+    批量：逐个打开页面解析，解析出的目标立即进入下载队列，由 max_concurrent_tasks 个下载协程并发消费。
+    urls 可为列表或异步流（如分页抓取结果、stream_batch_urls），边解析边下载。返回成功保存的文件名列表。
+    最多提前解析 RESOLVE_AHEAD 个尚未开始下载的目标，超大列表按需读取、不会全部堆在内存中。
+    元素为页面 URL，或已解析的 (VideoTarget, SessionCredentials)（跳过浏览器，直接进入下载队列）；
+    浏览器在首次需要解析页面时才启动。
+    下载顺序由调度器决定（options.schedule_policy；priorities 为 {页面 URL: 优先级}），
+    启动每个任务前预留其所需磁盘空间（启用暂存目录时为暂存磁盘），空间不足时暂缓。
+    启用暂存目录时，下载完成的文件由后台搬运器移到输出目录，下载协程不等待，搬运完成才算成功。
+    传入 session 时复用其浏览器（由调用方管理生命周期）；否则自建并在解析完成后关闭。
+    on_result(page_url, target, ok)：每个链接解析失败或下载结束时回调（如增量同步记录状态）。
+    journal：检查点日志，记录读入的页面、解析结果与结束状态，中断后可 --resume 续跑。
+    options：运行选项（见 RunOptions）。
+    """
+    from .scheduler import DownloadScheduler
+
+    options = options or RunOptions()
+    own_session = session is None
+    if own_session:
+        session = _new_session(options, user_data_dir, headless)
+    total = len(urls) if hasattr(urls, "__len__") else None
+    scheduler = DownloadScheduler(
+        _staging_dir(options, output_dir), policy=options.schedule_policy, min_free_bytes=options.min_free_bytes,
+    )
+    postprocessor = _new_postprocessor(options)
+    mover = _new_mover(options)
+    moving: set = set()
+    success_list: List[str] = []
+    resolved = [0]
+    failed = [0]
+    probing: set = set()
+    ahead = max(RESOLVE_AHEAD, max_concurrent_tasks * 2)
+
+    def report_failure(page_url: str, t: Optional[VideoTarget], stage: str, reason: str):
+        failed[0] += 1
+        events.emit(events.EVENT_FAILED, url=page_url, title=t.title if t else None, stage=stage, reason=reason)
+        if journal is not None:
+            journal.finish(page_url, False, stage)
+        if on_result:
+            on_result(page_url, t, False)
+
+    async def probe_and_enqueue(t: VideoTarget, creds: Optional["SessionCredentials"], fresh: bool):
+        try:
+            await _probe_and_put(t, creds, fresh)
+        except Exception as e:
+            # 后台任务的异常无人等待：在此记为失败（共享队列中的任务随之回报失败），不中断整批
+            console.print(f"[red]✗ {t.title}: {e}[/]")
+            report_failure(t.url, t, "probe", str(e))
+
+    async def _probe_and_put(t: VideoTarget, creds: Optional["SessionCredentials"], fresh: bool):
+        t = await _with_size(await _pick_source(options, t, creds, preferred_quality), creds)
+        # 直链主机已确定：在任务排队期间预热连接
+        _prewarm(options, t, creds, chunk_threads)
+        if fresh and journal is not None:
+            journal.resolved(t, creds)
+        _emit_resolved(t)
+        priority = (priorities or {}).get(t.url, 0)
+        await scheduler.put(
+            (t, creds),
+            size=_bytes_to_write(options, t, output_dir),
+            priority=priority,
+            path=_part_path(options, t, output_dir),
+        )
+
+    def enqueue(t: VideoTarget, creds: Optional["SessionCredentials"], fresh: bool = True):
+        resolved[0] += 1
+        # 直链探测在后台进行，不阻塞下一页解析
+        task = asyncio.create_task(probe_and_enqueue(t, creds, fresh))
+        probing.add(task)
+        task.add_done_callback(probing.discard)
+
+    async def resolve_all():
+        handler = None
+        try:
+            i = 0
+            async for item in _iter_urls(urls):
+                # 已解析、尚未开始下载的目标过多时暂停解析（超大列表边读边下）
+                await scheduler.wait_backlog(ahead, lambda: len(probing))
+                i += 1
+                if not isinstance(item, str):
+                    # 已解析目标（如共享队列中他人解析好的），无需浏览器
+                    t, creds = item
+                    console.print(f"[cyan][{i}/{total or '?'}][/] 已解析: {t.title}")
+                    # 日志中已有的解析结果保留原解析时间，不当作新解析记录
+                    enqueue(t, creds, fresh=journal is None or t.url not in journal)
+                    continue
+                page_url = item
+                if journal is not None:
+                    journal.page(page_url, (priorities or {}).get(page_url, 0))
+                if handler is None:
+                    # 首次需要解析页面时才启动浏览器
+                    handler = await session.acquire()
+                console.print(f"[cyan][{i}/{total or '?'}][/] 解析: [dim]{page_url[:60]}...[/]")
+                try:
+                    creds = await handler.goto_and_handle_cf(page_url, wait_for_enter=True)
+                    html = await handler.get_page_content()
+                except Exception as e:
+                    console.print(f"  [red]✗ 打开页面失败: {e}[/]")
+                    report_failure(page_url, None, "resolve", f"打开页面失败: {e}")
+                    continue
+                t = parse_single_page_html(html, page_url, preferred_quality=preferred_quality)
+                if t:
+                    enqueue(t, creds)
+                    console.print(f"  [green]✓[/] {t.title}")
+                else:
+                    console.print(f"  [yellow]跳过: 无法解析直链[/]")
+                    report_failure(page_url, None, "resolve", "无法解析直链")
+        finally:
+            if handler is not None:
+                session.release()
+        if own_session:
+            # 全部解析完毕，关闭浏览器（剩余下载无需浏览器）
+            await session.close()
+
+    async def run_one(job, t: VideoTarget, credentials: "SessionCredentials"):
+        with create_progress(t.title) as progress:
+            # 已知大小时进度从断点处开始
+            received = [t.size - job.size if t.size and job.size else 0]
+            task_id = progress.add_task(t.title, total=t.size or None, completed=received[0])
+
+            def cb(n: int):
+                received[0] += n
+                progress.update(task_id, completed=received[0])
+                scheduler.progress(job, n)
+
+            try:
+                path = await _download(options, t, output_dir, credentials, chunk_threads, cb, resume_from=received[0])
+                if mover is None:
+                    complete(t, credentials, path)
+                    return
+                moved = await _move_to_output(mover, t, path, output_dir)
+            except Exception as e:
+                # failed 事件已由 _download / _move_to_output 输出
+                fail(t, e, "download")
+                return
+        # 搬运在后台进行，下载协程继续取下一个任务
+        task = asyncio.create_task(complete_after_move(t, credentials, moved))
+        moving.add(task)
+        task.add_done_callback(moving.discard)
+
+    def complete(t: VideoTarget, credentials: "SessionCredentials", path: Path):
+        if postprocessor is not None:
+            # 交给进程池后立即返回，下载协程继续取下一个任务
+            postprocessor.submit(path, _postprocess_meta(t, credentials))
+        success_list.append(t.title)
+        console.print(f"[green]✓ 完成: {t.title}[/]")
+        if journal is not None:
+            journal.finish(t.url, True)
+        if on_result:
+            on_result(t.url, t, True)
+
+    def fail(t: VideoTarget, e: Exception, stage: str):
+        console.print(f"[red]✗ {t.title}: {e}[/]")
+        failed[0] += 1
+        if journal is not None:
+            journal.finish(t.url, False, stage)
+        if on_result:
+            on_result(t.url, t, False)
+
+    async def complete_after_move(t: VideoTarget, credentials: "SessionCredentials", moved: "asyncio.Future[Path]"):
+        try:
+            path = await moved
+        except Exception as e:
+            # 暂存文件保留，续跑时直接重新搬运
+            fail(t, e, "move")
+            return
+        complete(t, credentials, path)
+
+    async def worker():
+        while True:
+            job = await scheduler.get()
+            if job is None:
+                return
+            t, credentials = job.item
+            if job.rejected:
+                console.print(f"[red]✗ {t.title}: {job.rejected}[/]")
+                report_failure(t.url, t, "disk", job.rejected)
+                continue
+            try:
+                await run_one(job, t, credentials)
+            finally:
+                await scheduler.done(job)
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, max_concurrent_tasks))]
+    try:
+        await resolve_all()
+        if probing:
+            await asyncio.gather(*probing)
+        await scheduler.close()
+        if not resolved[0]:
+            console.print("[yellow]没有可下载的目标。[/]")
+        else:
+            console.print(Panel(
+                f"解析完成，共 [bold]{resolved[0]}[/] 个任务，等待下载结束…",
+                border_style="blue",
+                box=box.ROUNDED,
+            ))
+        await asyncio.gather(*workers)
+        if moving:
+            await asyncio.gather(*moving)
+        if mover is not None:
+            await mover.drain()
+        if postprocessor is not None:
+            await postprocessor.drain()
+        buffers = _memory_budget(options).stats()
+        proxies = _proxy_pool(options)
+        events.emit(
+            events.EVENT_SUMMARY,
+            resolved=resolved[0],
+            completed=len(success_list),
+            failed=failed[0],
+            buffer_peak=buffers["peak"],
+            buffer_waits=buffers["waits"],
+            **({"proxies": proxies.stats()} if len(proxies) > 1 else {}),
+        )
+        return success_list
+    finally:
+        for w in [*workers, *probing, *moving]:
+            w.cancel()
+        await asyncio.gather(*workers, *probing, *moving, return_exceptions=True)
+        if mover is not None:
+            await mover.drain()
+        if hasattr(urls, "aclose"):
+            await urls.aclose()
+        if postprocessor is not None:
+            await postprocessor.drain()
+        if own_session:
+            await session.close()
+        _flush_probe_cache()
+        await _close_connections()
+
+
+async def run_list_page(
+    list_page_url: str,
+    output_dir: Path,
+    max_concurrent_tasks: int = DEFAULT_MAX_CONCURRENT_TASKS,
+    chunk_threads: int = DEFAULT_CHUNK_THREADS,
+    preferred_quality: str = DEFAULT_QUALITY,
+    user_data_dir: Optional[Path] = None,
+    headless: bool = False,
+    session: Optional["BrowserSession"] = None,
+    max_pages: int = DEFAULT_MAX_LIST_PAGES,
+    sync_state: Optional[SyncState] = None,
+    options: Optional[RunOptions] = None,
+) -> List[str]:
+    """
+    列表页：打开列表页 -> 提取所有单集链接 -> 同批量流程（共用同一浏览器会话）。返回成功列表。
+    搜索/列表页（/search、/videos、/series）会按分页并发抓取至多 max_pages 页，边抓边下载。
+    传入 sync_state 时为增量同步：跳过该列表已完成的视频，只解析、下载新增/未完成的。
+    options：运行选项（见 RunOptions）。
+    """
+    options = options or RunOptions()
+    own_session = session is None
+    if own_session:
+        session = _new_session(options, user_data_dir, headless)
+    try:
+        async with session.use() as handler:
+            console.print(Panel(
+                f"[cyan]正在加载列表页[/]\n[dim]{list_page_url}[/]",
+                border_style="blue",
+                box=box.ROUNDED,
+            ))
+            await handler.goto_and_handle_cf(list_page_url, wait_for_enter=True)
+            html = await handler.get_page_content()
+
+        if _is_list_page(list_page_url) and max_pages > 1:
+            from .crawler import crawl_list_pages
+
+            def on_page(page_url: str, new_count: int, error: Optional[Exception]) -> None:
+                if error is not None:
+                    console.print(f"[yellow]分页抓取失败: {page_url} ({error})[/]")
+                else:
+                    console.print(f"[green]分页[/] [dim]{page_url}[/] 新增 {new_count} 个视频")
+
+            urls = crawl_list_pages(session, list_page_url, html, max_pages=max_pages, on_page=on_page)
+            if sync_state is not None:
+                urls = sync_state.filter_new_stream(list_page_url, urls)
+        else:
+            urls = extract_list_page_video_links(html, list_page_url)
+            console.print(f"[green]共解析到 {len(urls)} 个视频链接。[/]")
+            if not urls:
+                console.print("[yellow]未解析到任何视频链接。[/]")
+                return []
+            if sync_state is not None:
+                found = len(urls)
+                urls = sync_state.filter_new(list_page_url, urls)
+                console.print(f"[green]增量同步：{found - len(urls)} 个已完成，{len(urls)} 个待下载。[/]")
+                if not urls:
+                    return []
+
+        def mark_result(page_url: str, target: Optional[VideoTarget], ok: bool) -> None:
+            sync_state.mark(
+                list_page_url, page_url,
+                STATUS_DONE if ok else STATUS_FAILED,
+                title=target.title if target else None,
+            )
+
+        if own_session:
+            # 批量阶段复用本会话，解析完成后即关闭浏览器
+            session.idle_timeout = 0
+        return await run_batch(
+            urls,
+            output_dir,
+            max_concurrent_tasks=max_concurrent_tasks,
+            chunk_threads=chunk_threads,
+            preferred_quality=preferred_quality,
+            session=session,
+            on_result=mark_result if sync_state is not None else None,
+            options=options,
+        )
+    finally:
+        if sync_state is not None:
+            sync_state.flush()
+        if own_session:
+            await session.close()
+
+
+async def run_sync_lists(
+    list_urls: List[str],
+    output_dir: Path,
+    sync_state: SyncState,
+    max_concurrent_tasks: int = DEFAULT_MAX_CONCURRENT_TASKS,
+    chunk_threads: int = DEFAULT_CHUNK_THREADS,
+    preferred_quality: str = DEFAULT_QUALITY,
+    user_data_dir: Optional[Path] = None,
+    headless: bool = False,
+    max_pages: int = DEFAULT_MAX_LIST_PAGES,
+    options: Optional[RunOptions] = None,
+) -> List[str]:
+    """增量同步多个列表/系列：依次处理，共用同一浏览器会话，只下载各列表新增或未完成的视频。"""
+    options = options or RunOptions()
+    session = _new_session(options, user_data_dir, headless)
+    success: List[str] = []
+    try:
+        for list_url in list_urls:
+            success += await run_list_page(
+                list_url,
+                output_dir,
+                max_concurrent_tasks=max_concurrent_tasks,
+                chunk_threads=chunk_threads,
+                preferred_quality=preferred_quality,
+                session=session,
+                max_pages=max_pages,
+                sync_state=sync_state,
+                options=options,
+            )
+        return success
+    finally:
+        await session.close()
+
+
+async def run_queue_worker(
+    queue: "SharedWorkQueue",
+    output_dir: Path,
+    max_concurrent_tasks: int = DEFAULT_MAX_CONCURRENT_TASKS,
+    chunk_threads: int = DEFAULT_CHUNK_THREADS,
+    preferred_quality: str = DEFAULT_QUALITY,
+    user_data_dir: Optional[Path] = None,
+    headless: bool = False,
+    options: Optional[RunOptions] = None,
+) -> List[str]:
+    """
+    共享队列工作实例：从 queue 领取页面 URL 或已解析目标，交给 run_batch 解析、下载并回报结果。
+    本地积压不超过 max_concurrent_tasks 的两倍，其余任务留给其它实例；持有的租约定期续期，
+    实例崩溃后租约过期、任务由其它实例接手。队列中没有待处理或被持有的任务时退出。
+    """
+    from .browser_cf import SessionCredentials
+    from .work_queue import KIND_TARGET
+
+    backlog = max(1, max_concurrent_tasks) * 2
+    held: Dict[str, int] = {}  # 页面 URL -> 本实例持有的任务 id
+    reporting: set = set()
+
+    async def jobs() -> AsyncIterator[BatchItem]:
+        while True:
+            if len(held) >= backlog:
+                await asyncio.sleep(1)
+                continue
+            leased = await asyncio.to_thread(queue.lease, backlog - len(held))
+            if not leased:
+                # 其它实例仍持有任务时继续等待：它们崩溃后租约过期，任务会回到队列
+                if held or await asyncio.to_thread(queue.has_unfinished):
+                    await asyncio.sleep(QUEUE_POLL_INTERVAL)
+                    continue
+                return
+            for job in leased:
+                held[job.url] = job.id
+                if job.kind == KIND_TARGET and job.payload:
+                    creds = job.payload.get("credentials")
+                    yield (
+                        VideoTarget(**job.payload["target"]),
+                        SessionCredentials(**creds) if creds else None,
+                    )
+                else:
+                    yield job.url
+
+    def on_result(page_url: str, target: Optional[VideoTarget], ok: bool) -> None:
+        job_id = held.pop(page_url, None)
+        if job_id is None:
+            return
+        error = None if ok else ("下载失败" if target else "解析失败")
+        task = asyncio.create_task(asyncio.to_thread(queue.complete, job_id, ok, error))
+        reporting.add(task)
+        task.add_done_callback(reporting.discard)
+
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(QUEUE_HEARTBEAT_SECONDS)
+            try:
+                await asyncio.to_thread(queue.heartbeat)
+            except Exception as e:
+                console.print(f"[yellow]续租失败: {e}[/]")
+
+    console.print(f"[cyan]共享队列[/] {queue.path}（实例 {queue.worker_id}）: {queue.stats()}")
+    beat = asyncio.create_task(heartbeat())
+    try:
+        return await run_batch(
+            jobs(),
+            output_dir,
+            max_concurrent_tasks=max_concurrent_tasks,
+            chunk_threads=chunk_threads,
+            preferred_quality=preferred_quality,
+            user_data_dir=user_data_dir,
+            headless=headless,
+            on_result=on_result,
+            options=options,
+        )
+    finally:
+        beat.cancel()
+        if reporting:
+            await asyncio.gather(*reporting, return_exceptions=True)
+        if held:
+            # 中途退出：未完成的任务立即退还，不必等租约过期
+            await asyncio.to_thread(queue.release, list(held.values()))
+
+
+async def run_resolve(
+    urls: List[str],
+    manifest_path: Path,
+    fmt: Optional[str] = None,
+    probe_sizes: bool = False,
+    concurrency: int = DEFAULT_RESOLVE_CONCURRENCY,
+    preferred_quality: str = DEFAULT_QUALITY,
+    user_data_dir: Optional[Path] = None,
+    headless: bool = False,
+    options: Optional[RunOptions] = None,
+) -> List[VideoTarget]:
+    """
+    只解析不下载：第一页在主标签页中打开（必要时人工通过 CF），其余页面在新标签页中并发抓取，
+    共享已通过 CF 的 Cookies；新标签页被 CF 拦截时退回主标签页重试。
+    解析结果按输入顺序连同 Cookies/UA 写入清单（manifest.write_manifest），之后 --manifest 下载无需浏览器。
+    probe_sizes 为真时同时探测文件大小。返回解析成功的目标。
+    """
+    from .manifest import format_for, write_manifest
+
+    options = options or RunOptions()
+    session = _new_session(options, user_data_dir, headless)
+    results: List[Optional[Tuple[VideoTarget, Optional["SessionCredentials"]]]] = [None] * len(urls)
+    latest_creds: List[Optional["SessionCredentials"]] = [None]
+    main_lock = asyncio.Lock()
+    sem = asyncio.Semaphore(max(1, concurrency))
+    failed = [0]
+
+    async def open_in_main(handler, page_url: str) -> Tuple[str, Optional["SessionCredentials"]]:
+        async with main_lock:
+            creds = latest_creds[0] = await handler.goto_and_handle_cf(page_url, wait_for_enter=True)
+            return await handler.get_page_content(), creds
+
+    async def resolve_one(handler, i: int, page_url: str, first: bool = False):
+        async with sem:
+            try:
+                if first:
+                    html, creds = await open_in_main(handler, page_url)
+                else:
+                    # 新标签页使用抓取时上下文中的 Cookies，即最近一次通过 CF 取得的凭证
+                    creds = latest_creds[0]
+                    try:
+                        html = await handler.fetch_in_new_tab(page_url)
+                    except RuntimeError:
+                        html, creds = await open_in_main(handler, page_url)
+            except Exception as e:
+                failed[0] += 1
+                console.print(f"  [red]✗ 打开页面失败 {page_url[:60]}: {e}[/]")
+                events.emit(events.EVENT_FAILED, url=page_url, stage="resolve", reason=f"打开页面失败: {e}")
+                return
+            t = parse_single_page_html(html, page_url, preferred_quality=preferred_quality)
+            if not t:
+                failed[0] += 1
+                console.print(f"  [yellow]跳过 {page_url[:60]}: 无法解析直链[/]")
+                events.emit(events.EVENT_FAILED, url=page_url, stage="resolve", reason="无法解析直链")
+                return
+            t = await _pick_source(options, t, creds, preferred_quality)
+            if probe_sizes:
+                t = await _with_size(t, creds)
+            results[i] = (t, creds)
+            _emit_resolved(t)
+            console.print(f"  [green]✓[/] [{i + 1}/{len(urls)}] {t.title}")
+
+    try:
+        async with session.use() as handler:
+            if urls:
+                await resolve_one(handler, 0, urls[0], first=True)
+                await asyncio.gather(*(resolve_one(handler, i, u) for i, u in enumerate(urls) if i))
+    finally:
+        _flush_probe_cache()
+        await session.close()
+
+    # 每个条目记录解析它时所用的凭证（Cookies/UA 与直链签发时一致）
+    resolved = [r for r in results if r is not None]
+    targets = [t for t, _ in resolved]
+    path = write_manifest(manifest_path, resolved, fmt)
+    events.emit(events.EVENT_SUMMARY, resolved=len(targets), failed=failed[0], manifest=str(path))
+    console.print(Panel(
+        f"解析成功 [bold]{len(targets)}[/]，失败 [bold]{failed[0]}[/]\n"
+        f"清单（{format_for(path, fmt)}）: [cyan]{path}[/]",
+        title="解析完成",
+        border_style="blue",
+        box=box.ROUNDED,
+    ))
+    return targets
+
+
+async def run_calibrate(
+    url: str,
+    threads: Optional[List[int]] = None,
+    chunk_sizes: Optional[List[int]] = None,
+    sample_bytes: Optional[int] = None,
+    preferred_quality: str = DEFAULT_QUALITY,
+    user_data_dir: Optional[Path] = None,
+    headless: bool = False,
+    profiles_path: Optional[Path] = None,
+    options: Optional[RunOptions] = None,
+) -> Optional["HostProfile"]:
+    """
+    校准：对直链（或视频页解析出的直链）按并发 × 分块大小网格测速，展示结果并保存该 CDN 主机的最佳参数。
+    url 为站点视频页时先用浏览器解析直链与凭证（直链多需 Cookies/UA）。
+    """
+    from urllib.parse import urlparse
+
+    from .calibrate import ProfileStore, Trial, best_trial, calibrate, profile_from_trial
+    from .config import CALIBRATE_CHUNK_SIZES, CALIBRATE_SAMPLE_BYTES, CALIBRATE_THREADS
+
+    options = options or RunOptions()
+    creds = None
+    direct_url = url
+    if (urlparse(url).hostname or "").endswith(urlparse(TARGET_BASE_URL).hostname):
+        session = _new_session(options, user_data_dir, headless)
+        try:
+            async with session.use() as handler:
+                creds = await handler.goto_and_handle_cf(url, wait_for_enter=True)
+                html = await handler.get_page_content()
+        finally:
+            await session.close()
+        target = parse_single_page_html(html, url, preferred_quality=preferred_quality)
+        if not target:
+            console.print("[red]无法从页面解析出视频直链。[/]")
+            return None
+        direct_url = (await _pick_source(options, target, creds, preferred_quality)).direct_url
+        _flush_probe_cache()
+
+    threads = threads or list(CALIBRATE_THREADS)
+    chunk_sizes = chunk_sizes or list(CALIBRATE_CHUNK_SIZES)
+    console.print(Panel(
+        f"[cyan]{direct_url[:80]}[/]\n"
+        f"并发: {threads}  分块: {[f'{c / 1024 ** 2:g}MB' for c in chunk_sizes]}  "
+        f"每组采样: {(sample_bytes or CALIBRATE_SAMPLE_BYTES) / 1024 ** 2:g}MB",
+        title="校准",
+        border_style="blue",
+        box=box.ROUNDED,
+    ))
+
+    def on_trial(t: Trial):
+        console.print(
+            f"  并发 {t.chunk_threads:>2} × 分块 {t.chunk_size / 1024 ** 2:>4g}MB: "
+            f"[bold]{t.throughput / 1024 ** 2:.2f} MB/s[/]  出错 {t.errors}/{t.requests}"
+        )
+
+    trials = await calibrate(
+        direct_url, creds, threads, chunk_sizes,
+        sample_bytes=sample_bytes or CALIBRATE_SAMPLE_BYTES, on_trial=on_trial,
+    )
+    best = best_trial(trials)
+    if best is None:
+        console.print("[red]所有组合出错率都过高，未保存校准结果（检查代理或直链是否有效）。[/]")
+        return None
+
+    table = Table(title="校准结果", box=box.ROUNDED, border_style="blue")
+    for col in ("并发", "分块", "吞吐", "出错率"):
+        table.add_column(col, justify="right")
+    for t in sorted(trials, key=lambda t: -t.throughput):
+        style = "bold green" if t is best else ""
+        table.add_row(
+            str(t.chunk_threads), f"{t.chunk_size / 1024 ** 2:g}MB",
+            f"{t.throughput / 1024 ** 2:.2f} MB/s", f"{t.error_rate:.0%}", style=style,
+        )
+    console.print(table)
+    profile = profile_from_trial(direct_url, best)
+    store = ProfileStore(profiles_path)
+    store.put(profile)
+    console.print(
+        f"[green]✓ 已保存 {profile.host}: 并发 {profile.chunk_threads}，"
+        f"分块 {profile.chunk_size / 1024 ** 2:g}MB[/] → [dim]{store.path}[/]"
+    )
+    return profile
+
+
+# ---------- 交互式流程 ----------
+
+_session_output_dir = DEFAULT_OUTPUT_DIR
+_session_max_tasks = DEFAULT_MAX_CONCURRENT_TASKS
+_session_chunk_threads = DEFAULT_CHUNK_THREADS
+_session_quality = DEFAULT_QUALITY
+
+
+def run_interactive(
+    user_data_dir: Optional[Path] = None,
+    headless: bool = False,
+    idle_timeout: Optional[float] = DEFAULT_BROWSER_IDLE_TIMEOUT,
+    options: Optional[RunOptions] = None,
+) -> None:
+    """无参数启动时：主菜单循环。"""
+    asyncio.run(_interactive_loop(user_data_dir, headless, idle_timeout, options or RunOptions()))
+
+
+async def _interactive_loop(
+    user_data_dir: Optional[Path],
+    headless: bool,
+    idle_timeout: Optional[float],
+    options: RunOptions,
+) -> None:
+    """
+    主菜单循环运行在同一个事件循环中，各菜单操作共用一个浏览器会话；
+    终端输入放到线程中执行，等待输入期间空闲计时仍可关闭浏览器。
+    """
+    global _session_output_dir, _session_max_tasks, _session_chunk_threads, _session_quality
+    # 菜单中修改设置只影响本次会话，不改动调用方的选项
+    options = replace(options)
+    session = _new_session(options, user_data_dir, headless, idle_timeout)
+    show_banner()
+    try:
+        while True:
+            choice = await asyncio.to_thread(show_main_menu)
+            if choice == "0":
+                console.print("[dim]再见。[/]")
+                return
+            if choice == "4":
+                old_threads = _session_chunk_threads
+                _session_output_dir, _session_max_tasks, _session_chunk_threads, _session_quality = await asyncio.to_thread(
+                    prompt_settings,
+                    _session_output_dir, _session_max_tasks, _session_chunk_threads, _session_quality,
+                )
+                if _session_chunk_threads != old_threads:
+                    # 手动设置的分块线程数优先于校准结果
+                    options.use_host_profiles = False
+                continue
+
+            output_dir = _session_output_dir
+            output_dir.mkdir(parents=True, exist_ok=True)
+
+            if choice == "1":
+                url = await asyncio.to_thread(Prompt.ask, "[cyan]请输入单集视频页 URL[/]")
+                if not url.strip():
+                    console.print("[yellow]已取消。[/]")
+                    continue
+                target = await run_single_url(
+                    url, output_dir,
+                    chunk_threads=_session_chunk_threads,
+                    preferred_quality=_session_quality,
+                    session=session,
+                    options=options,
+                )
+                if target:
+                    show_result_table([target.title], [], output_dir)
+
+            elif choice == "2":
+                path_str = await asyncio.to_thread(Prompt.ask, "[cyan]请输入批量 URL 文件路径（每行一个 URL，可为 .gz 等压缩文件）[/]")
+                path = Path(path_str).expanduser().resolve()
+                if not path.exists():
+                    console.print(f"[red]文件不存在: {path}[/]")
+                    continue
+                urls = collect_urls_from_batch_file(path)
+                if not urls:
+                    console.print("[red]文件中没有有效 URL。[/]")
+                    continue
+                console.print(f"[green]已读取 {len(urls)} 个链接。[/]")
+                success = await run_batch(
+                    urls, output_dir,
+                    max_concurrent_tasks=_session_max_tasks,
+                    chunk_threads=_session_chunk_threads,
+                    preferred_quality=_session_quality,
+                    session=session,
+                    options=options,
+                )
+                show_result_table(success, [] if len(success) == len(urls) else [f"共 {len(urls)} 条链接，成功 {len(success)} 条"], output_dir)
+
+            elif choice == "3":
+                list_url = await asyncio.to_thread(Prompt.ask, "[cyan]请输入系列/列表页 URL[/]")
+                if not list_url.strip():
+                    console.print("[yellow]已取消。[/]")
+                    continue
+                success = await run_list_page(
+                    list_url, output_dir,
+                    max_concurrent_tasks=_session_max_tasks,
+                    chunk_threads=_session_chunk_threads,
+                    preferred_quality=_session_quality,
+                    session=session,
+                    options=options,
+                )
+                show_result_table(success, [], output_dir)
+
+            if choice in ("1", "2", "3"):
+                if not await asyncio.to_thread(Confirm.ask, "[cyan]是否继续使用主菜单[/]", default=True):
+                    break
+        console.print()
+    finally:
+        await session.close()
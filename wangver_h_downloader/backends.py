@@ -0,0 +1,374 @@
+"""
+可插拔下载后端：统一的 submit / progress / pause / resume / cancel 接口。
+httpx 为默认的进程内分块下载引擎；aria2 通过 JSON-RPC 把下载交给 aria2c（原生多连接），
+Cookies/UA 由浏览器凭证转成请求头传给 aria2c。
+"""
+import asyncio
+import itertools
+import secrets
+import socket
+import subprocess
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+from urllib.parse import urlparse
+
+import httpx
+
+from .browser_cf import SessionCredentials
+from .config import (
+    ARIA2_POLL_INTERVAL,
+    ARIA2_RPC_SECRET,
+    ARIA2_RPC_URL,
+    ARIA2C_BIN,
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_CHUNK_THREADS,
+)
+from .downloader import output_name
+
+STATE_ACTIVE = "active"
+STATE_WAITING = "waiting"
+STATE_PAUSED = "paused"
+STATE_COMPLETE = "complete"
+STATE_ERROR = "error"
+STATE_REMOVED = "removed"
+
+
+@dataclass
+class DownloadProgress:
+    """任务状态快照：state 取值同 aria2（active/waiting/paused/complete/error/removed）。"""
+    state: str
+    completed: int = 0
+    total: int = 0                   # 0 表示尚未知道大小
+    path: Optional[Path] = None      # 完成后的文件路径
+    error: Optional[str] = None
+
+
+class DownloadBackend(ABC):
+    """
+    下载后端基类。submit 返回任务句柄，其余方法按句柄操作；子类须实现全部抽象方法，否则无法实例化。
+    download 为常用的一站式调用：提交、轮询进度（progress_callback 收到增量字节数）、返回最终路径。
+    用完后 await aclose() 释放后端持有的连接等资源。
+    """
+
+    name = ""
+    poll_interval = ARIA2_POLL_INTERVAL
+
+    @abstractmethod
+    async def submit(
+        self,
+        url: str,
+        title: str,
+        output_dir: Path,
+        credentials: Optional[SessionCredentials],
+        mirrors: Optional[Sequence[str]] = None,
+        chunk_threads: int = DEFAULT_CHUNK_THREADS,
+        size: int = 0,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> str:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def progress(self, handle: str) -> DownloadProgress:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def pause(self, handle: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def resume(self, handle: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def cancel(self, handle: str) -> None:
+        raise NotImplementedError
+
+    async def aclose(self) -> None:
+        """释放后端资源（默认无需处理）。"""
+
+    async def wait(self, handle: str, progress_callback: Optional[Callable[[int], None]] = None) -> Path:
+        """轮询直至完成；失败或被取消时抛出 RuntimeError。"""
+        reported = 0
+        while True:
+            p = await self.progress(handle)
+            if progress_callback and p.completed > reported:
+                progress_callback(p.completed - reported)
+                reported = p.completed
+            if p.state == STATE_COMPLETE:
+                return p.path
+            if p.state in (STATE_ERROR, STATE_REMOVED):
+                raise RuntimeError(p.error or f"下载{'已取消' if p.state == STATE_REMOVED else '失败'}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def download(
+        self,
+        url: str,
+        title: str,
+        output_dir: Path,
+        credentials: Optional[SessionCredentials],
+        progress_callback: Optional[Callable[[int], None]] = None,
+        mirrors: Optional[Sequence[str]] = None,
+        chunk_threads: int = DEFAULT_CHUNK_THREADS,
+        size: int = 0,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> Path:
+        handle = await self.submit(url, title, output_dir, credentials, mirrors, chunk_threads, size, chunk_size)
+        try:
+            return await self.wait(handle, progress_callback)
+        except asyncio.CancelledError:
+            # 调用方中断（如 Ctrl+C）：停止后端中的任务，已下载部分保留供续传
+            await asyncio.shield(self.cancel(handle))
+            raise
+
+
+@dataclass
+class _HttpxJob:
+    task: asyncio.Task
+    gate: asyncio.Event
+    total: int
+    completed: int = 0
+
+
+class HttpxBackend(DownloadBackend):
+    """进程内 httpx 分块下载（downloader.download_task）。暂停时不再开始新分块，在途分块照常完成。"""
+
+    name = "httpx"
+
+    def __init__(self):
+        self._jobs: Dict[str, _HttpxJob] = {}
+        self._ids = itertools.count(1)
+
+    async def submit(self, url, title, output_dir, credentials, mirrors=None,
+                     chunk_threads=DEFAULT_CHUNK_THREADS, size=0, chunk_size=DEFAULT_CHUNK_SIZE) -> str:
+        from .downloader import download_task
+
+        handle = str(next(self._ids))
+        gate = asyncio.Event()
+        gate.set()
+
+        def cb(n: int):
+            self._jobs[handle].completed += n
+
+        task = asyncio.create_task(download_task(
+            url, title, output_dir, credentials,
+            chunk_size=chunk_size, chunk_threads=chunk_threads, progress_callback=cb, mirrors=mirrors, gate=gate,
+        ))
+        self._jobs[handle] = _HttpxJob(task=task, gate=gate, total=size)
+        return handle
+
+    async def progress(self, handle: str) -> DownloadProgress:
+        job = self._jobs[handle]
+        if not job.task.done():
+            state = STATE_ACTIVE if job.gate.is_set() else STATE_PAUSED
+            return DownloadProgress(state, job.completed, job.total)
+        if job.task.cancelled():
+            return DownloadProgress(STATE_REMOVED, job.completed, job.total)
+        exc = job.task.exception()
+        if exc is not None:
+            return DownloadProgress(STATE_ERROR, job.completed, job.total, error=str(exc) or type(exc).__name__)
+        return DownloadProgress(STATE_COMPLETE, job.completed, job.total, path=job.task.result())
+
+    async def pause(self, handle: str) -> None:
+        self._jobs[handle].gate.clear()
+
+    async def resume(self, handle: str) -> None:
+        self._jobs[handle].gate.set()
+
+    async def cancel(self, handle: str) -> None:
+        job = self._jobs[handle]
+        job.task.cancel()
+        await asyncio.gather(job.task, return_exceptions=True)
+
+    async def download(self, url, title, output_dir, credentials, progress_callback=None, mirrors=None,
+                       chunk_threads=DEFAULT_CHUNK_THREADS, size=0, chunk_size=DEFAULT_CHUNK_SIZE) -> Path:
+        # 进程内引擎直接等待任务并透传进度回调，无需轮询
+        from .downloader import download_task
+
+        return await download_task(
+            url, title, output_dir, credentials,
+            chunk_size=chunk_size, chunk_threads=chunk_threads, progress_callback=progress_callback, mirrors=mirrors,
+        )
+
+
+class Aria2Backend(DownloadBackend):
+    """
+    aria2 JSON-RPC 后端。output_dir 须是 aria2c 所在机器上可写的路径（本机或共享目录）；
+    镜像直链作为同一资源的多个 URI 提交，由 aria2c 在各源之间分摊连接。
+    """
+
+    name = "aria2"
+
+    def __init__(self, rpc_url: str = ARIA2_RPC_URL, secret: str = ARIA2_RPC_SECRET, timeout: float = 30):
+        self.rpc_url = rpc_url
+        self.secret = secret
+        self.timeout = timeout
+        self._ids = itertools.count(1)
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def call(self, method: str, *params):
+        """
+        调用 aria2 RPC 方法（自动附带 token），返回 result；RPC 报错时抛出 RuntimeError，
+        响应不是 JSON 时（如代理返回的 401/5xx 页面）按 HTTP 状态抛出 httpx.HTTPStatusError。
+        """
+        args: List = [f"token:{self.secret}", *params] if self.secret else list(params)
+        body = {"jsonrpc": "2.0", "id": str(next(self._ids)), "method": method, "params": args}
+        if self._client is None:
+            # 整个后端复用一个连接（轮询 tellStatus 时不反复建连）；RPC 通常在本机，不走系统代理
+            self._client = httpx.AsyncClient(timeout=self.timeout, trust_env=False)
+        r = await self._client.post(self.rpc_url, json=body)
+        try:
+            data = r.json()
+        except ValueError:
+            r.raise_for_status()
+            raise RuntimeError(f"aria2 {method}: 无法解析的响应（HTTP {r.status_code}）") from None
+        if isinstance(data, dict) and data.get("error"):
+            raise RuntimeError(f"aria2 {method}: {data['error'].get('message')}")
+        r.raise_for_status()
+        return data.get("result")
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @staticmethod
+    def _headers(credentials: Optional[SessionCredentials]) -> List[str]:
+        if not credentials:
+            return []
+        return [f"{k}: {v}" for k, v in credentials.headers().items() if v]
+
+    async def submit(self, url, title, output_dir, credentials, mirrors=None,
+                     chunk_threads=DEFAULT_CHUNK_THREADS, size=0, chunk_size=DEFAULT_CHUNK_SIZE) -> str:
+        safe_title, ext = output_name(url, title)
+        uris = list(dict.fromkeys([url, *(mirrors or [])]))
+        # aria2 的选项值均为字符串；已存在的同名文件配合 .aria2 控制文件续传
+        options = {
+            "dir": str(Path(output_dir).resolve()),
+            "out": safe_title + ext,
+            "header": self._headers(credentials),
+            "split": str(max(1, chunk_threads)),
+            "max-connection-per-server": str(min(16, max(1, chunk_threads))),
+            # aria2 的分块下限为 1M
+            "min-split-size": str(max(1024 * 1024, chunk_size)),
+            "continue": "true",
+            "auto-file-renaming": "false",
+            "allow-overwrite": "false",
+        }
+        return await self.call("aria2.addUri", uris, options)
+
+    async def progress(self, handle: str) -> DownloadProgress:
+        st = await self.call(
+            "aria2.tellStatus", handle,
+            ["status", "totalLength", "completedLength", "errorCode", "errorMessage", "files"],
+        )
+        files = st.get("files") or []
+        path = Path(files[0]["path"]) if files and files[0].get("path") else None
+        error = None
+        if st.get("status") == STATE_ERROR:
+            error = f"aria2 错误 {st.get('errorCode')}: {st.get('errorMessage')}"
+        return DownloadProgress(
+            state=st.get("status", STATE_ERROR),
+            completed=int(st.get("completedLength") or 0),
+            total=int(st.get("totalLength") or 0),
+            path=path,
+            error=error,
+        )
+
+    async def pause(self, handle: str) -> None:
+        await self.call("aria2.forcePause", handle)
+
+    async def resume(self, handle: str) -> None:
+        await self.call("aria2.unpause", handle)
+
+    async def cancel(self, handle: str) -> None:
+        try:
+            await self.call("aria2.forceRemove", handle)
+        except RuntimeError:
+            # 任务已结束（完成/出错）时无法移除，忽略
+            pass
+
+
+class LocalAria2c:
+    """
+    在本机启动一个仅监听回环地址的 aria2c RPC 进程（单机使用或测试），退出时结束进程。
+    用法：with LocalAria2c() as aria2: backend = aria2.backend()
+    """
+
+    def __init__(self, port: int = 0, secret: Optional[str] = None, binary: str = ARIA2C_BIN):
+        self.port = port or _free_port()
+        self.secret = secret or secrets.token_hex(16)
+        self.binary = binary
+        self.proc: Optional[subprocess.Popen] = None
+
+    @property
+    def rpc_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/jsonrpc"
+
+    def backend(self) -> Aria2Backend:
+        return Aria2Backend(self.rpc_url, self.secret)
+
+    def start(self, timeout: float = 10) -> "LocalAria2c":
+        try:
+            self.proc = subprocess.Popen(
+                [
+                    self.binary, "--enable-rpc", "--rpc-listen-all=false",
+                    f"--rpc-listen-port={self.port}", f"--rpc-secret={self.secret}",
+                    "--quiet=true", "--console-log-level=error",
+                ],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        except FileNotFoundError:
+            raise RuntimeError(f"未找到 aria2c（{self.binary}），请安装 aria2 或设置 WANGVER_ARIA2C") from None
+        deadline = time.monotonic() + timeout
+        host = urlparse(self.rpc_url).hostname
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"aria2c 启动失败（退出码 {self.proc.returncode}）")
+            try:
+                socket.create_connection((host, self.port), timeout=0.5).close()
+                return self
+            except OSError:
+                time.sleep(0.1)
+        self.stop()
+        raise RuntimeError("aria2c RPC 启动超时")
+
+    def stop(self) -> None:
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+        self.proc = None
+
+    def __enter__(self) -> "LocalAria2c":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# 名称 -> 后端类；新增后端时在此登记，并加入 config.DOWNLOAD_BACKENDS 供 --backend 选用
+BACKENDS: Dict[str, type] = {
+    HttpxBackend.name: HttpxBackend,
+    Aria2Backend.name: Aria2Backend,
+}
+
+
+def get_backend(name: str, **options) -> DownloadBackend:
+    """按名称创建后端实例；options 传给后端构造函数（如 aria2 的 rpc_url / secret）。"""
+    try:
+        cls = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"未知下载后端: {name}（可选: {', '.join(BACKENDS)}）") from None
+    return cls(**options)
@@ -3,17 +3,31 @@
 真实浏览器 + 非无头 + 用户数据持久化 + 智能拦截挂起 + 人工介入 + 会话接力。
 """
 import asyncio
+from contextlib import asynccontextmanager
 from pathlib import Path
 from dataclasses import dataclass
-from typing import Optional, Callable, Awaitable
+from typing import Optional, Callable, Awaitable, AsyncIterator, Sequence
+from urllib.parse import urlparse
 
-from playwright.async_api import async_playwright, BrowserContext, Page, Response
+from playwright.async_api import (
+    async_playwright,
+    BrowserContext,
+    Page,
+    Response,
+    Route,
+    Error as PlaywrightError,
+)
 
 from .config import (
     DEFAULT_USER_DATA_DIR,
+    DEFAULT_BROWSER_IDLE_TIMEOUT,
     CF_FORBIDDEN_STATUS,
     CF_INDICATOR_TEXTS,
     CF_INDICATOR_SELECTORS,
+    BLOCK_RESOURCE_TYPES,
+    BLOCK_HOSTS,
+    ALLOW_HOSTS,
+    ALLOW_PATH_PREFIXES,
 )
 
 
@@ -23,6 +37,71 @@ class SessionCredentials:
     cookies: list  # 列表 of dict with name, value, domain, path 等
     user_agent: str
 
+    def cookie_header(self) -> str:
+        """Cookies 拼成的 Cookie 请求头值（没有可用的 Cookie 时为空串）。"""
+        return "; ".join(
+            f"{c['name']}={c['value']}" for c in self.cookies if c.get("name") and c.get("value") is not None
+        )
+
+    def headers(self) -> dict:
+        """媒体请求使用的请求头：User-Agent 与 Cookie（没有 Cookie 时省略）。"""
+        headers = {"User-Agent": self.user_agent}
+        cookie = self.cookie_header()
+        if cookie:
+            headers["Cookie"] = cookie
+        return headers
+
+
+# 页内一次性判定 CF 特征：标题/正文文字 + 选择器合并为一次 querySelector，无需把整页 DOM 传回 Python
+_CF_STATE_JS = """
+([texts, selectors, realSelector]) => {
+    if (realSelector && document.querySelector(realSelector)) return "content";
+    const title = document.title || "";
+    const body = document.body ? document.body.innerText || "" : "";
+    if (texts.some(t => title.includes(t) || body.includes(t))) return "cf";
+    if (selectors && document.querySelector(selectors)) return "cf";
+    return document.readyState === "loading" ? null : "clear";
+}
+"""
+
+# 等待 CF 解除：特征消失或真实内容出现时返回真值（每帧判定，挑战通过后毫秒级感知）
+_CF_CLEARED_JS = """
+([texts, selectors, realSelector]) => {
+    if (realSelector && document.querySelector(realSelector)) return "content";
+    if (document.readyState === "loading") return null;
+    const title = document.title || "";
+    const body = document.body ? document.body.innerText || "" : "";
+    if (texts.some(t => title.includes(t) || body.includes(t))) return null;
+    if (selectors && document.querySelector(selectors)) return null;
+    return "clear";
+}
+"""
+
+CF_ALERT_MESSAGE = "触发 Cloudflare 拦截，请在弹出的浏览器窗口中手动完成验证！"
+
+
+def _host_matches(host: str, domains: Sequence[str]) -> bool:
+    """host 等于某域名或为其子域名。"""
+    return any(host == d or host.endswith("." + d) for d in domains)
+
+
+def should_block_request(
+    url: str,
+    resource_type: str,
+    block_resource_types: Sequence[str] = BLOCK_RESOURCE_TYPES,
+    block_hosts: Sequence[str] = BLOCK_HOSTS,
+    allow_hosts: Sequence[str] = ALLOW_HOSTS,
+    allow_path_prefixes: Sequence[str] = ALLOW_PATH_PREFIXES,
+) -> bool:
+    """判断浏览器请求是否应被拦截；放行名单（CF 验证相关）优先。"""
+    p = urlparse(url)
+    host = (p.hostname or "").lower()
+    if _host_matches(host, allow_hosts) or any((p.path or "").startswith(x) for x in allow_path_prefixes):
+        return False
+    if resource_type in block_resource_types:
+        return True
+    return _host_matches(host, block_hosts)
+
 
 def _default_cf_alert_callback(message: str) -> None:
     """默认：在控制台输出醒目提示。"""
@@ -41,17 +120,20 @@ class BrowserCFHandler:
         user_data_dir: Optional[Path] = None,
         headless: bool = False,
         on_cf_triggered: Optional[Callable[[str], None]] = None,
+        block_requests: bool = True,
     ):
         self.user_data_dir = Path(user_data_dir or DEFAULT_USER_DATA_DIR)
         self.headless = headless
         self.on_cf_triggered = on_cf_triggered or _default_cf_alert_callback
+        self.block_requests = block_requests
 
         self._playwright = None
         self._context: Optional[BrowserContext] = None
         self._page: Optional[Page] = None
         self._cf_detected = asyncio.Event()  # 触发 CF 时 set
         self._cf_passed = asyncio.Event()   # 验证通过后 set
-        self._last_response_status: Optional[int] = None
+        self._last_response_status: Optional[int] = None  # 最近一次主文档响应状态码
+        self._document_response = asyncio.Event()  # 主文档每次导航响应时 set
 
     async def start(self) -> None:
         """启动 Playwright 与浏览器，使用持久化用户数据目录。"""
@@ -63,16 +145,61 @@ class BrowserCFHandler:
             args=["--disable-blink-features=AutomationControlled"],
             viewport={"width": 1280, "height": 720},
         )
+        if self.block_requests:
+            await self._context.route("**/*", self._route_filter)
         self._page = await self._context.new_page()
 
-        # 监听响应：403 时标记 CF 触发
-        async def on_response(response: Response):
+        # 监听主文档响应：403 时标记 CF 触发；图片等子资源的 403 不计入
+        def on_response(response: Response):
+            if response.request.resource_type != "document" or response.frame != self._page.main_frame:
+                return
             self._last_response_status = response.status
+            self._document_response.set()
             if response.status == CF_FORBIDDEN_STATUS:
                 self._cf_detected.set()
 
         self._page.on("response", on_response)
 
+    async def _route_filter(self, route: Route) -> None:
+        """请求过滤：拦截图片/媒体/字体与第三方广告统计，其余放行。"""
+        request = route.request
+        if should_block_request(request.url, request.resource_type):
+            await route.abort()
+        else:
+            await route.continue_()
+
+    def _cf_js_args(self, real_content_selector: Optional[str]) -> list:
+        return [list(CF_INDICATOR_TEXTS), ", ".join(CF_INDICATOR_SELECTORS), real_content_selector]
+
+    async def _page_cf_state(self, real_content_selector: Optional[str]) -> Optional[str]:
+        """页内判定当前文档状态："content" / "cf" / "clear"；导航中上下文被销毁时返回 None。"""
+        try:
+            return await self._page.evaluate(_CF_STATE_JS, self._cf_js_args(real_content_selector))
+        except PlaywrightError:
+            return None
+
+    async def _wait_cf_cleared(self, real_content_selector: Optional[str]) -> None:
+        """
+        等待 CF 验证通过：页内按帧判定特征消失/真实内容出现；
+        验证通过引起的跳转会销毁执行上下文，此时等新文档加载后继续判定。
+        仍停留在 403 文档时，等待下一次主文档响应再判定。
+        """
+        args = self._cf_js_args(real_content_selector)
+        while True:
+            try:
+                handle = await self._page.wait_for_function(
+                    _CF_CLEARED_JS, arg=args, polling="raf", timeout=0,
+                )
+                state = await handle.json_value()
+            except PlaywrightError:
+                await self._page.wait_for_load_state("domcontentloaded", timeout=0)
+                continue
+            if state == "content" or self._last_response_status != CF_FORBIDDEN_STATUS:
+                self._cf_passed.set()
+                return
+            self._document_response.clear()
+            await self._document_response.wait()
+
     async def goto_and_handle_cf(
         self,
         url: str,
@@ -82,74 +209,34 @@ class BrowserCFHandler:
     ) -> SessionCredentials:
         """
         导航至目标页，若检测到 CF 则挂起并提示人工介入，验证通过后提取凭证。
-        - real_content_selector: 真实视频页加载后的 DOM 选择器，用于轮询判断是否通过。
+        检测由导航响应（主文档 403）与一次页内判定驱动，不再定时轮询整页 HTML。
+        - real_content_selector: 真实视频页加载后的 DOM 选择器，出现即视为已通过。
         - wait_for_enter: 是否同时等待用户在终端按 Enter 确认放行。
         """
         self._cf_detected.clear()
         self._cf_passed.clear()
-        await self._page.goto(url, wait_until=wait_until, timeout=60000)
-
-        # 轮询：若当前页有 CF 特征则挂起并提示
-        async def check_and_pause():
-            while True:
-                await asyncio.sleep(0.5)
-                if self._cf_detected.is_set():
-                    self.on_cf_triggered(
-                        "触发 Cloudflare 拦截，请在弹出的浏览器窗口中手动完成验证！"
-                    )
-                    break
-                content = await self._page.content()
-                if any(t in content for t in CF_INDICATOR_TEXTS):
-                    self._cf_detected.set()
-                    self.on_cf_triggered(
-                        "触发 Cloudflare 拦截，请在弹出的浏览器窗口中手动完成验证！"
-                    )
-                    break
-                for sel in CF_INDICATOR_SELECTORS:
-                    try:
-                        if await self._page.locator(sel).count() > 0:
-                            self._cf_detected.set()
-                            self.on_cf_triggered(
-                                "触发 Cloudflare 拦截，请在弹出的浏览器窗口中手动完成验证！"
-                            )
-                            break
-                    except Exception:
-                        pass
-                else:
-                    # 本轮未发现 CF 特征，结束轮询
-                    break
-                break
-
-        await check_and_pause()
-
-        # 若触发了 CF，等待“验证通过”：轮询真实内容或用户按 Enter
-        page_content = await self._page.content()
-        if self._cf_detected.is_set() or any(t in page_content for t in CF_INDICATOR_TEXTS):
-            async def wait_real_content():
-                while True:
-                    await asyncio.sleep(1)
-                    if real_content_selector:
-                        try:
-                            if await self._page.locator(real_content_selector).count() > 0:
-                                self._cf_passed.set()
-                                return
-                        except Exception:
-                            pass
-                    # 或 403 消失、状态码正常
-                    if self._last_response_status != CF_FORBIDDEN_STATUS:
-                        content = await self._page.content()
-                        if not any(t in content for t in CF_INDICATOR_TEXTS):
-                            self._cf_passed.set()
-                            return
+        response = await self._page.goto(url, wait_until=wait_until, timeout=60000)
+        if response is not None and response.status == CF_FORBIDDEN_STATUS:
+            self._cf_detected.set()
+
+        # 干净页面：一次页内判定即返回；仅在 403 或出现 CF 特征时挂起
+        if not self._cf_detected.is_set():
+            state = await self._page_cf_state(real_content_selector)
+            if state is None:
+                await self._page.wait_for_load_state(wait_until)
+                state = await self._page_cf_state(real_content_selector)
+            if state == "cf":
+                self._cf_detected.set()
 
+        if self._cf_detected.is_set():
+            self.on_cf_triggered(CF_ALERT_MESSAGE)
             if wait_for_enter:
-                loop = asyncio.get_event_loop()
                 await asyncio.gather(
-                    wait_real_content(),
-                    asyncio.get_event_loop().run_in_executor(None, lambda: input("验证完成后请按 Enter 继续... ")),
+                    self._wait_cf_cleared(real_content_selector),
+                    asyncio.get_running_loop().run_in_executor(None, lambda: input("验证完成后请按 Enter 继续... ")),
                 )
             else:
-                await wait_real_content()
+                await self._wait_cf_cleared(real_content_selector)
 
         # 提取 Cookies 与 User-Agent
         cookies = await self._context.cookies()
@@ -162,6 +249,20 @@ class BrowserCFHandler:
             return await self._page.content()
         return ""
 
+    async def fetch_in_new_tab(self, url: str, wait_until: str = "domcontentloaded") -> str:
+        """
+        在同一浏览器上下文的新标签页中打开 url 并返回 HTML，共享已通过 CF 的 Cookies，
+        可与主页面并发使用（如分页抓取）。遇到 CF 403 时抛出 RuntimeError，不挂起。
+        """
+        page = await self._context.new_page()
+        try:
+            response = await page.goto(url, wait_until=wait_until, timeout=60000)
+            if response is not None and response.status == CF_FORBIDDEN_STATUS:
+                raise RuntimeError(f"触发 Cloudflare 拦截: {url}")
+            return await page.content()
+        finally:
+            await page.close()
+
     def get_page(self) -> Optional[Page]:
         return self._page
 
@@ -173,3 +274,99 @@ class BrowserCFHandler:
         self._page = None
         self._context = None
         self._playwright = None
+
+
+class BrowserSession:
+    """
+    跨阶段复用的浏览器会话：列表页解析、批量解析、交互菜单多次操作共用同一个 BrowserCFHandler，
+    避免每个阶段都冷启动 Chrome 并重新过 CF。
+    引用计数归零后开始空闲计时，超过 idle_timeout 秒无人使用才真正关闭浏览器。
+    """
+
+    def __init__(
+        self,
+        user_data_dir: Optional[Path] = None,
+        headless: bool = False,
+        on_cf_triggered: Optional[Callable[[str], None]] = None,
+        idle_timeout: Optional[float] = DEFAULT_BROWSER_IDLE_TIMEOUT,
+        block_requests: bool = True,
+    ):
+        self.user_data_dir = Path(user_data_dir or DEFAULT_USER_DATA_DIR)
+        self.headless = headless
+        self.on_cf_triggered = on_cf_triggered
+        self.idle_timeout = idle_timeout
+        self.block_requests = block_requests
+
+        self._handler: Optional[BrowserCFHandler] = None
+        self._lock = asyncio.Lock()
+        self._users = 0
+        self._idle_handle: Optional[asyncio.TimerHandle] = None
+        # 持有空闲关闭任务的引用，防止未完成时被回收
+        self._close_tasks: set = set()
+
+    @property
+    def is_open(self) -> bool:
+        return self._handler is not None
+
+    def _cancel_idle_timer(self) -> None:
+        if self._idle_handle is not None:
+            self._idle_handle.cancel()
+            self._idle_handle = None
+
+    async def acquire(self) -> BrowserCFHandler:
+        """取得（必要时启动）共享的浏览器处理器，并增加引用计数。"""
+        async with self._lock:
+            self._cancel_idle_timer()
+            if self._handler is None:
+                handler = BrowserCFHandler(
+                    user_data_dir=self.user_data_dir,
+                    headless=self.headless,
+                    on_cf_triggered=self.on_cf_triggered,
+                    block_requests=self.block_requests,
+                )
+                await handler.start()
+                self._handler = handler
+            self._users += 1
+            return self._handler
+
+    def release(self) -> None:
+        """归还处理器；无人使用时按 idle_timeout 安排关闭。"""
+        self._users = max(0, self._users - 1)
+        if self._users > 0 or self._handler is None or self.idle_timeout is None:
+            return
+        loop = asyncio.get_running_loop()
+        if self.idle_timeout <= 0:
+            self._schedule_close(loop)
+            return
+        self._cancel_idle_timer()
+        self._idle_handle = loop.call_later(self.idle_timeout, self._schedule_close, loop)
+
+    def _schedule_close(self, loop: asyncio.AbstractEventLoop) -> None:
+        task = loop.create_task(self._close_if_idle())
+        self._close_tasks.add(task)
+        task.add_done_callback(self._close_tasks.discard)
+
+    @asynccontextmanager
+    async def use(self) -> AsyncIterator[BrowserCFHandler]:
+        """async with session.use() as handler: ... 用完自动归还。"""
+        handler = await self.acquire()
+        try:
+            yield handler
+        finally:
+            self.release()
+
+    async def _close_if_idle(self) -> None:
+        async with self._lock:
+            self._idle_handle = None
+            if self._users == 0 and self._handler is not None:
+                handler, self._handler = self._handler, None
+                await handler.close()
+
+    async def close(self) -> None:
+        """立即关闭浏览器（不论引用计数），用于程序退出。"""
+        async with self._lock:
+            self._cancel_idle_timer()
+            self._users = 0
+            if self._handler is not None:
+                handler, self._handler = self._handler, None
+                await handler.close()
@@ -0,0 +1,220 @@
+"""
+下载引擎参数校准：对同一直链按「并发分块数 × 分块大小」网格下载采样区间，
+测量吞吐与出错率，按 CDN 主机保存最佳组合；之后下载该主机的直链时自动套用。
+"""
+import asyncio
+import json
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+from urllib.parse import urlparse
+
+import httpx
+
+from .config import (
+    CALIBRATE_CHUNK_SIZES,
+    CALIBRATE_MAX_ERROR_RATE,
+    CALIBRATE_SAMPLE_BYTES,
+    CALIBRATE_THREADS,
+    CALIBRATE_TRIAL_SECONDS,
+    DEFAULT_HOST_PROFILES_FILE,
+)
+from .browser_cf import SessionCredentials
+from .connections import HTTPX_DOWNLOAD_KWARGS
+from .downloader import _parse_total_size
+from .file_manager import atomic_write_text
+
+# 吞吐相差不超过该比例时选择并发更低的组合（对 CDN 更友好、更不易触发限速）
+_TIE_RATIO = 0.05
+
+
+@dataclass
+class Trial:
+    """一组参数的测量结果。"""
+    chunk_threads: int
+    chunk_size: int
+    bytes: int = 0
+    seconds: float = 0.0
+    requests: int = 0
+    errors: int = 0
+
+    @property
+    def throughput(self) -> float:
+        """字节/秒。"""
+        return self.bytes / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def error_rate(self) -> float:
+        return self.errors / self.requests if self.requests else 1.0
+
+
+@dataclass
+class HostProfile:
+    """某 CDN 主机的最佳下载参数。"""
+    host: str
+    chunk_threads: int
+    chunk_size: int
+    throughput: float
+    error_rate: float
+    updated: int = 0
+
+
+def host_of(url: str) -> str:
+    return (urlparse(url).hostname or "").lower()
+
+
+class ProfileStore:
+    """按主机保存校准结果（JSON，原子写入）。"""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path or DEFAULT_HOST_PROFILES_FILE)
+        self._data: Dict[str, dict] = {}
+        if self.path.exists():
+            try:
+                self._data = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                self._data = {}
+
+    def get(self, host: str) -> Optional[HostProfile]:
+        d = self._data.get(host.lower())
+        try:
+            return HostProfile(**d) if d else None
+        except TypeError:
+            return None
+
+    def for_url(self, url: str) -> Optional[HostProfile]:
+        return self.get(host_of(url))
+
+    def put(self, profile: HostProfile) -> None:
+        profile.updated = profile.updated or int(time.time())
+        self._data[profile.host.lower()] = asdict(profile)
+        atomic_write_text(self.path, json.dumps(self._data, ensure_ascii=False, indent=1))
+
+
+_default_store: Optional[ProfileStore] = None
+
+
+def get_default_store() -> ProfileStore:
+    global _default_store
+    if _default_store is None:
+        _default_store = ProfileStore()
+    return _default_store
+
+
+async def media_size(url: str, credentials: Optional[SessionCredentials]) -> int:
+    """用 Range: bytes=0-0 取得文件大小；服务器不支持 Range 时抛出 RuntimeError（无法分块，也就无需校准）。"""
+    async with httpx.AsyncClient(**HTTPX_DOWNLOAD_KWARGS) as client:
+        async with client.stream("GET", url, headers={**(credentials.headers() if credentials else {}), "Range": "bytes=0-0"}) as r:
+            r.raise_for_status()
+            if r.status_code != 206:
+                raise RuntimeError("服务器不支持 Range 请求，无法分块下载")
+            size = _parse_total_size(r)
+    if size <= 0:
+        raise RuntimeError("无法取得文件大小")
+    return size
+
+
+async def measure(
+    url: str,
+    credentials: Optional[SessionCredentials],
+    chunk_threads: int,
+    chunk_size: int,
+    file_size: int,
+    sample_bytes: int = CALIBRATE_SAMPLE_BYTES,
+    offset: int = 0,
+    time_limit: float = CALIBRATE_TRIAL_SECONDS,
+) -> Trial:
+    """
+    以 chunk_threads 并发、chunk_size 分块下载约 sample_bytes 字节（从 offset 起，越过文件末尾后回绕），
+    数据直接丢弃。与下载引擎一致，每个在途分块占用一条连接、分块之间复用连接
+    （每组参数使用新的连接池，不沿用上一组的连接）。超过 time_limit 秒后不再发起新分块。
+    """
+    trial = Trial(chunk_threads, chunk_size)
+    chunk_size = min(chunk_size, file_size)
+    count = max(chunk_threads, -(-min(sample_bytes, file_size) // chunk_size))
+    ranges = []
+    for i in range(count):
+        start = (offset + i * chunk_size) % file_size
+        ranges.append((start, min(start + chunk_size, file_size) - 1))
+    queue: asyncio.Queue = asyncio.Queue()
+    for r in ranges:
+        queue.put_nowait(r)
+    headers = credentials.headers() if credentials else {}
+    started = time.monotonic()
+    deadline = started + time_limit
+
+    async def worker(client: httpx.AsyncClient):
+        while not queue.empty() and time.monotonic() < deadline:
+            start, end = queue.get_nowait()
+            trial.requests += 1
+            received = 0
+            try:
+                async with client.stream("GET", url, headers={**headers, "Range": f"bytes={start}-{end}"}) as r:
+                    r.raise_for_status()
+                    async for data in r.aiter_bytes():
+                        received += len(data)
+                if received != end - start + 1:
+                    raise httpx.HTTPError("分块长度不符")
+            except httpx.HTTPError:
+                trial.errors += 1
+            # 出错分块已收到的字节也计入吞吐（占用了同样的带宽）
+            trial.bytes += received
+
+    async with httpx.AsyncClient(**HTTPX_DOWNLOAD_KWARGS, limits=httpx.Limits(max_connections=None)) as client:
+        await asyncio.gather(*[worker(client) for _ in range(chunk_threads)])
+    trial.seconds = time.monotonic() - started
+    return trial
+
+
+def best_trial(trials: Sequence[Trial], max_error_rate: float = CALIBRATE_MAX_ERROR_RATE) -> Optional[Trial]:
+    """出错率不超过上限的组合中吞吐最高者；吞吐相差不到 5% 时取并发更低、分块更大的组合。"""
+    ok = [t for t in trials if t.requests and t.error_rate <= max_error_rate]
+    if not ok:
+        return None
+    top = max(t.throughput for t in ok)
+    near = [t for t in ok if t.throughput >= top * (1 - _TIE_RATIO)]
+    return min(near, key=lambda t: (t.chunk_threads, -t.chunk_size))
+
+
+async def calibrate(
+    url: str,
+    credentials: Optional[SessionCredentials],
+    threads: Sequence[int] = CALIBRATE_THREADS,
+    chunk_sizes: Sequence[int] = CALIBRATE_CHUNK_SIZES,
+    sample_bytes: int = CALIBRATE_SAMPLE_BYTES,
+    on_trial: Optional[Callable[[Trial], None]] = None,
+) -> List[Trial]:
+    """
+    依次测量网格中每组参数，返回全部结果。各组从文件不同位置采样，
+    避免后一组命中前一组刚刚加热的 CDN 缓存而虚高。
+    """
+    size = await media_size(url, credentials)
+    trials: List[Trial] = []
+    offset = 0
+    for n in threads:
+        for cs in chunk_sizes:
+            t = await measure(url, credentials, n, cs, size, sample_bytes=sample_bytes, offset=offset)
+            trials.append(t)
+            offset = (offset + sample_bytes) % size
+            if on_trial:
+                on_trial(t)
+    return trials
+
+
+def profile_from_trial(url: str, trial: Trial) -> HostProfile:
+    return HostProfile(
+        host=host_of(url),
+        chunk_threads=trial.chunk_threads,
+        chunk_size=trial.chunk_size,
+        throughput=round(trial.throughput, 1),
+        error_rate=round(trial.error_rate, 4),
+    )
+
+
+def parse_int_list(spec: str, scale: int = 1) -> List[int]:
+    """解析 "2,4,8" 形式的列表（scale 用于 MB 换算）；非法值抛出 ValueError。"""
+    values = [int(float(x) * scale) for x in spec.split(",") if x.strip()]
+    if not values or any(v <= 0 for v in values):
+        raise ValueError(f"无效的列表: {spec!r}")
+    return values
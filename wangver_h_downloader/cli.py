@@ -1,451 +1,486 @@
 """
-CLI 入口与 Rich 终端界面：主菜单、交互式流程、统一进度与结果展示。
+CLI 入口：解析命令行参数并分发到具体流程。
+本模块只依赖轻量模块（argparse、config、parser），Rich 界面、Playwright 与下载引擎
+在所选命令真正需要时才导入，保证 --help 等命令的启动速度（见 benchmarks/bench_startup.py）。
 """
-import asyncio
 import sys
 from pathlib import Path
-from typing import List, Optional
-
-from rich.console import Console, Group
-from rich.panel import Panel
-from rich.progress import (
-    Progress,
-    SpinnerColumn,
-    TextColumn,
-    BarColumn,
-    DownloadColumn,
-    TaskProgressColumn,
-    TimeRemainingColumn,
-)
-from rich.prompt import Prompt, IntPrompt, Confirm
-from rich.rule import Rule
-from rich.table import Table
-from rich.text import Text
-from rich import box
 
-from . import ui_theme as theme
 from .config import (
     DEFAULT_OUTPUT_DIR,
+    DEFAULT_SCRATCH_DIR,
+    DEFAULT_MOVE_WORKERS,
+    DEFAULT_STREAM_PORT,
     DEFAULT_USER_DATA_DIR,
     DEFAULT_MAX_CONCURRENT_TASKS,
     DEFAULT_CHUNK_THREADS,
+    DEFAULT_MEMORY_BUDGET,
+    DEFAULT_PROXIES,
+    PROXY_DEFAULT_ROUTE,
+    PROXY_SCHEMES,
     DEFAULT_QUALITY,
+    DEFAULT_BROWSER_IDLE_TIMEOUT,
+    DEFAULT_MAX_LIST_PAGES,
+    DEFAULT_SYNC_STATE_FILE,
+    DEFAULT_JOURNAL_FILE,
+    DEFAULT_SCHEDULE_POLICY,
+    DEFAULT_MIN_FREE_BYTES,
+    SCHEDULE_POLICIES,
+    POSTPROCESS_STEPS,
+    DEFAULT_POSTPROCESS_WORKERS,
+    DOWNLOAD_BACKENDS,
+    DEFAULT_DOWNLOAD_BACKEND,
+    ARIA2_RPC_URL,
+    CALIBRATE_THREADS,
+    CALIBRATE_CHUNK_SIZES,
+    CALIBRATE_SAMPLE_BYTES,
+    DEFAULT_HOST_PROFILES_FILE,
+    DEFAULT_RESOLVE_CONCURRENCY,
+    MANIFEST_FORMATS,
     QUALITY_OPTIONS,
 )
-from .parser import (
-    VideoTarget,
-    parse_single_page_html,
-    collect_urls_from_batch_file,
-    extract_list_page_video_links,
-)
-from .browser_cf import BrowserCFHandler, SessionCredentials
-from .downloader import download_task
-
+from .parser import collect_urls_from_batch_file, iter_batch_urls
 
-# 全局控制台（单例）
-console = Console(force_terminal=True, no_color=False)
 
+def __getattr__(name: str):
+    """兼容旧用法（from wangver_h_downloader.cli import run_batch 等）：按需转发到 app 模块。"""
+    if name.startswith("__"):
+        raise AttributeError(name)
+    from . import app
 
-def _cf_alert_rich(message: str) -> None:
-    """CF 触发时在 Rich 控制台输出醒目提示。"""
-    console.print()
-    console.print(Panel(
-        Text(message, style="bold red"),
-        title="[bold]🚨 Cloudflare 拦截[/bold]",
-        border_style="red",
-        box=box.DOUBLE,
-        padding=(1, 2),
-    ))
-    console.print("[dim]请在弹出窗口中完成验证后，回到此处按 Enter 继续。[/]")
-    console.print()
-
-
-def show_banner() -> None:
-    """显示应用横幅。"""
-    title = Text("WangVer H-Downloader", style="bold magenta")
-    subtitle = Text("专为 hanime1.me 定制 · 浏览器过 CF + 多线程下载", style="dim white")
-    console.print()
-    console.print(Rule(style="cyan"))
-    console.print(Panel(
-        Group(title, Text(), subtitle),
-        border_style="blue",
-        box=box.ROUNDED,
-        padding=(1, 3),
-    ))
-    console.print(Rule(style="cyan"))
-    console.print()
-
-
-def show_main_menu() -> str:
-    """显示主菜单并返回用户选择。"""
-    table = Table.grid(expand=True)
-    table.add_column(style="bold yellow", width=4)
-    table.add_column(style="dim white")
-    table.add_row("1", "单链接下载 — 输入一集视频页 URL")
-    table.add_row("2", "批量下载 — 从 .txt 文件导入多个链接")
-    table.add_row("3", "列表页下载 — 输入系列/列表页 URL 自动抓取全部")
-    table.add_row("4", "设置 — 输出目录、并发数、画质等")
-    table.add_row("0", "退出")
-    console.print(Panel(
-        table,
-        title="[bold blue] 请选择操作[/]",
-        border_style="blue",
-        box=box.ROUNDED,
-        padding=(1, 2),
-    ))
-    return Prompt.ask(
-        "[cyan]请输入选项[/]",
-        choices=["0", "1", "2", "3", "4"],
-        default="1",
-    )
+    try:
+        return getattr(app, name)
+    except AttributeError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
 
 
-def prompt_settings(
-    default_output: Path,
-    default_max_tasks: int,
-    default_chunk_threads: int,
-    default_quality: str,
-) -> tuple:
-    """交互式设置并返回 (output_dir, max_tasks, chunk_threads, quality)。"""
-    console.print(Panel(
-        "[dim]修改以下设置（直接回车保留当前值）[/]",
-        border_style="blue",
-        box=box.ROUNDED,
-    ))
-    out = Prompt.ask("  输出目录", default=str(default_output))
-    output_dir = Path(out).expanduser().resolve()
-    output_dir.mkdir(parents=True, exist_ok=True)
-    max_tasks = IntPrompt.ask("  最大并行下载数", default=default_max_tasks)
-    chunk_threads = IntPrompt.ask("  单任务分块线程数", default=default_chunk_threads)
-    quality = Prompt.ask(
-        f"  画质 [{'/'.join(QUALITY_OPTIONS)}]",
-        default=default_quality,
-        choices=list(QUALITY_OPTIONS),
+def build_arg_parser():
+    """构建命令行参数解析器。"""
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="WangVer H-Downloader - 专为 hanime1.me 定制的高效视频下载工具",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("url", nargs="?", help="单集视频页 URL 或系列列表页 URL")
+    parser.add_argument(
+        "-b", "--batch", type=Path,
+        help="批量 URL 文件（每行一个链接，可在链接后附优先级整数；任意扩展名，支持 gzip/bz2/xz 压缩；- 为标准输入）",
+    )
+    parser.add_argument("-o", "--output", type=Path, default=DEFAULT_OUTPUT_DIR, help="下载输出目录")
+    parser.add_argument("--max-tasks", type=int, default=DEFAULT_MAX_CONCURRENT_TASKS, help="最大并行下载任务数")
+    parser.add_argument(
+        "--chunk-threads", type=int, default=None,
+        help=f"单任务分块下载线程数（默认 {DEFAULT_CHUNK_THREADS}；未指定时套用 calibrate 对该主机的校准结果）",
+    )
+    parser.add_argument("--user-data-dir", type=Path, default=DEFAULT_USER_DATA_DIR, help="浏览器用户数据目录")
+    parser.add_argument("--headless", action="store_true", help="使用无头浏览器（不推荐，CF 易拦截）")
+    parser.add_argument("--no-ui", action="store_true", help="禁用交互菜单，仅显示帮助")
+    parser.add_argument("--quality", type=str, default=DEFAULT_QUALITY, choices=list(QUALITY_OPTIONS), help="优先画质")
+    parser.add_argument(
+        "--browser-idle-timeout", type=float, default=DEFAULT_BROWSER_IDLE_TIMEOUT,
+        help="交互菜单中浏览器空闲多少秒后自动关闭（0 为用完即关）",
+    )
+    parser.add_argument("--sync", action="store_true", help="增量同步：列表页只下载上次运行后新增或未完成的视频")
+    parser.add_argument("--sync-state", type=Path, default=DEFAULT_SYNC_STATE_FILE, help="增量同步状态文件")
+    parser.add_argument(
+        "--journal", type=Path, default=DEFAULT_JOURNAL_FILE,
+        help="批量检查点日志：-b 运行时逐条记录读入的链接、解析结果与完成状态",
+    )
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="按检查点日志续跑中断的批量：跳过已完成的，直链未过期的直接下载，其余重新解析；再继续读取 -b 中未读到的链接",
+    )
+    parser.add_argument(
+        "--fresh", action="store_true",
+        help="放弃检查点日志中未完成的批量，重新开始并覆盖日志（不加时遇到未完成的日志会拒绝覆盖）",
+    )
+    parser.add_argument("--max-pages", type=int, default=DEFAULT_MAX_LIST_PAGES, help="搜索/列表页最多抓取的分页数")
+    parser.add_argument(
+        "--schedule", choices=list(SCHEDULE_POLICIES), default=DEFAULT_SCHEDULE_POLICY,
+        help="批量下载顺序：fifo 按解析顺序 / sjf 小文件优先 / priority 按批量文件中的优先级",
+    )
+    parser.add_argument(
+        "--min-free-gb", type=float, default=DEFAULT_MIN_FREE_BYTES / 1024 ** 3,
+        help="输出目录所在磁盘至少保留的空间（GB），不足时暂缓启动新任务",
+    )
+    parser.add_argument(
+        "--post", type=str, default="",
+        help=f"下载完成后的后处理步骤，逗号分隔（{','.join(POSTPROCESS_STEPS)}），在进程池中执行",
+    )
+    parser.add_argument("--post-workers", type=int, default=DEFAULT_POSTPROCESS_WORKERS, help="后处理进程数")
+    parser.add_argument(
+        "--backend", choices=list(DOWNLOAD_BACKENDS), default=DEFAULT_DOWNLOAD_BACKEND,
+        help="下载后端：httpx 进程内分块下载 / aria2 交给 aria2c（JSON-RPC）",
+    )
+    parser.add_argument("--aria2-rpc", type=str, default=ARIA2_RPC_URL, help="aria2c JSON-RPC 地址")
+    parser.add_argument("--aria2-secret", type=str, default=None, help="aria2c RPC 密钥（默认读 WANGVER_ARIA2_SECRET）")
+    parser.add_argument(
+        "--aria2-spawn", action="store_true",
+        help="在本机临时启动 aria2c 作为后端（忽略 --aria2-rpc），结束时关闭",
+    )
+    parser.add_argument(
+        "--queue", type=Path,
+        help="多机共享任务队列（SQLite 文件，放在共享存储上）：先把 url/-b 中的链接加入队列，再领取任务下载",
+    )
+    parser.add_argument("--enqueue-only", action="store_true", help="配合 --queue：只加入队列，不下载")
+    parser.add_argument(
+        "--manifest", type=Path,
+        help="按 resolve 命令生成的清单（JSON/CSV）下载，不启动浏览器；配合 --queue 时把清单条目加入队列",
     )
-    console.print("[green]已更新设置[/]")
-    return output_dir, max_tasks, chunk_threads, quality
-
-
-def create_progress(description: str = "下载中") -> Progress:
-    """创建统一风格的进度条。"""
-    return Progress(
-        SpinnerColumn(style="cyan"),
-        TextColumn("[bold]{task.description}", style="cyan"),
-        BarColumn(bar_width=40, style="bar.back", complete_style="bar.complete"),
-        TaskProgressColumn(),
-        DownloadColumn(),
-        TimeRemainingColumn(),
-        console=console,
-        expand=True,
+    parser.add_argument(
+        "--events", choices=["jsonl"], default=None,
+        help="以 JSON Lines 事件流代替界面输出（resolved/started/progress/retried/completed/failed/summary），供脚本解析",
     )
+    parser.add_argument("--events-out", type=str, default="-", help="事件流输出位置：- 为标准输出，否则追加写入该文件")
+    parser.add_argument("--no-host-profile", action="store_true", help="不套用 calibrate 保存的按主机分块参数")
+    parser.add_argument(
+        "--memory-budget-mb", type=float, default=DEFAULT_MEMORY_BUDGET / 1024 ** 2,
+        help="所有下载共享的在途缓冲上限（MB，0 为不限制）；耗尽时分块读取暂停，直到数据写入磁盘",
+    )
+    parser.add_argument(
+        "--proxy", action="append", default=[], metavar="URL",
+        help=f"媒体下载线路（可重复）：http(s)/socks5 代理 URL，{PROXY_DEFAULT_ROUTE} 为系统/环境代理；"
+             "多条时分块按各线路实测速度分摊，出错的线路暂停使用（默认读 WANGVER_PROXIES）。页面解析不受影响",
+    )
+    parser.add_argument("--proxy-file", type=Path, help="代理列表文件（每行一个，# 开头为注释），与 --proxy 合并")
+    parser.add_argument(
+        "--scratch-dir", type=Path, default=DEFAULT_SCRATCH_DIR,
+        help="本地暂存目录（也可用 WANGVER_SCRATCH）：.part 先写在这里，完成后由后台顺序复制到输出目录再原子重命名，"
+             "适合输出目录在慢速网络存储上的情况",
+    )
+    parser.add_argument("--move-workers", type=int, default=DEFAULT_MOVE_WORKERS, help="配合 --scratch-dir：后台搬运线程数")
+    parser.add_argument(
+        "--stream", action="store_true",
+        help="边下边播（仅单个视频页 URL）：在本机提供播放地址，分块优先下载播放器正在读取的位置",
+    )
+    parser.add_argument("--stream-port", type=int, default=DEFAULT_STREAM_PORT, help="配合 --stream：本机播放服务端口（0 为随机）")
+    parser.add_argument("--no-probe", action="store_true", help="不探测候选直链，直接使用按 URL 匹配画质的结果")
+    parser.add_argument("--no-prewarm", action="store_true", help="不预先解析 DNS、建立到直链主机的连接")
+    parser.add_argument(
+        "--no-block-requests", action="store_true",
+        help="不拦截浏览器中的图片/媒体/字体与第三方请求（页面异常时使用）",
+    )
+    return parser
 
 
-def show_result_table(success: List[str], failed: List[str], output_dir: Path) -> None:
-    """用表格展示下载结果汇总。"""
-    table = Table(title="下载结果", box=box.ROUNDED, border_style="blue")
-    table.add_column("状态", style="bold", width=6)
-    table.add_column("文件 / 说明")
-    for name in success:
-        table.add_row("[green]成功[/]", name)
-    for name in failed:
-        table.add_row("[red]失败[/]", name)
-    if success:
-        table.add_row("[dim]保存位置[/]", str(output_dir), end_section=True)
-    console.print(Panel(table, border_style="blue", box=box.ROUNDED))
-    console.print()
-
-
-async def run_single(
-    target: VideoTarget,
-    output_dir: Path,
-    credentials: Optional[SessionCredentials],
-    chunk_threads: int = DEFAULT_CHUNK_THREADS,
-) -> Optional[Path]:
-    """单链接：根据已解析的 target 下载。"""
-    console.print(Panel(
-        f"[cyan]{target.title}[/]\n[dim]{target.direct_url[:80]}...[/]",
-        title="解析结果",
-        border_style="blue",
-        box=box.ROUNDED,
-    ))
-    with create_progress(target.title) as progress:
-        task_id = progress.add_task(target.title, total=None)
-        received = [0]
+def build_calibrate_parser():
+    """calibrate 子命令：python -m wangver_h_downloader.cli calibrate <直链或视频页 URL>。"""
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog="cli calibrate",
+        description="按「并发分块数 × 分块大小」网格测速，保存该 CDN 主机的最佳下载参数，之后下载时自动套用",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("url", help="媒体直链；也可为视频页 URL（先用浏览器解析直链与凭证）")
+    parser.add_argument(
+        "--threads", type=str, default=",".join(map(str, CALIBRATE_THREADS)), help="参与测试的并发分块数，逗号分隔",
+    )
+    parser.add_argument(
+        "--chunk-sizes", type=str, default=",".join(f"{c / 1024 ** 2:g}" for c in CALIBRATE_CHUNK_SIZES),
+        help="参与测试的分块大小（MB），逗号分隔",
+    )
+    parser.add_argument("--sample-mb", type=float, default=CALIBRATE_SAMPLE_BYTES / 1024 ** 2, help="每组参数下载的采样量（MB）")
+    parser.add_argument("--profiles", type=Path, default=DEFAULT_HOST_PROFILES_FILE, help="按主机保存校准结果的文件")
+    parser.add_argument("--quality", type=str, default=DEFAULT_QUALITY, choices=list(QUALITY_OPTIONS), help="视频页解析时的优先画质")
+    parser.add_argument("--user-data-dir", type=Path, default=DEFAULT_USER_DATA_DIR, help="浏览器用户数据目录")
+    parser.add_argument("--headless", action="store_true", help="使用无头浏览器")
+    return parser
 
-        def cb(n: int):
-            received[0] += n
-            progress.update(task_id, completed=received[0])
 
-        path = await download_task(
-            target.direct_url,
-            target.title,
-            output_dir,
-            credentials,
-            chunk_threads=chunk_threads,
-            progress_callback=cb,
-        )
-    console.print(f"[green]✓ 已保存: {path}[/]")
-    return path
-
-
-async def run_batch(
-    urls: List[str],
-    output_dir: Path,
-    max_concurrent_tasks: int = DEFAULT_MAX_CONCURRENT_TASKS,
-    chunk_threads: int = DEFAULT_CHUNK_THREADS,
-    preferred_quality: str = DEFAULT_QUALITY,
-    user_data_dir: Optional[Path] = None,
-    headless: bool = False,
-) -> List[str]:
-    """批量：启动浏览器 -> 逐个打开页面解析 -> 取得凭证后关闭浏览器 -> 并发下载。返回成功保存的文件名列表。"""
-    handler = BrowserCFHandler(
-        user_data_dir=user_data_dir or DEFAULT_USER_DATA_DIR,
-        headless=headless,
-        on_cf_triggered=_cf_alert_rich,
+def build_resolve_parser():
+    """resolve 子命令：只解析不下载，写出清单供之后 --manifest 下载。"""
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog="cli resolve",
+        description="只解析视频页（多标签页并发），把直链、标题、大小与下载所需的 Cookies/UA 写成清单",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
     )
-    await handler.start()
-    credentials: Optional[SessionCredentials] = None
-    targets: List[VideoTarget] = []
-
-    try:
-        for i, page_url in enumerate(urls):
-            console.print(f"[cyan][{i+1}/{len(urls)}][/] 解析: [dim]{page_url[:60]}...[/]")
-            creds = await handler.goto_and_handle_cf(page_url, wait_for_enter=True)
-            credentials = creds
-            html = await handler.get_page_content()
-            t = parse_single_page_html(html, page_url, preferred_quality=preferred_quality)
-            if t:
-                targets.append(t)
-                console.print(f"  [green]✓[/] {t.title}")
-            else:
-                console.print(f"  [yellow]跳过: 无法解析直链[/]")
+    parser.add_argument("urls", nargs="*", help="视频页 URL")
+    parser.add_argument("-b", "--batch", type=Path, help="批量 URL 文件（同主命令 -b，- 为标准输入）")
+    parser.add_argument("-m", "--manifest", type=Path, default=Path("manifest.json"), help="清单输出路径")
+    parser.add_argument(
+        "--format", choices=list(MANIFEST_FORMATS), default=None,
+        help="清单格式：json / csv 可用 --manifest 读回；aria2 供 aria2c -i 使用（默认按扩展名推断，.txt 为 aria2）",
+    )
+    parser.add_argument("--sizes", action="store_true", help="同时探测文件大小")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_RESOLVE_CONCURRENCY, help="并发解析的标签页数")
+    parser.add_argument("--quality", type=str, default=DEFAULT_QUALITY, choices=list(QUALITY_OPTIONS), help="优先画质")
+    parser.add_argument("--user-data-dir", type=Path, default=DEFAULT_USER_DATA_DIR, help="浏览器用户数据目录")
+    parser.add_argument("--headless", action="store_true", help="使用无头浏览器（不推荐，CF 易拦截）")
+    parser.add_argument("--no-probe", action="store_true", help="不探测候选直链，直接使用按 URL 匹配画质的结果")
+    parser.add_argument("--events", choices=["jsonl"], default=None, help="以 JSON Lines 事件流代替界面输出")
+    parser.add_argument("--events-out", type=str, default="-", help="事件流输出位置：- 为标准输出，否则追加写入该文件")
+    return parser
 
-        if not targets:
-            console.print("[yellow]没有可下载的目标。[/]")
-            return []
 
-        # 已取得凭证与目标，关闭浏览器后再下载（无需保持浏览器打开）
-        await handler.close()
-        handler = None
+def _resolve_main(argv) -> None:
+    parser = build_resolve_parser()
+    args = parser.parse_args(argv)
+    urls = list(dict.fromkeys(
+        [*args.urls, *((u for u, _ in iter_batch_urls(args.batch)) if args.batch else ())]
+    ))
+    if not urls:
+        parser.error("需要至少一个视频页 URL（位置参数或 -b）")
 
-        console.print(Panel(
-            f"共 [bold]{len(targets)}[/] 个任务，开始并发下载…",
-            border_style="blue",
-            box=box.ROUNDED,
-        ))
-        sem = asyncio.Semaphore(max_concurrent_tasks)
-        success_list: List[str] = []
-
-        async def run_one(t: VideoTarget):
-            async with sem:
-                with create_progress(t.title) as progress:
-                    task_id = progress.add_task(t.title, total=None)
-                    received = [0]
-
-                    def cb(n: int):
-                        received[0] += n
-                        progress.update(task_id, completed=received[0])
-
-                    try:
-                        await download_task(
-                            t.direct_url,
-                            t.title,
-                            output_dir,
-                            credentials,
-                            chunk_threads=chunk_threads,
-                            progress_callback=cb,
-                        )
-                        success_list.append(t.title)
-                        console.print(f"[green]✓ 完成: {t.title}[/]")
-                    except Exception as e:
-                        console.print(f"[red]✗ {t.title}: {e}[/]")
-
-        await asyncio.gather(*[run_one(t) for t in targets])
-        return success_list
-    finally:
-        if handler is not None:
-            await handler.close()
-
-
-async def run_list_page(
-    list_page_url: str,
-    output_dir: Path,
-    max_concurrent_tasks: int = DEFAULT_MAX_CONCURRENT_TASKS,
-    chunk_threads: int = DEFAULT_CHUNK_THREADS,
-    preferred_quality: str = DEFAULT_QUALITY,
-    user_data_dir: Optional[Path] = None,
-    headless: bool = False,
-) -> List[str]:
-    """列表页：打开列表页 -> 提取所有单集链接 -> 关闭浏览器 -> 同批量流程。返回成功列表。"""
-    handler = BrowserCFHandler(
-        user_data_dir=user_data_dir or DEFAULT_USER_DATA_DIR,
-        headless=headless,
-        on_cf_triggered=_cf_alert_rich,
-    )
-    await handler.start()
+    import asyncio
+    from . import app, events
+    if args.events:
+        events.open_sink(args.events_out)
+        app.console.quiet = True
     try:
-        console.print(Panel(
-            f"[cyan]正在加载列表页[/]\n[dim]{list_page_url}[/]",
-            border_style="blue",
-            box=box.ROUNDED,
+        targets = asyncio.run(app.run_resolve(
+            urls,
+            args.manifest,
+            fmt=args.format,
+            probe_sizes=args.sizes,
+            concurrency=args.concurrency,
+            preferred_quality=args.quality,
+            user_data_dir=args.user_data_dir,
+            headless=args.headless,
+            options=app.RunOptions(probe_sources=not args.no_probe),
         ))
-        await handler.goto_and_handle_cf(list_page_url, wait_for_enter=True)
-        html = await handler.get_page_content()
-        urls = extract_list_page_video_links(html, list_page_url)
-        console.print(f"[green]共解析到 {len(urls)} 个视频链接。[/]")
     finally:
-        await handler.close()
+        events.close_sink()
+    if not targets:
+        sys.exit(1)
 
-    if not urls:
-        console.print("[yellow]未解析到任何视频链接。[/]")
-        return []
-    return await run_batch(
-        urls,
-        output_dir,
-        max_concurrent_tasks=max_concurrent_tasks,
-        chunk_threads=chunk_threads,
-        preferred_quality=preferred_quality,
-        user_data_dir=user_data_dir,
-        headless=headless,
-    )
 
+def _calibrate_main(argv) -> None:
+    parser = build_calibrate_parser()
+    args = parser.parse_args(argv)
+    from .calibrate import parse_int_list
+    try:
+        threads = parse_int_list(args.threads)
+        chunk_sizes = parse_int_list(args.chunk_sizes, scale=1024 * 1024)
+    except ValueError as e:
+        parser.error(str(e))
+
+    import asyncio
+    from . import app
+    profile = asyncio.run(app.run_calibrate(
+        args.url,
+        threads=threads,
+        chunk_sizes=chunk_sizes,
+        sample_bytes=int(args.sample_mb * 1024 * 1024),
+        preferred_quality=args.quality,
+        user_data_dir=args.user_data_dir,
+        headless=args.headless,
+        profiles_path=args.profiles,
+    ))
+    if profile is None:
+        sys.exit(1)
 
-# ---------- 交互式流程 ----------
-
-_session_output_dir = DEFAULT_OUTPUT_DIR
-_session_max_tasks = DEFAULT_MAX_CONCURRENT_TASKS
-_session_chunk_threads = DEFAULT_CHUNK_THREADS
-_session_quality = DEFAULT_QUALITY
 
+def main() -> None:
+    """命令行入口：有参数则直接执行；无参数则进入交互式主菜单。"""
+    if sys.argv[1:2] == ["calibrate"]:
+        _calibrate_main(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["resolve"]:
+        _resolve_main(sys.argv[2:])
+        return
+    argv = sys.argv[1:]
+    if argv[:1] == ["download"]:
+        # download 为默认命令，可省略
+        argv = argv[1:]
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+
+    from . import app
+    from .postprocess import parse_steps
+    try:
+        post_steps = parse_steps(args.post)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.memory_budget_mb < 0:
+        parser.error("--memory-budget-mb 不能为负数")
+    options = app.RunOptions(
+        block_requests=not args.no_block_requests,
+        probe_sources=not args.no_probe,
+        prewarm_connections=not args.no_prewarm,
+        schedule_policy=args.schedule,
+        min_free_bytes=int(args.min_free_gb * 1024 ** 3),
+        post_steps=post_steps,
+        post_workers=args.post_workers,
+        download_backend=args.backend,
+        memory_budget_bytes=int(args.memory_budget_mb * 1024 * 1024),
+        download_proxies=_parse_proxies(parser, args),
+        scratch_dir=None,
+        move_workers=args.move_workers,
+        # 显式指定分块线程数时以命令行为准，不套用校准结果
+        use_host_profiles=args.chunk_threads is None and not args.no_host_profile,
+    )
+    if args.scratch_dir is not None and args.backend != "httpx":
+        if args.scratch_dir != DEFAULT_SCRATCH_DIR:
+            parser.error("--scratch-dir 仅支持 httpx 下载后端")
+        # 环境变量中的暂存目录对其它后端不生效
+        args.scratch_dir = None
+    if args.scratch_dir is not None:
+        if args.move_workers < 1:
+            parser.error("--move-workers 至少为 1")
+        scratch = args.scratch_dir.expanduser().resolve()
+        scratch.mkdir(parents=True, exist_ok=True)
+        # 与输出目录相同时等于未启用
+        options.scratch_dir = None if scratch == args.output.expanduser().resolve() else scratch
+    if args.stream:
+        if args.batch or args.queue or args.manifest or args.resume or not args.url or _is_list_url(args):
+            parser.error("--stream 只用于单个视频页 URL")
+        if args.backend != "httpx":
+            parser.error("--stream 仅支持 httpx 下载后端")
+        if not 0 <= args.stream_port <= 65535:
+            parser.error("--stream-port 应在 0-65535 之间")
+    if args.events:
+        if not (args.url or args.batch or args.queue or args.manifest or args.resume):
+            parser.error("--events 需要配合 URL、-b、--resume、--manifest 或 --queue 使用（交互菜单不支持事件流）")
+        from . import events
+        events.open_sink(args.events_out)
+        # 事件流替代 Rich 界面：不再渲染面板与进度条
+        app.console.quiet = True
+    if args.chunk_threads is None:
+        args.chunk_threads = DEFAULT_CHUNK_THREADS
 
-def run_interactive() -> None:
-    """无参数启动时：主菜单循环。"""
-    show_banner()
-    while True:
-        choice = show_main_menu()
-        if choice == "0":
-            console.print("[dim]再见。[/]")
-            return
-        if choice == "4":
-            global _session_output_dir, _session_max_tasks, _session_chunk_threads, _session_quality
-            _session_output_dir, _session_max_tasks, _session_chunk_threads, _session_quality = prompt_settings(
-                _session_output_dir, _session_max_tasks, _session_chunk_threads, _session_quality,
-            )
+    try:
+        _run_with_backend(parser, args, app, options)
+    finally:
+        if args.events:
+            events.close_sink()
+
+
+def _parse_proxies(parser, args) -> tuple:
+    """合并 --proxy 与 --proxy-file（都未给出时取 WANGVER_PROXIES）并校验，返回下载线路（None 为默认线路）。"""
+    values = list(args.proxy)
+    if args.proxy_file:
+        try:
+            lines = args.proxy_file.read_text(encoding="utf-8").splitlines()
+        except OSError as e:
+            parser.error(f"无法读取代理列表: {e}")
+        values += [line.strip() for line in lines if line.strip() and not line.strip().startswith("#")]
+    explicit = bool(values)
+    if not explicit:
+        values = list(DEFAULT_PROXIES)
+    proxies = []
+    for value in dict.fromkeys(values):
+        if value == PROXY_DEFAULT_ROUTE:
+            proxies.append(None)
             continue
+        scheme = value.split("://", 1)[0].lower() if "://" in value else ""
+        if scheme not in PROXY_SCHEMES:
+            parser.error(f"不支持的代理地址: {value}（应为 {' / '.join(PROXY_SCHEMES)}:// 开头，或 {PROXY_DEFAULT_ROUTE}）")
+        if scheme.startswith("socks"):
+            import importlib.util
+            if importlib.util.find_spec("socksio") is None:
+                parser.error("SOCKS 代理需要 socksio：pip install 'httpx[socks]'")
+        proxies.append(value)
+    if explicit and args.backend != "httpx":
+        parser.error("--proxy / --proxy-file 仅支持 httpx 下载后端")
+    return tuple(proxies)
+
+
+def _run_with_backend(parser, args, app, options) -> None:
+    """配置下载后端（必要时临时启动 aria2c）后分发。"""
+    if args.backend == "aria2":
+        if args.aria2_spawn:
+            from .backends import LocalAria2c
+            try:
+                aria2 = LocalAria2c().start()
+            except RuntimeError as e:
+                parser.error(str(e))
+            try:
+                options.backend_options = {"rpc_url": aria2.rpc_url, "secret": aria2.secret}
+                _dispatch(parser, args, app, options)
+            finally:
+                aria2.stop()
+            return
+        options.backend_options = {"rpc_url": args.aria2_rpc}
+        if args.aria2_secret is not None:
+            options.backend_options["secret"] = args.aria2_secret
+    elif args.aria2_spawn:
+        parser.error("--aria2-spawn 需要配合 --backend aria2 使用")
+    _dispatch(parser, args, app, options)
 
-        output_dir = _session_output_dir
-        output_dir.mkdir(parents=True, exist_ok=True)
 
-        if choice == "1":
-            url = Prompt.ask("[cyan]请输入单集视频页 URL[/]")
-            if not url.strip():
-                console.print("[yellow]已取消。[/]")
-                continue
-
-            async def do_single():
-                handler = BrowserCFHandler(
-                    user_data_dir=DEFAULT_USER_DATA_DIR,
-                    headless=False,
-                    on_cf_triggered=_cf_alert_rich,
-                )
-                await handler.start()
-                try:
-                    creds = await handler.goto_and_handle_cf(url, wait_for_enter=True)
-                    html = await handler.get_page_content()
-                    target = parse_single_page_html(html, url, preferred_quality=_session_quality)
-                    if target:
-                        # 已取得凭证与解析结果，关闭浏览器后再下载
-                        await handler.close()
-                        await run_single(target, output_dir, creds, chunk_threads=_session_chunk_threads)
-                        show_result_table([target.title], [], output_dir)
-                    else:
-                        console.print("[red]无法从页面解析出视频直链或标题。[/]")
-                finally:
-                    await handler.close()
-
-            asyncio.run(do_single())
-
-        elif choice == "2":
-            path_str = Prompt.ask("[cyan]请输入 .txt 文件路径（每行一个 URL）[/]")
-            path = Path(path_str).expanduser().resolve()
-            if not path.exists():
-                console.print(f"[red]文件不存在: {path}[/]")
-                continue
-            urls = collect_urls_from_batch_file(path)
-            if not urls:
-                console.print("[red]文件中没有有效 URL。[/]")
-                continue
-            console.print(f"[green]已读取 {len(urls)} 个链接。[/]")
-            success = asyncio.run(run_batch(
-                urls, output_dir,
-                max_concurrent_tasks=_session_max_tasks,
-                chunk_threads=_session_chunk_threads,
-                preferred_quality=_session_quality,
-            ))
-            show_result_table(success, [] if len(success) == len(urls) else [f"共 {len(urls)} 条链接，成功 {len(success)} 条"], output_dir)
-
-        elif choice == "3":
-            list_url = Prompt.ask("[cyan]请输入系列/列表页 URL[/]")
-            if not list_url.strip():
-                console.print("[yellow]已取消。[/]")
-                continue
-            success = asyncio.run(run_list_page(
-                list_url, output_dir,
-                max_concurrent_tasks=_session_max_tasks,
-                chunk_threads=_session_chunk_threads,
-                preferred_quality=_session_quality,
-            ))
-            show_result_table(success, [], output_dir)
+def _is_list_url(args) -> bool:
+    """位置参数 URL 是否按列表/系列页处理（而非单个视频页）。"""
+    return bool(args.sync or "/videos" in args.url or "/series" in args.url or "/search" in args.url)
 
-        if choice in ("1", "2", "3"):
-            if not Confirm.ask("[cyan]是否继续使用主菜单[/]", default=True):
-                break
-    console.print()
 
+def _dispatch(parser, args, app, options) -> None:
+    """按参数分发到具体流程；options 为由命令行构建的 app.RunOptions。"""
+    if args.queue:
+        _run_queue(parser, args, options)
+        return
 
-def main() -> None:
-    """命令行入口：有参数则直接执行；无参数则进入交互式主菜单。"""
-    import argparse
-    parser = argparse.ArgumentParser(
-        description="WangVer H-Downloader - 专为 hanime1.me 定制的高效视频下载工具",
-        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
-    )
-    parser.add_argument("url", nargs="?", help="单集视频页 URL 或系列列表页 URL")
-    parser.add_argument("-b", "--batch", type=Path, help="批量 URL 文件路径（.txt，每行一个链接）")
-    parser.add_argument("-o", "--output", type=Path, default=DEFAULT_OUTPUT_DIR, help="下载输出目录")
-    parser.add_argument("--max-tasks", type=int, default=DEFAULT_MAX_CONCURRENT_TASKS, help="最大并行下载任务数")
-    parser.add_argument("--chunk-threads", type=int, default=DEFAULT_CHUNK_THREADS, help="单任务分块下载线程数")
-    parser.add_argument("--user-data-dir", type=Path, default=DEFAULT_USER_DATA_DIR, help="浏览器用户数据目录")
-    parser.add_argument("--headless", action="store_true", help="使用无头浏览器（不推荐，CF 易拦截）")
-    parser.add_argument("--no-ui", action="store_true", help="禁用交互菜单，仅显示帮助")
-    parser.add_argument("--quality", type=str, default=DEFAULT_QUALITY, choices=list(QUALITY_OPTIONS), help="优先画质")
-    args = parser.parse_args()
+    if args.enqueue_only:
+        parser.error("--enqueue-only 需要配合 --queue 使用")
+
+    if args.manifest:
+        if args.url or args.batch:
+            parser.error("--manifest 不能与 URL 或 -b 同时使用")
+        import asyncio
+        from .manifest import read_manifest
+        try:
+            items = read_manifest(args.manifest)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            parser.error(f"无法读取清单 {args.manifest}: {e}")
+        output_dir = Path(args.output).resolve()
+        output_dir.mkdir(parents=True, exist_ok=True)
+        asyncio.run(app.run_batch(
+            items,
+            output_dir,
+            max_concurrent_tasks=args.max_tasks,
+            chunk_threads=args.chunk_threads,
+            preferred_quality=args.quality,
+            user_data_dir=args.user_data_dir,
+            headless=args.headless,
+            options=options,
+        ))
+        return
+
+    if args.resume:
+        if args.url or args.sync:
+            parser.error("--resume 只用于 -b 批量（可省略 -b，沿用日志中记录的批量文件）")
+        if args.fresh:
+            parser.error("--resume 与 --fresh 不能同时使用")
+        _run_batch_journaled(parser, args, app, options)
+        return
 
     if not args.url and not args.batch and not args.no_ui:
-        run_interactive()
+        app.run_interactive(args.user_data_dir, args.headless, args.browser_idle_timeout, options)
         return
 
     if args.url or args.batch:
+        import asyncio
+        from .sync_state import SyncState
+
         output_dir = Path(args.output).resolve()
         output_dir.mkdir(parents=True, exist_ok=True)
 
-        if args.batch:
+        if args.batch and args.sync:
+            # 增量同步：批量文件中每行是一个列表/系列 URL
             urls = collect_urls_from_batch_file(args.batch)
             if not urls:
-                console.print("[red]批量文件中没有有效 URL。[/]")
+                app.console.print("[red]批量文件中没有有效 URL。[/]")
                 sys.exit(1)
-            asyncio.run(run_batch(
+            asyncio.run(app.run_sync_lists(
                 urls,
                 output_dir,
+                SyncState(args.sync_state),
                 max_concurrent_tasks=args.max_tasks,
                 chunk_threads=args.chunk_threads,
                 preferred_quality=args.quality,
                 user_data_dir=args.user_data_dir,
                 headless=args.headless,
+                max_pages=args.max_pages,
+                options=options,
             ))
+        elif args.batch:
+            if str(args.batch) != "-" and not args.batch.is_file():
+                app.console.print(f"[red]批量文件不存在: {args.batch}[/]")
+                sys.exit(1)
+            _run_batch_journaled(parser, args, app, options)
         elif args.url:
-            if "/videos" in args.url or "/series" in args.url or "/search" in args.url:
-                asyncio.run(run_list_page(
+            if _is_list_url(args):
+                asyncio.run(app.run_list_page(
                     args.url,
                     output_dir,
                     max_concurrent_tasks=args.max_tasks,
@@ -453,44 +488,113 @@ def main() -> None:
                     preferred_quality=args.quality,
                     user_data_dir=args.user_data_dir,
                     headless=args.headless,
+                    max_pages=args.max_pages,
+                    sync_state=SyncState(args.sync_state) if args.sync else None,
+                    options=options,
                 ))
             else:
-                async def single_flow():
-                    handler = BrowserCFHandler(
-                        user_data_dir=args.user_data_dir,
-                        headless=args.headless,
-                        on_cf_triggered=_cf_alert_rich,
-                    )
-                    await handler.start()
-                    try:
-                        creds = await handler.goto_and_handle_cf(args.url, wait_for_enter=True)
-                        html = await handler.get_page_content()
-                        target = parse_single_page_html(html, args.url, preferred_quality=args.quality)
-                        if target:
-                            await handler.close()
-                            await run_single(target, output_dir, creds, chunk_threads=args.chunk_threads)
-                        else:
-                            console.print("[red]无法从页面解析出视频直链或标题。[/]")
-                    finally:
-                        await handler.close()
-
-                asyncio.run(single_flow())
+                asyncio.run(app.run_single_url(
+                    args.url,
+                    output_dir,
+                    chunk_threads=args.chunk_threads,
+                    preferred_quality=args.quality,
+                    user_data_dir=args.user_data_dir,
+                    headless=args.headless,
+                    stream_port=args.stream_port if args.stream else None,
+                    options=options,
+                ))
         return
 
     parser.print_help()
-    console.print()
-    console.print(Panel(
-        "[dim]示例：[/]\n"
-        "  单集   python -m wangver_h_downloader.cli \"https://hanime1.me/watch/xxx\"\n"
-        "  批量   python -m wangver_h_downloader.cli -b urls.txt -o ./downloads\n"
-        "  列表   python -m wangver_h_downloader.cli \"https://hanime1.me/videos/...\"\n\n"
-        "[bold]直接运行不加参数将进入交互式菜单。[/]",
-        title="用法",
-        border_style="blue",
-        box=box.ROUNDED,
-    ))
+    app.show_usage()
     sys.exit(0)
 
 
+def _run_batch_journaled(parser, args, app, options) -> None:
+    """-b 批量（或 --resume 续跑）：流式读取链接，全程写检查点日志。"""
+    import asyncio
+    from .journal import BatchJournal
+
+    journal = BatchJournal(args.journal)
+    source = args.batch
+    if args.resume:
+        if not journal.path.exists():
+            parser.error(f"检查点日志不存在: {journal.path}")
+        journal.load()
+        source = source or (Path(journal.source) if journal.source else None)
+        app.console.print(f"[cyan]续跑[/] {journal.path}: {journal.stats()}")
+    try:
+        journal.start(str(source) if source and str(source) != "-" else None, resume=args.resume, fresh=args.fresh)
+    except FileExistsError as e:
+        parser.error(str(e))
+
+    output_dir = Path(args.output).resolve()
+    output_dir.mkdir(parents=True, exist_ok=True)
+    # 流式读取：边读边解析下载，优先级随读取填入
+    priorities: dict = {}
+    items = (
+        app.resume_batch_items(journal, source, priorities) if args.resume
+        else app.stream_batch_urls(source, priorities)
+    )
+    try:
+        asyncio.run(app.run_batch(
+            items,
+            output_dir,
+            max_concurrent_tasks=args.max_tasks,
+            chunk_threads=args.chunk_threads,
+            preferred_quality=args.quality,
+            user_data_dir=args.user_data_dir,
+            headless=args.headless,
+            priorities=priorities,
+            journal=journal,
+            options=options,
+        ))
+    finally:
+        journal.close()
+
+
+def _run_queue(parser, args, options) -> None:
+    """共享队列模式：加入 url/-b 中的页面链接，然后（除非 --enqueue-only）作为工作实例领取任务。"""
+    import asyncio
+    import itertools
+    from . import app
+    from .work_queue import SharedWorkQueue
+
+    queue = SharedWorkQueue(args.queue)
+    if args.batch or args.url:
+        # 批量文件流式写入队列，不整体读入内存
+        urls = itertools.chain(
+            (u for u, _ in iter_batch_urls(args.batch)) if args.batch else (),
+            [args.url] if args.url else (),
+        )
+        added = queue.add_pages(urls)
+        app.console.print(f"[cyan]已加入队列[/] {added} 个新链接（已在队列中的忽略）")
+    if args.manifest:
+        from .manifest import read_manifest
+        try:
+            items = read_manifest(args.manifest)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            parser.error(f"无法读取清单 {args.manifest}: {e}")
+        added = queue.add_targets(items)
+        app.console.print(f"[cyan]已加入队列[/] 清单中 {added} 个已解析目标（已在队列中的忽略）")
+    if args.enqueue_only:
+        app.console.print(f"队列状态: {queue.stats()}")
+        return
+
+    output_dir = Path(args.output).resolve()
+    output_dir.mkdir(parents=True, exist_ok=True)
+    asyncio.run(app.run_queue_worker(
+        queue,
+        output_dir,
+        max_concurrent_tasks=args.max_tasks,
+        chunk_threads=args.chunk_threads,
+        preferred_quality=args.quality,
+        user_data_dir=args.user_data_dir,
+        headless=args.headless,
+        options=options,
+    ))
+    app.console.print(f"队列状态: {queue.stats()}")
+
+
 if __name__ == "__main__":
     main()
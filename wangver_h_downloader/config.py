@@ -7,6 +7,30 @@ import os
 # 默认输出目录（下载视频存放位置）
 DEFAULT_OUTPUT_DIR = Path(os.getenv("WANGVER_OUTPUT", "./downloads")).resolve()
 
+# 增量同步状态文件（记录每个列表 URL 已见/已完成的视频 ID）
+DEFAULT_SYNC_STATE_FILE = Path(os.getenv("WANGVER_SYNC_STATE", "./sync_state.json")).resolve()
+# 状态变化累积到 SYNC_SAVE_EVERY 条或距上次写回超过 SYNC_SAVE_INTERVAL 秒时写回文件，结束时再写回一次
+SYNC_SAVE_EVERY = 50
+SYNC_SAVE_INTERVAL = 10
+
+# 批量检查点日志（-b 运行时逐条追加解析结果与完成状态，--resume 据此续跑）；
+# 直链未带过期时间时，解析后超过 JOURNAL_LINK_TTL 秒视为可能过期、续跑时重新解析
+DEFAULT_JOURNAL_FILE = Path(os.getenv("WANGVER_JOURNAL", "./batch_journal.jsonl")).resolve()
+JOURNAL_LINK_TTL = 3 * 3600
+# 直链或 CF Cookies 距过期不足该秒数时同样重新解析（留出下载时间）
+JOURNAL_EXPIRY_MARGIN = 600
+# 每行写入后立即交给操作系统（进程崩溃不丢）；累积 JOURNAL_SYNC_EVERY 行或距上次超过 JOURNAL_SYNC_INTERVAL 秒
+# 时 fsync 一次（断电时最多丢失这一段），结束时再 fsync
+JOURNAL_SYNC_EVERY = 100
+JOURNAL_SYNC_INTERVAL = 5
+
+# 本地暂存目录（--scratch-dir，未设置时直接写输出目录）：输出目录在慢速网络存储上时，.part 先写在本地，
+# 完成后由后台搬运器顺序复制到输出目录再原子重命名；搬运线程数、复制缓冲大小、排队等待搬运的文件数上限（超出时下载暂停）
+DEFAULT_SCRATCH_DIR = Path(os.environ["WANGVER_SCRATCH"]).resolve() if os.getenv("WANGVER_SCRATCH") else None
+DEFAULT_MOVE_WORKERS = 1
+MOVE_BUFFER_BYTES = 16 * 1024 * 1024
+MOVE_MAX_PENDING = 4
+
 # 浏览器用户数据目录（持久化 Cookies/Session，减少重复验证）
 DEFAULT_USER_DATA_DIR = Path(os.getenv("WANGVER_USER_DATA", "./browser_user_data")).resolve()
 
@@ -14,6 +38,83 @@ DEFAULT_USER_DATA_DIR = Path(os.getenv("WANGVER_USER_DATA", "./browser_user_data
 DEFAULT_MAX_CONCURRENT_TASKS = 3   # 同时下载的视频数量
 DEFAULT_CHUNK_THREADS = 8          # 单任务分块下载的并发块数（越多越快，受代理/带宽影响）
 DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024  # 单块大小 4MB，减少请求次数
+SOURCE_MAX_ERRORS = 3              # 多源下载时，某个镜像连续失败多少次后停用
+CHUNK_RETRIES = 2                  # 单个分块出错后至少重试的次数（多源/代理池时另保证每种源 × 线路组合都试过）
+# 全局内存预算：所有下载已收到、尚未写盘的数据总量上限（0 为不限制），耗尽时读取暂停；
+# 每个分块边收边写，缓冲满 WRITE_BUFFER_BYTES 即落盘
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+WRITE_BUFFER_BYTES = 1024 * 1024
+# 媒体主机连接复用：空闲连接保留秒数与每个主机最多保留的空闲连接数；
+# 直连时 DNS 结果的缓存秒数（安装 dnspython 时改用记录自身的 TTL）
+POOL_KEEPALIVE_SECONDS = 90
+POOL_KEEPALIVE_CONNECTIONS = 32
+DNS_CACHE_TTL = 60
+# 代理池（--proxy / --proxy-file，或环境变量 WANGVER_PROXIES，逗号分隔）：媒体下载的分块按各线路实测吞吐分摊；
+# 某条线路连续失败 PROXY_MAX_ERRORS 次后暂停 PROXY_COOLDOWN 秒，到期后重新参与。
+# 浏览器解析页面始终走系统/环境代理（CF 验证所在线路）；写作 PROXY_DEFAULT_ROUTE 表示把该线路也加入代理池
+DEFAULT_PROXIES = tuple(p.strip() for p in os.getenv("WANGVER_PROXIES", "").split(",") if p.strip())
+PROXY_DEFAULT_ROUTE = "default"
+PROXY_SCHEMES = ("http", "https", "socks5", "socks5h")
+PROXY_MAX_ERRORS = 3
+PROXY_COOLDOWN = 120
+# 边下边播（--stream）：分块改小以便尽快拿到播放位置的数据；本机播放服务的默认端口（0 为随机）
+# 与每次从文件读出发给播放器的字节数
+STREAM_CHUNK_SIZE = 1024 * 1024
+DEFAULT_STREAM_PORT = 8800
+STREAM_READ_BYTES = 256 * 1024
+
+# 引擎参数校准（calibrate 命令）：并发分块数 × 分块大小网格、每组采样字节数与时长上限、可接受的出错率；
+# 结果按 CDN 主机保存，之后下载该主机的直链时自动套用（命令行显式给出 --chunk-threads 时不套用）
+CALIBRATE_THREADS = (2, 4, 8, 16)
+CALIBRATE_CHUNK_SIZES = (1024 * 1024, 2 * 1024 * 1024, 4 * 1024 * 1024, 8 * 1024 * 1024)
+CALIBRATE_SAMPLE_BYTES = 32 * 1024 * 1024
+CALIBRATE_TRIAL_SECONDS = 30
+CALIBRATE_MAX_ERROR_RATE = 0.1
+DEFAULT_HOST_PROFILES_FILE = Path(os.getenv("WANGVER_HOST_PROFILES", "./host_profiles.json")).resolve()
+
+# 任务调度：fifo（按解析顺序）/ sjf（小文件优先）/ priority（按优先级）；
+# 启动任务前为其预留磁盘空间，剩余空间低于该值时暂缓启动新任务
+SCHEDULE_POLICIES = ("fifo", "sjf", "priority")
+DEFAULT_SCHEDULE_POLICY = "fifo"
+DEFAULT_MIN_FREE_BYTES = 1024 * 1024 * 1024
+# 批量时最多提前解析多少个尚未开始下载的目标（流式处理超大列表，限制内存与直链过期；
+# sjf/priority 只在这一窗口内排序）
+RESOLVE_AHEAD = 32
+
+# 下载完成后的后处理步骤（进程池执行，不阻塞下载）：
+# faststart 重封装便于边下边播 / hls 合并 m3u8 为 mp4 / thumbnail 生成缩略图 / metadata 写 .info.json
+POSTPROCESS_STEPS = ("hls", "faststart", "thumbnail", "metadata")
+DEFAULT_POSTPROCESS_STEPS: tuple = ()
+DEFAULT_POSTPROCESS_WORKERS = os.cpu_count() or 1
+FFMPEG_BIN = os.getenv("WANGVER_FFMPEG", "ffmpeg")
+
+# 下载后端：httpx（进程内分块下载）/ aria2（通过 JSON-RPC 交给 aria2c）
+DOWNLOAD_BACKENDS = ("httpx", "aria2")
+DEFAULT_DOWNLOAD_BACKEND = "httpx"
+ARIA2_RPC_URL = os.getenv("WANGVER_ARIA2_RPC", "http://127.0.0.1:6800/jsonrpc")
+ARIA2_RPC_SECRET = os.getenv("WANGVER_ARIA2_SECRET", "")
+ARIA2C_BIN = os.getenv("WANGVER_ARIA2C", "aria2c")
+ARIA2_POLL_INTERVAL = 0.5          # 轮询 aria2 任务进度的间隔（秒）
+
+# 多机共享任务队列（SQLite 文件放在共享存储上）：租约时长、心跳间隔、最大尝试次数、空闲轮询间隔（秒）
+QUEUE_LEASE_SECONDS = 300
+QUEUE_HEARTBEAT_SECONDS = 60
+QUEUE_MAX_ATTEMPTS = 3
+QUEUE_POLL_INTERVAL = 5
+
+# 事件流（--events jsonl）中 progress 事件的输出间隔（秒）
+EVENTS_PROGRESS_INTERVAL = 1.0
+
+# 浏览器会话复用：空闲超过该秒数后自动关闭（0 表示用完即关，None 表示不自动关闭）
+DEFAULT_BROWSER_IDLE_TIMEOUT = 300
+
+# 列表页分页抓取：最多抓取页数、并发标签页数
+DEFAULT_MAX_LIST_PAGES = 50
+DEFAULT_PAGE_CRAWL_CONCURRENCY = 3
+
+# 只解析不下载（resolve 命令）：并发标签页数与清单格式
+DEFAULT_RESOLVE_CONCURRENCY = 3
+MANIFEST_FORMATS = ("json", "csv", "aria2")
 
 # 目标平台
 TARGET_BASE_URL = "https://hanime1.me"
@@ -23,11 +124,23 @@ INVALID_FILENAME_CHARS = r'[\\/:*?"<>|]'
 
 # 临时文件后缀（断点续传）
 PART_SUFFIX = ".part"
+# .part 旁记录已完成字节区间的文件（{name}.part.ranges），断点续传据此跳过已下载分块
+PART_STATE_SUFFIX = ".ranges"
 
 # 画质选项（解析时优先选择）
 QUALITY_OPTIONS = ("360p", "480p", "720p", "1080p")
 DEFAULT_QUALITY = "1080p"
 
+# 候选直链探测：并发数、单个探测超时（秒）、小于该字节数视为预览片段
+PROBE_CONCURRENCY = 6
+PROBE_TIMEOUT = 15
+PROBE_MIN_VIDEO_BYTES = 5 * 1024 * 1024
+# 探测结果缓存（按视频 ID 记录选中的画质/大小）：超过 PROBE_CACHE_TTL 秒的记录在加载时丢弃，
+# 最多保留 PROBE_CACHE_MAX_ENTRIES 条（超出时淘汰最旧的）
+DEFAULT_PROBE_CACHE_FILE = Path(os.getenv("WANGVER_PROBE_CACHE", "./probe_cache.json")).resolve()
+PROBE_CACHE_TTL = 30 * 24 * 3600
+PROBE_CACHE_MAX_ENTRIES = 5000
+
 # CF 特征检测
 CF_FORBIDDEN_STATUS = 403
 CF_INDICATOR_TEXTS = ("Just a moment", "cf-turnstile", "Checking your browser")
@@ -36,3 +149,20 @@ CF_INDICATOR_SELECTORS = [
     "#challenge-running",
     "#challenge-form",
 ]
+
+# 浏览器请求过滤：解析只需 HTML 与直链，屏蔽图片/媒体/字体与第三方广告统计以减少页面加载
+BLOCK_RESOURCE_TYPES = ("image", "media", "font")
+BLOCK_HOSTS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "googlesyndication.com",
+    "exoclick.com",
+    "exosrv.com",
+    "juicyads.com",
+    "trafficjunky.net",
+    "magsrv.com",
+)
+# 永远放行（优先于上面两项）：CF 验证所需的主机与路径
+ALLOW_HOSTS = ("challenges.cloudflare.com",)
+ALLOW_PATH_PREFIXES = ("/cdn-cgi/",)
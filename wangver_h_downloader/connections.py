@@ -0,0 +1,228 @@
+"""
+媒体主机连接复用与预热：按主机共享 httpx 客户端（长连接池），分块、探测之间复用已建立的
+TCP/TLS（经代理时为隧道）连接；直链主机一经得知即在后台解析 DNS、预先建立连接，任务开始时无需再等握手。
+直连时 DNS 结果缓存在进程内并按 TTL 过期（安装 dnspython 时取记录自身的 TTL，否则按 DNS_CACHE_TTL）：
+请求改为连接缓存的 IP，Host 头与 TLS 的 SNI/证书校验仍用原主机名；经代理时由代理解析域名，缓存不参与。
+使用代理池时按 (源站, 代理) 分别建立客户端与连接。
+"""
+import asyncio
+import socket
+import time
+from ipaddress import ip_address
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+
+import httpx
+
+from .config import (
+    DNS_CACHE_TTL,
+    POOL_KEEPALIVE_CONNECTIONS,
+    POOL_KEEPALIVE_SECONDS,
+)
+
+# 下载请求：跟随重定向、较长超时（走代理时需更长时间）；默认走系统/环境代理
+HTTPX_DOWNLOAD_KWARGS = {"follow_redirects": True, "timeout": 120, "trust_env": True}
+
+_POOL_LIMITS = httpx.Limits(
+    max_connections=None,   # 并发分块数由下载引擎控制，连接池不再额外限制
+    max_keepalive_connections=POOL_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry=POOL_KEEPALIVE_SECONDS,
+)
+
+
+class DnsCache:
+    """进程内 DNS 缓存：{主机: (过期时刻, 地址列表)}，过期后重新解析。"""
+
+    def __init__(self, default_ttl: float = DNS_CACHE_TTL):
+        self.default_ttl = default_ttl
+        self._entries: Dict[str, Tuple[float, List[str]]] = {}
+
+    async def resolve(self, host: str) -> List[str]:
+        try:
+            ip_address(host)
+            return [host]
+        except ValueError:
+            pass
+        entry = self._entries.get(host)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        addrs, ttl = await self._lookup(host)
+        if addrs:
+            self._entries[host] = (time.monotonic() + ttl, addrs)
+        return addrs
+
+    def forget(self, host: str) -> None:
+        """连接失败时丢弃缓存，下次重新解析。"""
+        self._entries.pop(host, None)
+
+    async def _lookup(self, host: str) -> Tuple[List[str], float]:
+        try:
+            import dns.asyncresolver
+        except ImportError:
+            dns = None
+        if dns is not None:
+            try:
+                answer = await dns.asyncresolver.resolve(host, "A")
+                return [r.address for r in answer], float(answer.rrset.ttl)
+            except Exception:
+                pass
+        infos = await asyncio.get_running_loop().getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        return list(dict.fromkeys(info[4][0] for info in infos)), self.default_ttl
+
+
+class _CachedDnsTransport(httpx.AsyncBaseTransport):
+    """
+    直连传输层：按 DnsCache 解析后把请求发往 IP（依次尝试各地址），Host 头保持原主机名，
+    HTTPS 通过 sni_hostname 扩展仍以原主机名握手与校验证书；全部地址连不上时丢弃缓存、按主机名直连。
+    """
+
+    def __init__(self, cache: DnsCache, transport: httpx.AsyncHTTPTransport):
+        self._cache = cache
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        try:
+            addrs = [a for a in await self._cache.resolve(host) if a != host]
+        except OSError:
+            addrs = []
+        extensions = dict(request.extensions)
+        if request.url.scheme == "https":
+            extensions.setdefault("sni_hostname", host)
+        for addr in addrs:
+            pinned = httpx.Request(
+                request.method,
+                request.url.copy_with(host=addr),
+                headers=request.headers,
+                stream=request.stream,
+                extensions=extensions,
+            )
+            try:
+                return await self._transport.handle_async_request(pinned)
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                continue
+        if addrs:
+            self._cache.forget(host)
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def _origin(url: str) -> str:
+    p = urlparse(url)
+    return f"{p.scheme}://{p.netloc}".lower()
+
+
+def proxy_label(proxy: Optional[str]) -> str:
+    """线路的显示名（去掉代理 URL 中的账号密码）；None 为系统/环境代理的默认线路。"""
+    if proxy is None:
+        return "default"
+    p = urlparse(proxy)
+    return f"{p.scheme}://{p.hostname}" + (f":{p.port}" if p.port else "")
+
+
+class ClientPool:
+    """
+    按源站（协议 + 主机 + 端口）与代理共享的 httpx 客户端。每个在途请求仍独占一条连接，
+    请求结束后连接保留 POOL_KEEPALIVE_SECONDS 秒供下一个分块复用。客户端绑定创建时的事件循环，
+    换了事件循环（新的 asyncio.run）时丢弃旧客户端。
+    """
+
+    def __init__(self, dns_cache: Optional[DnsCache] = None):
+        self.dns = dns_cache or DnsCache()
+        self._clients: Dict[Tuple[str, Optional[str]], httpx.AsyncClient] = {}
+        self._warmed: Dict[Tuple[str, Optional[str]], float] = {}
+        self._tasks: set = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _check_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._clients.clear()
+            self._warmed.clear()
+            self._tasks.clear()
+            self._loop = loop
+
+    def _transport(self, proxy: Optional[str] = None) -> httpx.AsyncBaseTransport:
+        transport = httpx.AsyncHTTPTransport(limits=_POOL_LIMITS, proxy=proxy)
+        if proxy is not None:
+            # 经代理时源站域名由代理解析
+            return transport
+        # 默认线路下环境代理由客户端的代理挂载处理，这里只承担直连的请求
+        return _CachedDnsTransport(self.dns, transport)
+
+    def get(self, url: str, proxy: Optional[str] = None) -> httpx.AsyncClient:
+        """
+        url 所在源站的共享客户端（按需创建）。proxy 为 None 时走默认线路（环境代理由 httpx 的代理挂载处理），
+        否则固定经该代理、忽略环境代理。
+        """
+        self._check_loop()
+        key = (_origin(url), proxy)
+        client = self._clients.get(key)
+        if client is None or client.is_closed:
+            kwargs = HTTPX_DOWNLOAD_KWARGS if proxy is None else {**HTTPX_DOWNLOAD_KWARGS, "trust_env": False}
+            client = httpx.AsyncClient(**kwargs, limits=_POOL_LIMITS, transport=self._transport(proxy))
+            self._clients[key] = client
+        return client
+
+    async def prewarm(
+        self, url: str, headers: Optional[dict] = None, connections: int = 1, proxy: Optional[str] = None,
+    ) -> None:
+        """
+        解析 DNS 并以 connections 个并发的 Range: bytes=0-0 请求建立连接、留在池中（经 proxy 时建立到代理的隧道）。
+        同一源站与线路在连接保活期的一半内只预热一次。失败不抛出（真正下载时会照常重试）。
+        """
+        self._check_loop()
+        key = (_origin(url), proxy)
+        now = time.monotonic()
+        if self._warmed.get(key, 0) > now - POOL_KEEPALIVE_SECONDS / 2:
+            return
+        self._warmed[key] = now
+        client = self.get(url, proxy)
+        if proxy is None:
+            try:
+                await self.dns.resolve(urlparse(url).hostname or "")
+            except OSError:
+                return
+
+        async def one():
+            async with client.stream("GET", url, headers={**(headers or {}), "Range": "bytes=0-0"}) as r:
+                # 读完（仅 1 字节）正文，连接才能放回池中复用
+                await r.aread()
+
+        await asyncio.gather(*(one() for _ in range(max(1, connections))), return_exceptions=True)
+
+    def prewarm_soon(
+        self, urls: Sequence[str], headers: Optional[dict] = None, connections: int = 1, proxy: Optional[str] = None,
+    ) -> None:
+        """在后台预热 urls 的源站，不等待结果。"""
+        self._check_loop()
+        for url in dict.fromkeys(urls):
+            task = asyncio.create_task(self.prewarm(url, headers, connections, proxy))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def aclose(self) -> None:
+        """取消未完成的预热并关闭全部客户端（须在创建它们的事件循环中调用）。"""
+        if self._loop is not asyncio.get_running_loop():
+            return
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        clients = list(self._clients.values())
+        self._clients.clear()
+        self._warmed.clear()
+        for client in clients:
+            await client.aclose()
+
+
+_client_pool: Optional[ClientPool] = None
+
+
+def get_client_pool() -> ClientPool:
+    """本进程共享的客户端池。"""
+    global _client_pool
+    if _client_pool is None:
+        _client_pool = ClientPool()
+    return _client_pool
@@ -0,0 +1,92 @@
+"""
+列表页分页抓取：发现搜索/列表页的分页链接，多标签页并发抓取后续页，
+每解析完一页即按视频 ID 去重输出 watch 链接，供批量流程边抓边下载。
+"""
+import asyncio
+from typing import AsyncIterator, Callable, Optional
+
+from .config import DEFAULT_MAX_LIST_PAGES, DEFAULT_PAGE_CRAWL_CONCURRENCY
+from .browser_cf import BrowserSession
+from .parser import (
+    extract_list_page_video_links,
+    extract_pagination_urls,
+    video_id_from_url,
+    _page_number,
+)
+
+
+async def crawl_list_pages(
+    session: BrowserSession,
+    first_url: str,
+    first_html: str,
+    max_pages: int = DEFAULT_MAX_LIST_PAGES,
+    concurrency: int = DEFAULT_PAGE_CRAWL_CONCURRENCY,
+    on_page: Optional[Callable[[str, int, Optional[Exception]], None]] = None,
+) -> AsyncIterator[str]:
+    """
+    从已加载的第一页开始抓取列表，按页完成顺序逐个产出去重后的视频页 URL。
+    - max_pages: 最多抓取的页数（含第一页）。
+    - concurrency: 同时打开的标签页数。
+    - on_page(page_url, new_count, error): 每页完成（或失败）时回调。
+    """
+    seen_ids: set[str] = set()
+    known_pages: set[int] = {_page_number(first_url)}
+    sem = asyncio.Semaphore(max(1, concurrency))
+    tasks: set[asyncio.Task] = set()
+
+    def _new_links(page_html: str, page_url: str) -> list[str]:
+        fresh = []
+        for u in extract_list_page_video_links(page_html, page_url):
+            key = video_id_from_url(u) or u
+            if key not in seen_ids:
+                seen_ids.add(key)
+                fresh.append(u)
+        return fresh
+
+    async with session.use() as handler:
+
+        async def fetch(page_url: str) -> tuple[str, Optional[str], Optional[Exception]]:
+            async with sem:
+                try:
+                    return page_url, await handler.fetch_in_new_tab(page_url), None
+                except Exception as e:
+                    return page_url, None, e
+
+        def schedule(page_html: str, page_url: str) -> None:
+            # 分页条可能只显示附近页码，每页解析后都重新发现后续页
+            for u in extract_pagination_urls(page_html, page_url):
+                if len(known_pages) >= max_pages:
+                    return
+                n = _page_number(u)
+                if n not in known_pages:
+                    known_pages.add(n)
+                    tasks.add(asyncio.create_task(fetch(u)))
+
+        try:
+            schedule(first_html, first_url)
+            links = _new_links(first_html, first_url)
+            if on_page:
+                on_page(first_url, len(links), None)
+            for u in links:
+                yield u
+
+            while tasks:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    tasks.discard(t)
+                    page_url, page_html, err = t.result()
+                    if err is not None or page_html is None:
+                        if on_page:
+                            on_page(page_url, 0, err)
+                        continue
+                    schedule(page_html, page_url)
+                    links = _new_links(page_html, page_url)
+                    if on_page:
+                        on_page(page_url, len(links), None)
+                    for u in links:
+                        yield u
+        finally:
+            for t in tasks:
+                t.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
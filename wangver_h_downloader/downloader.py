@@ -2,50 +2,377 @@
 多线程/并发下载引擎：接力浏览器凭证，分块多线程下载，多任务并发。
 """
 import asyncio
+import os
+import time
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, Callable
+from collections import deque
+from typing import Optional, Callable, Deque, List, Sequence
+from urllib.parse import urlparse
 
 import httpx
 import aiofiles
 
 from .config import (
+    CHUNK_RETRIES,
     DEFAULT_CHUNK_SIZE,
     DEFAULT_CHUNK_THREADS,
+    DEFAULT_MEMORY_BUDGET,
+    WRITE_BUFFER_BYTES,
     PART_SUFFIX,
+    PROXY_COOLDOWN,
+    PROXY_MAX_ERRORS,
+    SOURCE_MAX_ERRORS,
 )
+from . import events
+from .connections import get_client_pool, proxy_label
+from .streaming import StreamState
 from .browser_cf import SessionCredentials
-from .file_manager import find_part_file, sanitize_filename
+from .file_manager import (
+    find_part_file,
+    load_done_ranges,
+    part_state_path,
+    sanitize_filename,
+    save_done_ranges,
+)
+
+
+class MemoryBudget:
+    """
+    全局在途内存预算：已从网络收到、尚未写入磁盘的字节数之和不超过 limit。
+    acquire 在预算不足时等待（先到先得），release 在数据落盘后归还；
+    单次请求超过 limit 时，只要当前没有占用也放行，避免永久等待。limit 为 0 表示不限制。
+    """
+
+    def __init__(self, limit: int = DEFAULT_MEMORY_BUDGET):
+        self.limit = limit
+        self.used = 0
+        self.peak = 0
+        self.waits = 0          # 因预算耗尽而等待的次数
+        self._waiters: Deque[tuple[int, asyncio.Future]] = deque()
+
+    def _fits(self, n: int) -> bool:
+        return self.limit <= 0 or self.used == 0 or self.used + n <= self.limit
+
+    def _take(self, n: int) -> None:
+        self.used += n
+        self.peak = max(self.peak, self.used)
+
+    def try_acquire(self, n: int) -> bool:
+        if self._waiters or not self._fits(n):
+            return False
+        self._take(n)
+        return True
+
+    async def acquire(self, n: int) -> None:
+        if self.try_acquire(n):
+            return
+        self.waits += 1
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append((n, fut))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # 已分配但调用方被取消：归还
+                self.release(n)
+            else:
+                self._waiters = deque(w for w in self._waiters if w[1] is not fut)
+                self._wake()
+            raise
+
+    def release(self, n: int) -> None:
+        self.used = max(0, self.used - n)
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters:
+            n, fut = self._waiters[0]
+            if fut.done():
+                self._waiters.popleft()
+                continue
+            if not self._fits(n):
+                break
+            self._waiters.popleft()
+            self._take(n)
+            fut.set_result(None)
+
+    def stats(self) -> dict:
+        return {"used": self.used, "peak": self.peak, "limit": self.limit, "waits": self.waits}
+
+
+_memory_budget: Optional[MemoryBudget] = None
+
+
+def get_memory_budget() -> MemoryBudget:
+    """本进程所有下载共享的内存预算（首次使用时按默认值创建）。"""
+    global _memory_budget
+    if _memory_budget is None:
+        _memory_budget = MemoryBudget()
+    return _memory_budget
+
+
+def set_memory_budget(limit: int) -> MemoryBudget:
+    """设置全局内存预算（字节，0 为不限制），在开始下载前调用。"""
+    global _memory_budget
+    _memory_budget = MemoryBudget(limit)
+    return _memory_budget
+
+
+@dataclass
+class _SourceStats:
+    bytes: int = 0
+    seconds: float = 0.0
+    inflight: int = 0
+    errors: int = 0          # 连续失败次数，成功后清零
+    dead: bool = False
+
+    def throughput(self) -> float:
+        # 尚未测得速度的源给一个极大值，保证每个源至少被尝试一次
+        return self.bytes / self.seconds if self.seconds > 0 else float("inf")
+
+
+class SourcePool:
+    """
+    同一视频的多个等价直链（不同 CDN 主机）：按实测吞吐与在途分块数分配新分块，
+    出错的源被降权，连续失败达到上限后停用；只有一个源时行为与单直链下载一致。
+    """
+
+    def __init__(self, urls: Sequence[str], max_errors: int = SOURCE_MAX_ERRORS):
+        self.urls = list(dict.fromkeys(urls))
+        self.max_errors = max_errors
+        self._stats = {u: _SourceStats() for u in self.urls}
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+    def pick(self, exclude: Sequence[str] = ()) -> str:
+        """选出得分最高的可用源：吞吐 / (在途数 + 1)，失败次数越多得分越低。"""
+        alive = [u for u in self.urls if not self._stats[u].dead]
+        pool = [u for u in alive if u not in exclude] or alive or self.urls
+
+        def score(u: str) -> float:
+            st = self._stats[u]
+            return st.throughput() / (st.inflight + 1) / (st.errors + 1)
+
+        return max(pool, key=score)
+
+    def begin(self, url: str) -> float:
+        self._stats[url].inflight += 1
+        return time.monotonic()
+
+    def success(self, url: str, nbytes: int, started: float) -> None:
+        st = self._stats[url]
+        st.inflight -= 1
+        st.bytes += nbytes
+        st.seconds += time.monotonic() - started
+        st.errors = 0
+
+    def failure(self, url: str) -> None:
+        st = self._stats[url]
+        st.inflight -= 1
+        st.errors += 1
+        if st.errors >= self.max_errors and any(not self._stats[u].dead for u in self.urls if u != url):
+            st.dead = True
+
+
+class ProxyPool(SourcePool):
+    """
+    下载线路池（代理 URL；None 为系统/环境代理的默认线路），本进程所有下载共享：每个分块按各线路的
+    实测吞吐、在途分块数与连续失败次数选线路。连续失败达到上限的线路暂停 cooldown 秒，到期后重新参与
+    （再失败一次即再次暂停），不会永久停用。只有默认线路时与不使用代理池完全一致。
+    """
+
+    def __init__(
+        self,
+        proxies: Sequence[Optional[str]] = (None,),
+        max_errors: int = PROXY_MAX_ERRORS,
+        cooldown: float = PROXY_COOLDOWN,
+    ):
+        super().__init__(list(proxies) or [None], max_errors)
+        self.cooldown = cooldown
+        self._retired_at: dict = {}
+        self._requests = {p: 0 for p in self.urls}
+        self._failures = {p: 0 for p in self.urls}
+
+    @property
+    def proxies(self) -> List[Optional[str]]:
+        return self.urls
+
+    def pick(self, exclude: Sequence[Optional[str]] = ()) -> Optional[str]:
+        now = time.monotonic()
+        for p, retired in list(self._retired_at.items()):
+            if now - retired >= self.cooldown:
+                # 暂停期满：恢复参与，但只差一次失败就会再次暂停
+                del self._retired_at[p]
+                self._stats[p].dead = False
+                self._stats[p].errors = self.max_errors - 1
+        # 尚未测得速度的线路按在途数轮流分配，避免同时开始的分块全部挤到第一条线路上
+        untested = [
+            p for p in self.urls
+            if p not in exclude and not self._stats[p].dead and self._stats[p].seconds == 0
+        ]
+        if untested:
+            return min(untested, key=lambda p: self._stats[p].inflight)
+        return super().pick(exclude)
+
+    def begin(self, url: Optional[str]) -> float:
+        self._requests[url] += 1
+        return super().begin(url)
+
+    def failure(self, url: Optional[str]) -> None:
+        self._failures[url] += 1
+        super().failure(url)
+        if self._stats[url].dead and url not in self._retired_at:
+            self._retired_at[url] = time.monotonic()
 
+    def stats(self) -> List[dict]:
+        """各线路的累计下载量、吞吐、请求数、失败数与是否暂停中。"""
+        return [
+            {
+                "proxy": proxy_label(p),
+                "bytes": self._stats[p].bytes,
+                "throughput": round(self._stats[p].bytes / self._stats[p].seconds, 1) if self._stats[p].seconds else None,
+                "requests": self._requests[p],
+                "failures": self._failures[p],
+                "retired": self._stats[p].dead,
+            }
+            for p in self.urls
+        ]
 
-def _cookies_to_headers(cookies: list) -> dict:
-    """将 Playwright cookies 列表转为 Cookie 请求头。"""
-    parts = []
-    for c in cookies:
-        name = c.get("name")
-        value = c.get("value")
-        if name and value is not None:
-            parts.append(f"{name}={value}")
-    if not parts:
-        return {}
-    return {"Cookie": "; ".join(parts)}
 
+_proxy_pool: Optional[ProxyPool] = None
 
-# 下载请求：跟随重定向、较长超时（走代理时需更长时间）；默认走系统/环境代理
-HTTPX_DOWNLOAD_KWARGS = {"follow_redirects": True, "timeout": 120, "trust_env": True}
 
+def get_proxy_pool() -> ProxyPool:
+    """本进程所有下载共享的线路池（未配置时只有默认线路）。"""
+    global _proxy_pool
+    if _proxy_pool is None:
+        _proxy_pool = ProxyPool()
+    return _proxy_pool
 
-async def _head_for_range(url: str, credentials: Optional[SessionCredentials]) -> tuple[int, bool]:
-    """HEAD 请求获取文件大小与是否支持 Range。"""
-    headers = {}
+
+def set_proxy_pool(proxies: Sequence[Optional[str]]) -> ProxyPool:
+    """设置下载线路（代理 URL 列表，None 为默认线路），在开始下载前调用。"""
+    global _proxy_pool
+    _proxy_pool = ProxyPool(proxies)
+    return _proxy_pool
+
+
+def _parse_total_size(r: httpx.Response) -> int:
+    """从 Content-Range（bytes 0-0/12345）或 Content-Length 取得文件总大小，未知返回 0。"""
+    content_range = r.headers.get("content-range", "")
+    if "/" in content_range:
+        total = content_range.rsplit("/", 1)[1].strip()
+        if total.isdigit():
+            return int(total)
+    if r.status_code == 200:
+        return int(r.headers.get("content-length", 0) or 0)
+    return 0
+
+
+async def _preallocate(dest_path: Path, total: int) -> None:
+    """确保目标文件存在且长度不小于 total，便于各分块按偏移写入。"""
+    dest_path.parent.mkdir(parents=True, exist_ok=True)
+    if dest_path.exists() and dest_path.stat().st_size >= total:
+        return
+    async with aiofiles.open(dest_path, "r+b" if dest_path.exists() else "wb") as f:
+        await f.seek(total - 1)
+        await f.write(b"\x00")
+
+
+async def _fetch_first_chunk(
+    url: str,
+    dest_path: Path,
+    credentials: Optional[SessionCredentials],
+    chunk_size: int,
+    progress_callback: Optional[Callable[[int], None]],
+    proxy: Optional[str] = None,
+) -> tuple[int, int]:
+    """
+    用 Range GET 下载首个分块，同时从 Content-Range 得知文件总大小（省去单独的 HEAD 往返）。
+    返回 (总大小, 已写入的首块字节数)；服务器忽略 Range（返回 200 全文）或不告知总大小时，
+    直接顺序写完整个文件，返回 (总大小, -1)。proxy 为所用线路（None 为默认线路）。
+    """
+    headers = {"Range": f"bytes=0-{chunk_size - 1}"}
     if credentials:
-        headers["User-Agent"] = credentials.user_agent
-        headers.update(_cookies_to_headers(credentials.cookies))
-    async with httpx.AsyncClient(**HTTPX_DOWNLOAD_KWARGS) as client:
-        r = await client.head(url, headers=headers)
+        headers.update(credentials.headers())
+    dest_path.parent.mkdir(parents=True, exist_ok=True)
+    client = get_client_pool().get(url, proxy)
+    async with client.stream("GET", url, headers=headers) as r:
+        r.raise_for_status()
+        total = _parse_total_size(r) if r.status_code == 206 else 0
+        if total > 0:
+            await _preallocate(dest_path, total)
+            n = await _write_stream(r, dest_path, 0)
+            if n != min(chunk_size, total):
+                raise httpx.HTTPError(f"首块长度不符: 期望 {min(chunk_size, total)}，实际 {n}")
+            if progress_callback:
+                progress_callback(n)
+            return total, n
+        if r.status_code != 206:
+            # 忽略 Range，返回的就是完整文件：边收边写，不整体读入内存
+            return await _stream_to_file(r, dest_path, progress_callback), -1
+    # 支持 Range 但不告知总大小（bytes 0-n/*），无法分块，改为整体下载
+    headers.pop("Range")
+    async with client.stream("GET", url, headers=headers) as r:
         r.raise_for_status()
-        total = int(r.headers.get("content-length", 0))
-        accept_ranges = (r.headers.get("accept-ranges") or "").lower() == "bytes"
-        return total, accept_ranges
+        return await _stream_to_file(r, dest_path, progress_callback), -1
+
+
+async def _stream_to_file(
+    r: httpx.Response, dest_path: Path, progress_callback: Optional[Callable[[int], None]],
+) -> int:
+    """把完整响应顺序写入 dest_path（覆盖），返回写入字节数。"""
+    return await _write_stream(r, dest_path, 0, mode="wb", on_write=progress_callback)
+
+
+async def _write_stream(
+    r: httpx.Response,
+    dest_path: Path,
+    offset: int,
+    mode: str = "r+b",
+    on_write: Optional[Callable[[int], None]] = None,
+) -> int:
+    """
+    边收边写：把响应正文从 offset 起写入 dest_path，返回写入字节数。
+    已收到、未写入的数据计入全局内存预算，累积到 WRITE_BUFFER_BYTES 时落盘并归还；
+    预算耗尽时先写出自己的缓冲再等待（等待期间不再读取网络数据，由 TCP 背压限速）。
+    """
+    budget = get_memory_budget()
+    buf: List[bytes] = []
+    held = 0
+    written = 0
+    async with aiofiles.open(dest_path, mode) as f:
+        await f.seek(offset)
+
+        async def flush():
+            nonlocal held, written
+            if buf:
+                data = b"".join(buf)
+                buf.clear()
+                await f.write(data)
+                written += len(data)
+                if on_write:
+                    on_write(len(data))
+            budget.release(held)
+            held = 0
+
+        try:
+            async for data in r.aiter_bytes():
+                if not budget.try_acquire(len(data)):
+                    # 先写出自己的缓冲，保证所有读取方都在等待时预算也能被归还
+                    await flush()
+                    await budget.acquire(len(data))
+                held += len(data)
+                buf.append(data)
+                if held >= WRITE_BUFFER_BYTES:
+                    await flush()
+            await flush()
+        finally:
+            if held:
+                budget.release(held)
+    return written
 
 
 async def download_single_chunk(
@@ -57,20 +384,22 @@ async def download_single_chunk(
     credentials: Optional[SessionCredentials],
     progress_callback: Optional[Callable[[int], None]],
 ) -> int:
-    """下载一个分块并写入文件指定偏移，返回写入字节数。"""
+    """
+    下载一个分块并边收边写到文件指定偏移（受全局内存预算约束），返回写入字节数。
+    分块完整写入后才计入进度；中途失败时已写部分由重试覆盖。
+    """
     headers = {"Range": f"bytes={start}-{end}"}
     if credentials:
-        headers["User-Agent"] = credentials.user_agent
-        headers.update(_cookies_to_headers(credentials.cookies))
-
-    r = await client.get(url, headers=headers)
-    r.raise_for_status()
-    data = r.content
-    n = len(data)
+        headers.update(credentials.headers())
 
-    async with aiofiles.open(dest_path, "r+b") as f:
-        await f.seek(start)
-        await f.write(data)
+    async with client.stream("GET", url, headers=headers) as r:
+        r.raise_for_status()
+        if r.status_code != 206 or not r.headers.get("content-range", "").startswith(f"bytes {start}-"):
+            # 服务器忽略了 Range（返回整个文件）或返回的区间不符，写入会错位
+            raise httpx.HTTPError(f"分块区间不符: 状态 {r.status_code}，{r.headers.get('content-range')}")
+        n = await _write_stream(r, dest_path, start)
+    if n != end - start + 1:
+        raise httpx.HTTPError(f"分块长度不符: 期望 {end - start + 1}，实际 {n}")
 
     if progress_callback:
         progress_callback(n)
@@ -85,37 +414,62 @@ async def download_chunked(
     max_concurrent_chunks: int = DEFAULT_CHUNK_THREADS,
     progress_callback: Optional[Callable[[int], None]] = None,
     semaphore: Optional[asyncio.Semaphore] = None,
+    mirrors: Optional[Sequence[str]] = None,
+    gate: Optional[asyncio.Event] = None,
+    stream: Optional[StreamState] = None,
 ) -> Path:
     """
-    分块并发下载到 dest_path（可为 .part 路径，支持断点续传：已存在则跳过已下载区间）。
+    分块并发下载到 dest_path（可为 .part 路径，支持断点续传：按 .part.ranges 记录跳过已下载区间，
+    每完成一个分块即更新记录，进程中断后可精确续传）。
+    mirrors：与 url 等价的镜像直链，分块按各源实测速度分摊，某个源出错时换源重试该分块。
+    配置了代理池（set_proxy_pool）时，各分块同样按线路实测速度分摊到各代理，出错时换线路重试。
+    gate：暂停开关，未置位时不再开始新分块（在途分块照常完成），置位后继续。
+    stream：边下边播状态，分块不再按偏移顺序一次性排队，而是每次取播放位置附近的下一个（见 streaming.py），
+    并随时上报已完成区间供播放服务读取。
     返回最终文件路径（若为 .part 则返回 .part 路径，由调用方在完成后重命名）。
     """
-    total, accept_ranges = await _head_for_range(url, credentials)
-    if total <= 0:
-        # 不支持 Content-Length 时整块下载
-        headers = {}
-        if credentials:
-            headers["User-Agent"] = credentials.user_agent
-            headers.update(_cookies_to_headers(credentials.cookies))
-        async with httpx.AsyncClient(**HTTPX_DOWNLOAD_KWARGS) as client:
-            r = await client.get(url, headers=headers)
-            r.raise_for_status()
-            async with aiofiles.open(dest_path, "wb") as f:
-                await f.write(r.content)
+    # 断点续传：记下已有文件长度（须在首块写入前读取）
+    existing = dest_path.stat().st_size if dest_path.exists() else 0
+    prior = load_done_ranges(dest_path)
+    # 首块每次都会重新请求（顺带取得总大小）；续传时它已计入进度，不再重复上报。
+    # 没有区间记录的旧 .part 按顺序写入，长度覆盖首块即说明首块已下载
+    if prior is None:
+        first_done = existing >= chunk_size
+    else:
+        first_done = bool(prior) and prior[0][0] == 0 and prior[0][1] >= chunk_size - 1
+    proxies = get_proxy_pool()
+    proxy = proxies.pick()
+    started = proxies.begin(proxy)
+    try:
+        total, first = await _fetch_first_chunk(
+            url, dest_path, credentials, chunk_size, None if first_done else progress_callback, proxy,
+        )
+    except Exception:
+        proxies.failure(proxy)
+        raise
+    proxies.success(proxy, total if first < 0 else first, started)
+    if first < 0:
+        # 不支持 Range 或大小未知，已整体下载完毕
+        part_state_path(dest_path).unlink(missing_ok=True)
+        if stream is not None:
+            stream.start(dest_path, total, [(0, total - 1)] if total else [])
         return dest_path
 
-    # 确定已下载范围（断点续传）
-    done_ranges: list[tuple[int, int]] = []
-    if dest_path.exists():
-        size = dest_path.stat().st_size
-        if size > 0:
-            done_ranges.append((0, min(size, total) - 1))
+    if existing > total:
+        # 直链已换成更小的文件：截掉旧数据
+        os.truncate(dest_path, total)
+    recorded = load_done_ranges(dest_path, total)
+    if recorded is None:
+        # 没有区间记录：长度小于总大小的旧 .part 是顺序写入的，其长度即已下载前缀；
+        # 与总大小相同的文件是预分配的，无法判断哪些区间已写入，只能重新下载
+        recorded = [(0, existing - 1)] if 0 < existing < total else []
+    done_ranges = save_done_ranges(dest_path, total, [*recorded, (0, first - 1)])
+    if stream is not None:
+        stream.start(dest_path, total, done_ranges)
 
     def _ranges_to_download() -> list[tuple[int, int]]:
-        if not accept_ranges:
-            return [(0, total - 1)] if total > 0 else []
         needed = []
-        pos = 0
+        pos = first
         while pos < total:
             end = min(pos + chunk_size, total) - 1
             # 检查是否已被 done_ranges 覆盖
@@ -133,31 +487,76 @@ async def download_chunked(
     if not chunks:
         return dest_path
 
-    # 确保目标文件存在且长度足够，便于分块写入
-    dest_path.parent.mkdir(parents=True, exist_ok=True)
-    if not dest_path.exists():
-        async with aiofiles.open(dest_path, "wb") as f:
-            await f.seek(total - 1)
-            await f.write(b"\x00")
-    else:
-        current_size = dest_path.stat().st_size
-        if current_size < total:
-            async with aiofiles.open(dest_path, "r+b") as f:
-                await f.seek(total - 1)
-                await f.write(b"\x00")
+    pool = SourcePool([url, *(mirrors or [])])
+    clients = get_client_pool()
+    sem = semaphore or asyncio.Semaphore(max_concurrent_chunks)
+    # 至少重试 CHUNK_RETRIES 次（单源单线路时偶发断连不致整个下载失败），且每种源 × 线路组合都有机会试一次
+    max_attempts = max(CHUNK_RETRIES + 1, len(pool) * max(1, len(proxies)))
 
     async def do_one(chunk_start: int, chunk_end: int):
-        async with (semaphore or asyncio.Semaphore(max_concurrent_chunks)):
-            async with httpx.AsyncClient(**HTTPX_DOWNLOAD_KWARGS) as client:
-                await download_single_chunk(
-                    client, url, chunk_start, chunk_end,
-                    dest_path, credentials, progress_callback,
-                )
-
-    await asyncio.gather(*[do_one(s, e) for s, e in chunks])
+        if gate is not None:
+            await gate.wait()
+        async with sem:
+            if gate is not None:
+                await gate.wait()
+            tried: List[str] = []
+            tried_proxies: List[Optional[str]] = []
+            while True:
+                src = pool.pick(exclude=tried)
+                proxy = proxies.pick(exclude=tried_proxies)
+                started = pool.begin(src)
+                proxies.begin(proxy)
+                try:
+                    # 每个在途分块占用一条连接；分块结束后连接留在池中供下一个分块复用
+                    n = await download_single_chunk(
+                        clients.get(src, proxy), src, chunk_start, chunk_end,
+                        dest_path, credentials, progress_callback,
+                    )
+                except Exception as e:
+                    # 无法区分是源还是线路的问题，两者都记一次失败，由吞吐评分自行分辨
+                    pool.failure(src)
+                    proxies.failure(proxy)
+                    tried.append(src)
+                    tried_proxies.append(proxy)
+                    if len(tried) >= max_attempts:
+                        raise
+                    retry = dict(
+                        chunk=[chunk_start, chunk_end],
+                        source=urlparse(src).hostname,
+                        attempt=len(tried) + 1,
+                        reason=str(e) or type(e).__name__,
+                    )
+                    if len(proxies) > 1:
+                        retry["proxy"] = proxy_label(proxy)
+                    events.emit(events.EVENT_RETRIED, **retry)
+                    continue
+                pool.success(src, n, started)
+                proxies.success(proxy, n, started)
+                done_ranges.append((chunk_start, chunk_end))
+                done_ranges[:] = save_done_ranges(dest_path, total, done_ranges)
+                if stream is not None:
+                    stream.update(done_ranges)
+                return
+
+    if stream is None:
+        await asyncio.gather(*[do_one(s, e) for s, e in chunks])
+        return dest_path
+
+    # 边下边播：固定数量的工作者，每次从剩余分块中取播放位置附近的下一个，播放器跳转后随即改下新位置
+    async def stream_worker():
+        while chunks:
+            await do_one(*stream.next_chunk(chunks))
+
+    await asyncio.gather(*[stream_worker() for _ in range(min(max_concurrent_chunks, len(chunks)))])
     return dest_path
 
 
+def output_name(url: str, title: str) -> tuple[str, str]:
+    """最终文件名（清洗后的标题, 扩展名）；各下载后端共用，保证命名一致。"""
+    ext = ".mp4" if ".m3u8" not in url.lower() else ".m3u8"
+    return sanitize_filename(title), ext
+
+
 async def download_task(
     url: str,
     title: str,
@@ -166,29 +565,42 @@ async def download_task(
     chunk_size: int = DEFAULT_CHUNK_SIZE,
     chunk_threads: int = DEFAULT_CHUNK_THREADS,
     progress_callback: Optional[Callable[[int], None]] = None,
+    mirrors: Optional[Sequence[str]] = None,
+    gate: Optional[asyncio.Event] = None,
+    stream: Optional[StreamState] = None,
 ) -> Path:
     """
     单任务：解析文件名、检查 .part 断点、分块下载、完成后重命名为最终文件名。
+    mirrors：等价镜像直链；gate：暂停开关；stream：边下边播状态。见 download_chunked。
     """
-    safe_title = sanitize_filename(title)
-    ext = ".mp4" if ".m3u8" not in url.lower() else ".m3u8"
-    final_name = safe_title + ext
-    final_path = output_dir / final_name
+    safe_title, ext = output_name(url, title)
+    final_path = output_dir / (safe_title + ext)
 
     part_path = find_part_file(output_dir, safe_title, ext)
     if part_path is None:
         part_path = output_dir / (safe_title + ext + PART_SUFFIX)
 
-    await download_chunked(
-        url,
-        part_path,
-        credentials,
-        chunk_size=chunk_size,
-        max_concurrent_chunks=chunk_threads,
-        progress_callback=progress_callback,
-    )
+    try:
+        await download_chunked(
+            url,
+            part_path,
+            credentials,
+            chunk_size=chunk_size,
+            max_concurrent_chunks=chunk_threads,
+            progress_callback=progress_callback,
+            mirrors=[m for m in (mirrors or []) if m != url],
+            gate=gate,
+            stream=stream,
+        )
+    except Exception as e:
+        if stream is not None:
+            stream.fail(e)
+        raise
 
+    part_state_path(part_path).unlink(missing_ok=True)
     if part_path.suffix == PART_SUFFIX or part_path.name.endswith(PART_SUFFIX):
         part_path.rename(final_path)
-        return final_path
+        part_path = final_path
+    if stream is not None:
+        stream.finish(part_path)
     return part_path
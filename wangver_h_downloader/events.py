@@ -0,0 +1,128 @@
+"""
+机器可读事件流（--events jsonl）：每行一个 JSON 对象，替代 Rich 界面，供编排系统直接解析。
+每条事件含 ts（Unix 时间戳）、event（类型）与 url（视频页 URL）等字段：
+resolved / started / streaming / progress / retried / completed / moved / failed / cf_challenge / summary。
+"""
+import asyncio
+import contextvars
+import json
+import sys
+import time
+from pathlib import Path
+from typing import IO, Callable, Optional
+
+from .config import EVENTS_PROGRESS_INTERVAL
+
+EVENT_RESOLVED = "resolved"
+EVENT_STARTED = "started"
+EVENT_STREAMING = "streaming"
+EVENT_PROGRESS = "progress"
+EVENT_RETRIED = "retried"
+EVENT_COMPLETED = "completed"
+EVENT_MOVED = "moved"
+EVENT_FAILED = "failed"
+EVENT_CF_CHALLENGE = "cf_challenge"
+EVENT_SUMMARY = "summary"
+
+# 当前下载所属的视频页 URL：下载引擎内部的事件（如分块重试）据此归属到视频，无需层层传参
+current_url: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_url", default=None)
+
+
+class EventSink:
+    """JSON Lines 输出：逐行写入并立即 flush，读取方可实时跟随（如 tail -f）。"""
+
+    def __init__(self, stream: IO[str], owns_stream: bool = False):
+        self.stream = stream
+        self.owns_stream = owns_stream
+
+    def emit(self, event: str, **fields) -> None:
+        record = {"ts": round(time.time(), 3), "event": event}
+        url = current_url.get()
+        if url is not None:
+            record["url"] = url
+        record.update(fields)
+        self.stream.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        self.stream.flush()
+
+    def close(self) -> None:
+        if self.owns_stream:
+            self.stream.close()
+
+
+_sink: Optional[EventSink] = None
+
+
+def open_sink(target: str = "-") -> EventSink:
+    """启用事件流："-" 为标准输出，否则追加写入文件。"""
+    global _sink
+    if target == "-":
+        _sink = EventSink(sys.stdout)
+    else:
+        path = Path(target)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _sink = EventSink(open(path, "a", encoding="utf-8"), owns_stream=True)
+    return _sink
+
+
+def close_sink() -> None:
+    global _sink
+    if _sink is not None:
+        _sink.close()
+        _sink = None
+
+
+def enabled() -> bool:
+    return _sink is not None
+
+
+def emit(event: str, **fields) -> None:
+    """输出一条事件；未启用事件流时什么也不做。"""
+    if _sink is not None:
+        _sink.emit(event, **fields)
+
+
+class ProgressSampler:
+    """
+    下载进度采样：回调中只累加字节数，由后台协程每 interval 秒输出一条 progress 事件
+    （含区间速度），下载停滞时也照常输出，读取方可据此判断卡住。未启用事件流时不启动。
+    extra 返回的字段（如全局缓冲水位）一并附在每条 progress 事件中。
+    """
+
+    def __init__(
+        self,
+        total: int = 0,
+        completed: int = 0,
+        interval: float = EVENTS_PROGRESS_INTERVAL,
+        extra: Optional[Callable[[], dict]] = None,
+    ):
+        self.total = total
+        self.completed = completed
+        self.interval = interval
+        self.extra = extra
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, n: int) -> None:
+        self.completed += n
+
+    def start(self) -> None:
+        if enabled() and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        last_bytes, last_time = self.completed, time.monotonic()
+        while True:
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            emit(
+                EVENT_PROGRESS,
+                bytes=self.completed,
+                total=self.total or None,
+                speed=round((self.completed - last_bytes) / (now - last_time), 1),
+                **(self.extra() if self.extra else {}),
+            )
+            last_bytes, last_time = self.completed, now
@@ -1,11 +1,13 @@
 """
 断点续传与媒体文件管理：.part 识别、智能重命名、输出目录管理。
 """
+import json
+import os
 import re
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional, Tuple
 
-from .config import DEFAULT_OUTPUT_DIR, INVALID_FILENAME_CHARS, PART_SUFFIX
+from .config import DEFAULT_OUTPUT_DIR, INVALID_FILENAME_CHARS, PART_SUFFIX, PART_STATE_SUFFIX
 
 
 def sanitize_filename(name: str) -> str:
@@ -34,6 +36,75 @@ def find_part_file(output_dir: Path, base_name: str, ext: str) -> Optional[Path]
     return None
 
 
+def part_state_path(part_path: Path) -> Path:
+    """.part 对应的区间记录文件（{part}.ranges）。"""
+    return part_path.with_name(part_path.name + PART_STATE_SUFFIX)
+
+
+def merge_ranges(ranges) -> List[Tuple[int, int]]:
+    """合并重叠或相邻的闭区间 [(start, end), ...]。"""
+    merged: List[Tuple[int, int]] = []
+    for a, b in sorted((int(a), int(b)) for a, b in ranges if b >= a):
+        if merged and a <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], b))
+        else:
+            merged.append((a, b))
+    return merged
+
+
+def load_done_ranges(part_path: Path, total: Optional[int] = None) -> Optional[List[Tuple[int, int]]]:
+    """
+    读取 .part 已完整写入的字节区间；没有记录、记录损坏或总大小不符（直链已换文件）时返回 None，
+    total 为 None 时不校验总大小。
+    分块按偏移写入、文件预分配到总大小，.part 的长度不能说明下载进度，只能以此记录为准。
+    """
+    try:
+        data = json.loads(part_state_path(part_path).read_text(encoding="utf-8"))
+        if total is not None and data.get("total") != total:
+            return None
+        return merge_ranges(data.get("done", []))
+    except (OSError, ValueError, TypeError, AttributeError):
+        return None
+
+
+def atomic_write_text(path: Path, text: str, newline: Optional[str] = None, fsync: bool = True) -> Path:
+    """
+    原子写入文本文件：先写同目录下的 .tmp，fsync 后 os.replace 覆盖，崩溃时不会留下写了一半的文件。
+    fsync=False 时省去刷盘（只需保证不出现半截文件、频繁写回的小状态文件）。
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8", newline=newline) as f:
+        f.write(text)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return path
+
+
+def save_done_ranges(part_path: Path, total: int, ranges) -> List[Tuple[int, int]]:
+    """原子写回已完成区间（合并后），返回合并结果。"""
+    merged = merge_ranges(ranges)
+    # 每个分块完成都会写回，分块数据本身也未刷盘，这里不单独 fsync
+    atomic_write_text(part_state_path(part_path), json.dumps({"total": total, "done": merged}), fsync=False)
+    return merged
+
+
+def part_bytes_done(part_path: Path) -> int:
+    """.part 已下载的字节数：有区间记录时按记录求和，否则为文件长度（顺序写入的旧 .part）。"""
+    try:
+        data = json.loads(part_state_path(part_path).read_text(encoding="utf-8"))
+        return sum(b - a + 1 for a, b in merge_ranges(data.get("done", [])))
+    except (OSError, ValueError, TypeError, AttributeError):
+        pass
+    try:
+        return part_path.stat().st_size
+    except OSError:
+        return 0
+
+
 def build_output_path(output_dir: Path, title: str, ext: str = ".mp4") -> Path:
     """根据标题生成最终输出文件路径。"""
     safe = sanitize_filename(title)
@@ -0,0 +1,314 @@
+"""
+批量检查点日志：run_batch 运行时把读入的页面 URL、解析结果（含解析时间与凭证引用）和每个任务的结束状态
+逐行追加到 JSON Lines 文件（分批落盘）；中断（Ctrl-C、崩溃、重启）后 --resume 据此续跑：
+已完成的跳过，解析结果仍新鲜的直接下载，直链或 CF Cookies 可能已过期的重新解析。
+内存中每个视频只保留状态与优先级，解析结果续跑时再从日志读回，超大批量也不会占用大量内存。
+单个文件的字节级进度由 .part.ranges 记录（见 file_manager）。
+"""
+import json
+import os
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+from urllib.parse import parse_qs, urlparse
+
+from .config import (
+    DEFAULT_JOURNAL_FILE,
+    JOURNAL_EXPIRY_MARGIN,
+    JOURNAL_LINK_TTL,
+    JOURNAL_SYNC_EVERY,
+    JOURNAL_SYNC_INTERVAL,
+)
+from .browser_cf import SessionCredentials
+from .parser import VideoTarget, target_from_dict, video_key
+
+OP_START = "start"
+OP_PAGE = "page"
+OP_CREDS = "creds"
+OP_RESOLVED = "resolved"
+OP_FINISHED = "finished"
+
+STATUS_PENDING = "pending"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+# 直链查询参数中常见的过期时间字段（Unix 时间戳）
+_EXPIRY_KEYS = ("expires", "expire", "expiry", "exp", "e", "Expires", "x-expires")
+# 标记 CF 验证有效期的 Cookie
+_CF_COOKIE = "cf_clearance"
+
+
+@dataclass
+class JournalEntry:
+    """日志中一个页面 URL 的当前状态（按日志重放得到；解析结果不常驻内存，见 BatchJournal.resume_items）。"""
+    url: str
+    priority: int = 0
+    status: str = STATUS_PENDING
+    stage: Optional[str] = None
+
+
+def link_expiry(url: str) -> Optional[float]:
+    """直链查询参数中的过期时间（Unix 时间戳），没有时返回 None。"""
+    query = parse_qs(urlparse(url).query)
+    for key in _EXPIRY_KEYS:
+        for value in query.get(key, []):
+            # 至少 9 位才当作时间戳，避免把 e=1 之类的普通参数误认为过期时间
+            if value.isdigit() and len(value) >= 9:
+                return float(value)
+    return None
+
+
+def cookies_expiry(credentials: Optional[SessionCredentials]) -> Optional[float]:
+    """CF 验证 Cookie 的过期时间；没有或为会话 Cookie 时返回 None。"""
+    if credentials is None:
+        return None
+    expires = [
+        float(c["expires"]) for c in credentials.cookies
+        if c.get("name") == _CF_COOKIE and (c.get("expires") or 0) > 0
+    ]
+    return min(expires) if expires else None
+
+
+def is_fresh(
+    target: Optional[VideoTarget],
+    credentials: Optional[SessionCredentials],
+    resolved_at: float,
+    now: Optional[float] = None,
+    ttl: float = JOURNAL_LINK_TTL,
+    margin: float = JOURNAL_EXPIRY_MARGIN,
+) -> bool:
+    """
+    已解析的目标是否仍可直接下载：以直链自带的过期时间为准，没有时按解析时间 + ttl 估计；
+    CF Cookie 更早过期时以其为准。距过期不足 margin 秒也视为过期。
+    """
+    if target is None:
+        return False
+    now = time.time() if now is None else now
+    deadline = link_expiry(target.direct_url)
+    if deadline is None:
+        deadline = resolved_at + ttl
+    cf_deadline = cookies_expiry(credentials)
+    if cf_deadline is not None:
+        deadline = min(deadline, cf_deadline)
+    return now + margin < deadline
+
+
+class BatchJournal:
+    """
+    JSON Lines 日志，每行一个操作：start（输入来源）、page（读入的页面 URL 与优先级）、
+    creds（凭证，按编号引用，避免每条重复写入 Cookies）、resolved（解析结果与时间）、finished（成功或失败）。
+    每行写入后立即 flush（进程崩溃时最多丢失正在写的一行），每 JOURNAL_SYNC_EVERY 行或 JOURNAL_SYNC_INTERVAL 秒
+    及 close() 时 fsync，不在每行上阻塞事件循环；读取时忽略不完整的末行。
+    entries 以视频 ID（无法识别时为 URL）为键；`url in journal` 判断该视频是否已记录。
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path or DEFAULT_JOURNAL_FILE)
+        self.entries: Dict[str, JournalEntry] = {}
+        self.source: Optional[str] = None
+        self._creds_count = 0
+        # 凭证 -> 日志中的编号：按对象 id 查找（保留对象引用，id 不会被复用），新对象再按内容查找
+        self._creds_by_id: Dict[int, Tuple[SessionCredentials, int]] = {}
+        self._creds_by_content: Dict[str, int] = {}
+        self._loaded = False
+        self._file = None
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+
+    def __contains__(self, url: str) -> bool:
+        return video_key(url) in self.entries
+
+    def _records(self):
+        """逐条读取日志记录；文件不存在时不产出，忽略崩溃时写了一半的行。"""
+        try:
+            f = open(self.path, encoding="utf-8")
+        except OSError:
+            return
+        with f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(rec, dict) and "op" in rec:
+                    yield rec
+
+    def load(self) -> "BatchJournal":
+        """重放已有日志（只取各视频的状态与优先级）；文件不存在时保持为空。"""
+        self._loaded = True
+        for rec in self._records():
+            try:
+                self._apply(rec)
+            except (KeyError, TypeError):
+                continue
+        return self
+
+    def _entry(self, url: str, priority: int = 0) -> JournalEntry:
+        return self.entries.setdefault(video_key(url), JournalEntry(url, priority))
+
+    def _apply(self, rec: dict) -> None:
+        op = rec["op"]
+        if op == OP_START:
+            self.source = rec.get("source") or self.source
+        elif op == OP_PAGE:
+            self._entry(rec["url"], rec.get("priority", 0))
+        elif op == OP_CREDS:
+            self._creds_count += 1
+        elif op == OP_RESOLVED:
+            self._entry(rec["url"])
+        elif op == OP_FINISHED:
+            entry = self._entry(rec["url"])
+            entry.status = STATUS_DONE if rec.get("ok") else STATUS_FAILED
+            entry.stage = rec.get("stage")
+
+    def has_unfinished(self) -> bool:
+        """是否有尚未结束的条目（失败的条目已结束，不算在内）。"""
+        return any(entry.status == STATUS_PENDING for entry in self.entries.values())
+
+    def _same_source(self, source: Optional[str]) -> bool:
+        if not source or not self.source:
+            return False
+        return Path(source).resolve() == Path(self.source).resolve()
+
+    def start(self, source: Optional[str] = None, resume: bool = False, fresh: bool = False) -> "BatchJournal":
+        """
+        开始记录：续跑时在原日志后追加，否则清空重写。
+        已有日志记录的是同一批量文件且还有未结束的条目时，除非 resume 或 fresh（明确放弃原日志），
+        拒绝覆盖并抛出 FileExistsError；来源不同的批量直接开始新日志。
+        """
+        if not resume:
+            if not fresh:
+                if not self._loaded:
+                    self.load()
+                if self._same_source(source) and self.has_unfinished():
+                    raise FileExistsError(
+                        f"检查点日志 {self.path} 中 {source} 还有 {self.stats()[STATUS_PENDING]} 个未完成的任务，"
+                        f"用 --resume 续跑或 --fresh 重新开始"
+                    )
+            self.entries.clear()
+            self._creds_count = 0
+            self._creds_by_id.clear()
+            self._creds_by_content.clear()
+            self.source = None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a" if resume else "w", encoding="utf-8")
+        if source and source != self.source:
+            self.source = source
+            self._write({"op": OP_START, "source": source})
+        return self
+
+    def close(self) -> None:
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def sync(self) -> None:
+        """把已写入的记录 fsync 到磁盘。"""
+        if self._file is not None and self._unsynced:
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+
+    def _write(self, rec: dict) -> None:
+        if self._file is None:
+            return
+        rec["ts"] = round(time.time(), 3)
+        self._file.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self._unsynced += 1
+        if self._unsynced >= JOURNAL_SYNC_EVERY or time.monotonic() - self._synced_at >= JOURNAL_SYNC_INTERVAL:
+            self.sync()
+
+    def page(self, url: str, priority: int = 0) -> None:
+        """记录读入的页面 URL（已记录过的视频不重复写入）。"""
+        if url in self:
+            return
+        self._entry(url, priority)
+        self._write({"op": OP_PAGE, "url": url, "priority": priority})
+
+    def _remember_creds(self, credentials: SessionCredentials, ref: int, content: Optional[str] = None) -> None:
+        self._creds_by_id[id(credentials)] = (credentials, ref)
+        content = content or json.dumps(asdict(credentials), sort_keys=True)
+        self._creds_by_content.setdefault(content, ref)
+
+    def _creds_ref(self, credentials: Optional[SessionCredentials]) -> Optional[int]:
+        if credentials is None:
+            return None
+        known = self._creds_by_id.get(id(credentials))
+        if known is not None:
+            return known[1]
+        data = asdict(credentials)
+        content = json.dumps(data, sort_keys=True)
+        ref = self._creds_by_content.get(content)
+        if ref is None:
+            ref = self._creds_count
+            self._creds_count += 1
+            self._write({"op": OP_CREDS, "credentials": data})
+        self._remember_creds(credentials, ref, content)
+        return ref
+
+    def resolved(self, target: VideoTarget, credentials: Optional[SessionCredentials]) -> None:
+        """记录解析（及直链选优）结果。"""
+        self._entry(target.url)
+        self._write({
+            "op": OP_RESOLVED,
+            "url": target.url,
+            "target": asdict(target),
+            "credentials": self._creds_ref(credentials),
+        })
+
+    def finish(self, url: str, ok: bool, stage: Optional[str] = None) -> None:
+        """记录任务结束：ok 为真表示已下载完成；失败时 stage 为 resolve / download / disk / move。"""
+        entry = self._entry(url)
+        entry.status = STATUS_DONE if ok else STATUS_FAILED
+        entry.stage = stage
+        self._write({"op": OP_FINISHED, "url": url, "ok": ok, "stage": stage})
+
+    def resume_items(
+        self, now: Optional[float] = None,
+    ) -> List[Tuple[Union[str, Tuple[VideoTarget, Optional[SessionCredentials]]], int]]:
+        """
+        续跑的输入：未完成（含失败）的条目按原顺序返回 (元素, 优先级)。
+        解析结果仍新鲜的为 (VideoTarget, 凭证)，可直接下载；其余为页面 URL，需重新解析。
+        解析结果从日志重新读取，只保留未完成条目各自最近一次的记录。
+        """
+        pending = {key for key, entry in self.entries.items() if entry.status != STATUS_DONE}
+        creds: List[dict] = []
+        resolved: Dict[str, dict] = {}
+        for rec in self._records():
+            op = rec["op"]
+            if op == OP_CREDS:
+                creds.append(rec.get("credentials"))
+            elif op == OP_RESOLVED and video_key(rec.get("url", "")) in pending:
+                resolved[video_key(rec["url"])] = rec
+        loaded: Dict[int, SessionCredentials] = {}
+        items = []
+        for key, entry in self.entries.items():
+            if key not in pending:
+                continue
+            rec = resolved.get(key)
+            target, credentials = None, None
+            if rec is not None:
+                try:
+                    target = target_from_dict(rec["target"])
+                    ref = rec.get("credentials")
+                    if ref is not None:
+                        if ref not in loaded:
+                            loaded[ref] = SessionCredentials(**creds[ref])
+                            self._remember_creds(loaded[ref], ref)
+                        credentials = loaded[ref]
+                except (KeyError, TypeError, IndexError):
+                    target = None
+            if target is not None and is_fresh(target, credentials, rec.get("ts", 0.0), now):
+                items.append(((target, credentials), entry.priority))
+            else:
+                items.append((entry.url, entry.priority))
+        return items
+
+    def stats(self) -> dict:
+        counts = {STATUS_PENDING: 0, STATUS_DONE: 0, STATUS_FAILED: 0}
+        for entry in self.entries.values():
+            counts[entry.status] += 1
+        return counts
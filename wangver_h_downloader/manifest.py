@@ -0,0 +1,147 @@
+"""
+解析清单：resolve 命令把解析结果（直链、标题、大小、镜像）连同下载所需的 Cookies/UA 写成清单，
+之后的 --manifest 下载无需浏览器。支持 JSON（完整信息，可读回）、CSV（可读回）与 aria2 输入文件（aria2c -i）。
+"""
+import csv
+import io
+import json
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from .browser_cf import SessionCredentials
+from .downloader import output_name
+from .file_manager import atomic_write_text
+from .parser import VideoTarget, target_from_dict
+
+MANIFEST_VERSION = 1
+
+_SUFFIX_FORMATS = {".json": "json", ".csv": "csv", ".txt": "aria2", ".aria2": "aria2"}
+
+_CSV_COLUMNS = ["url", "title", "direct_url", "size", "is_m3u8", "sources", "resolved_at", "user_agent", "cookie"]
+
+ManifestItem = Tuple[VideoTarget, Optional[SessionCredentials]]
+
+
+def format_for(path: Path, fmt: Optional[str] = None) -> str:
+    """清单格式：显式指定优先，否则按扩展名推断（默认 json）。"""
+    return fmt or _SUFFIX_FORMATS.get(Path(path).suffix.lower(), "json")
+
+
+def _cookies_from_header(header: str) -> list:
+    """Cookie 请求头还原为 Playwright 风格的 cookies 列表（仅 name/value）。"""
+    cookies = []
+    for part in header.split(";"):
+        name, sep, value = part.strip().partition("=")
+        if sep and name:
+            cookies.append({"name": name, "value": value})
+    return cookies
+
+
+def _render_json(items: Sequence[ManifestItem], resolved_at: float) -> str:
+    # 同一会话的凭证只保存一份，条目按下标引用（Cookies 列表可能很长）
+    creds_list: List[dict] = []
+    entries = []
+    for target, creds in items:
+        ref = None
+        if creds is not None:
+            d = asdict(creds)
+            if d not in creds_list:
+                creds_list.append(d)
+            ref = creds_list.index(d)
+        entries.append({"target": asdict(target), "credentials": ref, "resolved_at": resolved_at})
+    return json.dumps(
+        {"version": MANIFEST_VERSION, "created": resolved_at, "credentials": creds_list, "items": entries},
+        ensure_ascii=False,
+        indent=1,
+    )
+
+
+def _render_csv(items: Sequence[ManifestItem], resolved_at: float) -> str:
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=_CSV_COLUMNS)
+    writer.writeheader()
+    for target, creds in items:
+        writer.writerow({
+            "url": target.url,
+            "title": target.title,
+            "direct_url": target.direct_url,
+            "size": target.size or "",
+            "is_m3u8": int(target.is_m3u8),
+            "sources": " ".join(s for s in target.sources if s != target.direct_url),
+            "resolved_at": resolved_at,
+            "user_agent": creds.user_agent if creds else "",
+            "cookie": creds.cookie_header() if creds else "",
+        })
+    return buf.getvalue()
+
+
+def _render_aria2(items: Sequence[ManifestItem]) -> str:
+    """aria2 输入文件：一行镜像直链（制表符分隔），下接缩进的选项行。"""
+    lines = []
+    for target, creds in items:
+        uris = [target.direct_url, *(s for s in target.sources if s != target.direct_url)]
+        safe_title, ext = output_name(target.direct_url, target.title)
+        lines.append("\t".join(uris))
+        lines.append(f" out={safe_title}{ext}")
+        if creds is not None:
+            lines.append(f" header=User-Agent: {creds.user_agent}")
+            cookie = creds.cookie_header()
+            if cookie:
+                lines.append(f" header=Cookie: {cookie}")
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def write_manifest(path: Path, items: Iterable[ManifestItem], fmt: Optional[str] = None) -> Path:
+    """写出清单（临时文件 + 原子替换），返回路径。"""
+    path = Path(path)
+    fmt = format_for(path, fmt)
+    items = list(items)
+    resolved_at = round(time.time(), 3)
+    if fmt == "json":
+        text = _render_json(items, resolved_at)
+    elif fmt == "csv":
+        text = _render_csv(items, resolved_at)
+    elif fmt == "aria2":
+        text = _render_aria2(items)
+    else:
+        raise ValueError(f"未知的清单格式: {fmt}")
+    return atomic_write_text(path, text, newline="")
+
+
+def read_manifest(path: Path, fmt: Optional[str] = None) -> List[ManifestItem]:
+    """读取 JSON 或 CSV 清单；aria2 输入文件只供 aria2c 使用，读取时抛出 ValueError。"""
+    path = Path(path)
+    fmt = format_for(path, fmt)
+    if fmt == "json":
+        data = json.loads(path.read_text(encoding="utf-8"))
+        creds_list = [SessionCredentials(**c) for c in data.get("credentials", [])]
+        items = []
+        for entry in data.get("items", []):
+            ref = entry.get("credentials")
+            items.append((target_from_dict(entry["target"]), creds_list[ref] if ref is not None else None))
+        return items
+    if fmt == "csv":
+        items = []
+        with open(path, encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                direct_url = row["direct_url"]
+                mirrors = row.get("sources", "").split()
+                target = VideoTarget(
+                    url=row["url"],
+                    direct_url=direct_url,
+                    title=row["title"],
+                    is_m3u8=row.get("is_m3u8") in ("1", "True", "true"),
+                    size=int(row["size"]) if row.get("size") else 0,
+                    sources=[direct_url, *mirrors] if mirrors else [],
+                )
+                creds = None
+                if row.get("user_agent") or row.get("cookie"):
+                    creds = SessionCredentials(
+                        cookies=_cookies_from_header(row.get("cookie", "")),
+                        user_agent=row.get("user_agent", ""),
+                    )
+                items.append((target, creds))
+        return items
+    raise ValueError(f"{fmt} 格式的清单只能交给 aria2c -i 使用，不能读回")
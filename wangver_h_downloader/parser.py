@@ -2,12 +2,15 @@
 智能链接解析与目标提取：单链接解析、批量 URL 导入、列表页遍历。
 提取最高画质直链（mp4/m3u8）及视频标题。
 """
+import contextlib
 import html
+import importlib
 import re
+import sys
 from pathlib import Path
-from dataclasses import dataclass
-from typing import List, Optional
-from urllib.parse import urljoin, urlparse
+from dataclasses import dataclass, field, fields
+from typing import IO, ContextManager, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urljoin, urlparse, parse_qs, urlencode, urlunparse
 
 from .config import TARGET_BASE_URL
 
@@ -19,6 +22,17 @@ class VideoTarget:
     direct_url: str    # 直链（mp4 或 m3u8）
     title: str
     is_m3u8: bool = False
+    # 页面中出现的全部候选直链 -> 画质提示（如 1080，未知为 0），供探测选优
+    candidates: Dict[str, int] = field(default_factory=dict)
+    size: int = 0      # 直链文件大小（字节，探测得到，未知为 0）
+    # 与 direct_url 等价的镜像直链（不同 CDN 主机、探测大小一致，含 direct_url），用于多源分块下载
+    sources: List[str] = field(default_factory=list)
+
+
+def target_from_dict(d: dict) -> VideoTarget:
+    """由 asdict(VideoTarget) 写出的字典（清单、检查点日志）还原目标，忽略不认识的字段。"""
+    known = {f.name for f in fields(VideoTarget)}
+    return VideoTarget(**{k: v for k, v in d.items() if k in known})
 
 
 # 页面标题中常见的站点水印，保存文件名时去掉（支持全角/空格等变体）
@@ -68,6 +82,49 @@ def _is_single_video_page(url: str) -> bool:
     return "/watch" in path or re.match(r"^videos/[^/]+/?$", path)
 
 
+def video_id_from_url(url: str) -> Optional[str]:
+    """从视频页 URL 提取视频 ID（watch?v=xxx 或 /watch/xxx），用于去重；无法识别返回 None。"""
+    p = urlparse(url.strip())
+    v = parse_qs(p.query).get("v")
+    if v and v[0]:
+        return v[0]
+    m = re.search(r"/(?:watch|videos)/([a-zA-Z0-9_-]+)/?$", p.path or "")
+    return m.group(1) if m else None
+
+
+def video_key(url: str) -> str:
+    """去重键：视频 ID，无法识别时为 URL 本身。"""
+    return video_id_from_url(url) or url
+
+
+def quality_hint(url: str) -> int:
+    """从直链 URL 中猜测分辨率（1080/720/480/360），未知返回 0。"""
+    m = re.search(r"(?<!\d)(2160|1440|1080|720|480|360|240)p?(?!\d)", url)
+    return int(m.group(1)) if m else 0
+
+
+def collect_media_candidates(page_html: str, page_url: str) -> Dict[str, int]:
+    """
+    收集页面中全部 mp4/m3u8 直链及其画质提示（按出现顺序，mp4 在前）。
+    优先采用 <source src=... size="1080"> 的 size 属性，否则从 URL 中猜测。
+    """
+    hints: Dict[str, int] = {}
+    for m in re.finditer(r"<source\b[^>]*>", page_html, re.I):
+        tag = m.group(0)
+        src = re.search(r'src\s*=\s*["\']([^"\']+)["\']', tag, re.I)
+        size = re.search(r'size\s*=\s*["\']?(\d{3,4})', tag, re.I)
+        if src and size:
+            hints[html.unescape(urljoin(page_url, src.group(1)))] = int(size.group(1))
+
+    out: Dict[str, int] = {}
+    for ext in ("mp4", "m3u8"):
+        for u in re.findall(r'["\']?(https?://[^"\'>\s]+\.%s[^"\'>\s]*)["\']?' % ext, page_html, re.I):
+            u = html.unescape(u)
+            if u not in out:
+                out[u] = hints.get(u) or quality_hint(u)
+    return out
+
+
 def parse_single_page_html(
     page_html: str,
     page_url: str,
@@ -128,21 +185,81 @@ def parse_single_page_html(
     # 直链可能含 HTML 实体（如 &amp;），请求前必须解码，否则 403
     direct_url = html.unescape(direct_url)
 
-    return VideoTarget(url=page_url, direct_url=direct_url, title=title, is_m3u8=is_m3u8)
+    return VideoTarget(
+        url=page_url,
+        direct_url=direct_url,
+        title=title,
+        is_m3u8=is_m3u8,
+        candidates=collect_media_candidates(page_html, page_url),
+    )
+
+
+def _split_batch_line(line: str) -> tuple[str, int]:
+    """批量文件行格式：URL [优先级]，优先级为可选整数（默认 0，数值越大越先下载）。"""
+    parts = line.split()
+    if len(parts) >= 2:
+        try:
+            return parts[0], int(parts[1])
+        except ValueError:
+            pass
+    return parts[0] if parts else "", 0
 
 
 def collect_urls_from_batch_file(file_path: Path) -> List[str]:
-    """从本地 .txt 文件读取批量 URL，每行一个。"""
-    urls = []
-    path = Path(file_path)
-    if not path.exists() or not path.suffix.lower() == ".txt":
-        return urls
-    text = path.read_text(encoding="utf-8", errors="ignore")
-    for line in text.splitlines():
-        line = line.strip()
-        if line and (line.startswith("http://") or line.startswith("https://")):
-            urls.append(line)
-    return urls
+    """从批量文件读取 URL 列表，每行一个（行尾可附优先级，见 _split_batch_line），按视频 ID 去重。"""
+    return [url for url, _ in iter_batch_urls(file_path)]
+
+
+# 压缩格式的文件头（按内容识别，不依赖扩展名）
+_COMPRESSED_MAGIC = (
+    (b"\x1f\x8b", "gzip"),
+    (b"BZh", "bz2"),
+    (b"\xfd7zXZ\x00", "lzma"),
+)
+
+
+def _open_batch_source(source) -> ContextManager[IO[str]]:
+    """打开批量输入："-" 为标准输入；gzip/bz2/xz 压缩文件按文件头识别后透明解压。"""
+    if str(source) == "-":
+        return contextlib.nullcontext(sys.stdin)
+    path = Path(source)
+    with open(path, "rb") as f:
+        head = f.read(6)
+    for magic, module in _COMPRESSED_MAGIC:
+        if head.startswith(magic):
+            # 压缩模块按需导入，不拖慢普通启动
+            return importlib.import_module(module).open(path, "rt", encoding="utf-8", errors="ignore")
+    return open(path, encoding="utf-8", errors="ignore")
+
+
+def normalize_video_url(url: str) -> str:
+    """统一 URL 写法：去掉 #片段，视频页 watch?v=xxx 只保留 v 参数（去掉跟踪参数等）。"""
+    p = urlparse(url.strip())
+    v = parse_qs(p.query).get("v")
+    query = urlencode({"v": v[0]}) if v and v[0] else p.query
+    return urlunparse((p.scheme, p.netloc.lower(), p.path, p.params, query, ""))
+
+
+def iter_batch_urls(source) -> Iterator[Tuple[str, int]]:
+    """
+    流式读取批量 URL，逐行产出 (URL, 优先级)：文件任意扩展名，可为压缩文件或 "-"（标准输入）。
+    URL 先规范化，再按视频 ID（无法识别时按 URL）即时去重；只保留去重键，不会把整个文件读入内存。
+    文件不存在时不产出任何内容。
+    """
+    if str(source) != "-" and not Path(source).is_file():
+        return
+    seen = set()
+    with _open_batch_source(source) as f:
+        for line in f:
+            url, priority = _split_batch_line(line.strip())
+            if not (url.startswith("http://") or url.startswith("https://")):
+                continue
+            url = normalize_video_url(url)
+            key = video_key(url)
+            if key in seen:
+                continue
+            seen.add(key)
+            yield url, priority
 
 
 def _find_matching_closing_div(html: str, id_pos: int) -> int:
@@ -266,3 +383,36 @@ def extract_list_page_video_links(list_page_html: str, list_page_url: str) -> Li
         u = list_page_url if list_page_url.startswith("http") else urljoin(list_page_url, list_page_url)
         return [u]
     return _extract_links_dense_cluster(list_page_html, list_page_url)
+
+
+def _page_number(url: str) -> int:
+    """URL 中的 page 参数，缺省为第 1 页。"""
+    v = parse_qs(urlparse(url).query).get("page")
+    try:
+        return int(v[0]) if v else 1
+    except ValueError:
+        return 1
+
+
+def _with_page(url: str, page: int) -> str:
+    """返回把 page 参数替换为指定页码后的 URL，保留其余查询参数。"""
+    p = urlparse(url)
+    query = parse_qs(p.query, keep_blank_values=True)
+    query["page"] = [str(page)]
+    return urlunparse(p._replace(query=urlencode(query, doseq=True)))
+
+
+def extract_pagination_urls(list_page_html: str, list_page_url: str) -> List[str]:
+    """
+    从搜索/列表页 HTML 中提取同一列表的分页链接（?page=N），按页码升序返回，不含当前页。
+    分页条通常只显示部分页码，这里取出现过的最大页码并补全中间各页。
+    """
+    base_path = urlparse(list_page_url).path or "/"
+    current = _page_number(list_page_url)
+    max_page = current
+    for m in re.finditer(r'href\s*=\s*["\']([^"\']*[?&](?:amp;)?page=\d+[^"\']*)["\']', list_page_html, re.I):
+        link = urljoin(list_page_url, html.unescape(m.group(1)))
+        if (urlparse(link).path or "/") != base_path:
+            continue
+        max_page = max(max_page, _page_number(link))
+    return [_with_page(list_page_url, n) for n in range(1, max_page + 1) if n != current]
@@ -0,0 +1,168 @@
+"""
+下载完成后的后处理流水线：faststart 重封装、HLS 合并、缩略图、元数据旁车文件。
+各步骤在进程池中执行（默认按 CPU 核数），与 asyncio 下载循环解耦，CPU 密集的处理不会拖慢下载。
+依赖 ffmpeg 的步骤在未安装 ffmpeg 时跳过并给出说明。
+"""
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from .config import POSTPROCESS_STEPS, DEFAULT_POSTPROCESS_WORKERS, FFMPEG_BIN
+
+
+@dataclass
+class PostProcessResult:
+    """单个文件的后处理结果：最终文件路径与每一步的 (步骤名, 是否成功, 说明)。"""
+    path: Path
+    steps: List[Tuple[str, bool, str]] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return all(ok for _, ok, _ in self.steps)
+
+
+class _Skip(Exception):
+    """步骤不适用于该文件（如非 mp4 不做 faststart）。"""
+
+
+def _ffmpeg(args: List[str]) -> None:
+    if shutil.which(FFMPEG_BIN) is None:
+        raise _Skip("未安装 ffmpeg")
+    r = subprocess.run(
+        [FFMPEG_BIN, "-hide_banner", "-loglevel", "error", "-y", *args],
+        capture_output=True, text=True,
+    )
+    if r.returncode != 0:
+        lines = (r.stderr or "").strip().splitlines()
+        raise RuntimeError(lines[-1] if lines else f"ffmpeg 退出码 {r.returncode}")
+
+
+def step_hls(path: Path, meta: dict) -> Path:
+    """m3u8：按原始直链（分片为相对地址）与请求头用 ffmpeg 合并为 mp4，成功后删除播放列表文件。"""
+    if path.suffix.lower() != ".m3u8":
+        raise _Skip("非 m3u8")
+    out = path.with_suffix(".mp4")
+    header_args = []
+    headers = meta.get("headers") or {}
+    if headers:
+        header_args = ["-headers", "".join(f"{k}: {v}\r\n" for k, v in headers.items())]
+    _ffmpeg([*header_args, "-i", meta.get("direct_url") or str(path), "-c", "copy", "-bsf:a", "aac_adtstoasc", str(out)])
+    path.unlink(missing_ok=True)
+    return out
+
+
+def step_faststart(path: Path, meta: dict) -> Path:
+    """把 moov 移到文件头（-movflags +faststart），便于播放器/网盘边下边播；原地替换。"""
+    if path.suffix.lower() != ".mp4":
+        raise _Skip("非 mp4")
+    tmp = path.with_name(path.stem + ".faststart.tmp.mp4")
+    try:
+        _ffmpeg(["-i", str(path), "-map", "0", "-c", "copy", "-movflags", "+faststart", str(tmp)])
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return path
+
+
+def step_thumbnail(path: Path, meta: dict) -> Path:
+    """截取一帧生成同名 .jpg 缩略图（视频过短时取首帧）。"""
+    if path.suffix.lower() != ".mp4":
+        raise _Skip("非 mp4")
+    thumb = path.with_suffix(".jpg")
+    try:
+        _ffmpeg(["-ss", "10", "-i", str(path), "-frames:v", "1", "-vf", "scale=640:-2", str(thumb)])
+    except RuntimeError:
+        pass
+    if not thumb.exists():
+        _ffmpeg(["-i", str(path), "-frames:v", "1", "-vf", "scale=640:-2", str(thumb)])
+    return path
+
+
+def step_metadata(path: Path, meta: dict) -> Path:
+    """写同名 .info.json 旁车文件（标题、来源、大小、完成时间），不含 Cookies。"""
+    info = {
+        "title": meta.get("title"),
+        "source_url": meta.get("source_url"),
+        "direct_url": meta.get("direct_url"),
+        "file": path.name,
+        "size": path.stat().st_size if path.exists() else 0,
+        "downloaded_at": int(time.time()),
+    }
+    path.with_suffix(".info.json").write_text(json.dumps(info, ensure_ascii=False, indent=1), encoding="utf-8")
+    return path
+
+
+STEP_FUNCS: Dict[str, Callable[[Path, dict], Path]] = {
+    "hls": step_hls,
+    "faststart": step_faststart,
+    "thumbnail": step_thumbnail,
+    "metadata": step_metadata,
+}
+
+
+def run_steps(path: str, steps: Sequence[str], meta: dict) -> PostProcessResult:
+    """在子进程中按 POSTPROCESS_STEPS 的顺序执行所选步骤；某步失败不影响后续步骤。"""
+    result = PostProcessResult(path=Path(path))
+    for name in [s for s in POSTPROCESS_STEPS if s in steps]:
+        try:
+            result.path = STEP_FUNCS[name](result.path, meta)
+            result.steps.append((name, True, ""))
+        except _Skip as e:
+            result.steps.append((name, True, f"跳过：{e}"))
+        except Exception as e:
+            result.steps.append((name, False, str(e) or type(e).__name__))
+    return result
+
+
+def parse_steps(spec: str) -> Tuple[str, ...]:
+    """解析 --post 参数（逗号分隔），校验步骤名。"""
+    steps = tuple(s.strip() for s in (spec or "").split(",") if s.strip())
+    unknown = [s for s in steps if s not in STEP_FUNCS]
+    if unknown:
+        raise ValueError(f"未知后处理步骤: {', '.join(unknown)}（可选 {','.join(POSTPROCESS_STEPS)}）")
+    return steps
+
+
+class PostProcessor:
+    """
+    后处理阶段：submit() 把已完成文件交给进程池并立即返回，下载协程不等待；
+    批量结束时 await drain() 等待全部处理完成并关闭进程池。
+    """
+
+    def __init__(
+        self,
+        steps: Sequence[str],
+        workers: Optional[int] = None,
+        on_done: Optional[Callable[[PostProcessResult], None]] = None,
+    ):
+        self.steps = tuple(steps)
+        self.on_done = on_done
+        self._pool = ProcessPoolExecutor(max_workers=max(1, workers or DEFAULT_POSTPROCESS_WORKERS))
+        self._pending: set = set()
+
+    def submit(self, path: Path, meta: dict) -> "asyncio.Future[PostProcessResult]":
+        loop = asyncio.get_running_loop()
+        fut = loop.run_in_executor(self._pool, run_steps, str(path), self.steps, meta)
+        self._pending.add(fut)
+
+        def _done(f: asyncio.Future) -> None:
+            self._pending.discard(f)
+            if self.on_done and not f.cancelled() and f.exception() is None:
+                self.on_done(f.result())
+
+        fut.add_done_callback(_done)
+        return fut
+
+    async def drain(self) -> None:
+        try:
+            if self._pending:
+                await asyncio.gather(*self._pending, return_exceptions=True)
+        finally:
+            self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,219 @@
+"""
+候选直链探测选优：并发对页面中全部 mp4/m3u8 候选发起 Range 请求，
+取得真实大小与类型，在 --quality 偏好范围内按实际大小（码率）选出最佳直链，并按视频 ID 缓存选择结果。
+"""
+import asyncio
+import json
+import time
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+from .config import (
+    PROBE_CONCURRENCY,
+    PROBE_TIMEOUT,
+    PROBE_MIN_VIDEO_BYTES,
+    DEFAULT_PROBE_CACHE_FILE,
+    PROBE_CACHE_MAX_ENTRIES,
+    PROBE_CACHE_TTL,
+)
+from .browser_cf import SessionCredentials
+from .connections import get_client_pool
+from .downloader import _parse_total_size
+from .file_manager import atomic_write_text
+from .parser import VideoTarget, video_id_from_url
+
+
+@dataclass
+class ProbeResult:
+    """单个候选直链的探测结果。"""
+    url: str
+    quality: int            # 画质提示，未知为 0
+    ok: bool = False
+    size: int = 0           # 字节，未知为 0
+    content_type: str = ""
+    error: str = ""
+
+    @property
+    def is_m3u8(self) -> bool:
+        return ".m3u8" in self.url.lower() or "mpegurl" in self.content_type
+
+
+async def probe_url(
+    client: httpx.AsyncClient, url: str, quality: int, headers: dict, timeout: Optional[float] = None,
+) -> ProbeResult:
+    """只请求首字节（Range: bytes=0-0），得到大小与类型；不读取完整正文。"""
+    res = ProbeResult(url=url, quality=quality)
+    try:
+        async with client.stream(
+            "GET", url, headers={**headers, "Range": "bytes=0-0"},
+            timeout=httpx.USE_CLIENT_DEFAULT if timeout is None else timeout,
+        ) as r:
+            r.raise_for_status()
+            res.size = _parse_total_size(r)
+            res.content_type = (r.headers.get("content-type") or "").split(";")[0].strip().lower()
+            res.ok = not res.content_type.startswith("text/html")
+            if r.status_code == 206:
+                # 读完这 1 字节，连接留在池中供随后的下载复用
+                await r.aread()
+    except Exception as e:
+        res.error = str(e) or type(e).__name__
+    return res
+
+
+async def probe_candidates(
+    candidates: Dict[str, int],
+    credentials: Optional[SessionCredentials],
+    concurrency: int = PROBE_CONCURRENCY,
+    timeout: float = PROBE_TIMEOUT,
+) -> List[ProbeResult]:
+    """并发探测全部候选直链。"""
+    headers = credentials.headers() if credentials else {}
+    sem = asyncio.Semaphore(max(1, concurrency))
+    clients = get_client_pool()
+
+    async def one(url: str, quality: int) -> ProbeResult:
+        async with sem:
+            return await probe_url(clients.get(url), url, quality, headers, timeout)
+
+    return await asyncio.gather(*[one(u, q) for u, q in candidates.items()])
+
+
+def equivalent_sources(results: List[ProbeResult], best: ProbeResult) -> List[str]:
+    """与选中直链大小完全一致的其它候选视为同一文件的镜像（不同 CDN 主机），best 排在首位。"""
+    if not best.size or best.is_m3u8:
+        return [best.url]
+    return [best.url] + [
+        r.url for r in results
+        if r.ok and r.url != best.url and r.size == best.size and not r.is_m3u8
+    ]
+
+
+def choose_best(results: List[ProbeResult], preferred_quality: str) -> Optional[ProbeResult]:
+    """
+    选优规则：排除失败与过小的预览片段；优先在不高于偏好画质的候选中选择，
+    没有时依次退到画质未知的 mp4、高于偏好的最低画质；mp4 优先，其次按实际大小、画质提示。
+    """
+    valid = [r for r in results if r.ok]
+    if not valid:
+        return None
+    full = [r for r in valid if r.is_m3u8 or not r.size or r.size >= PROBE_MIN_VIDEO_BYTES] or valid
+    try:
+        pref = int(preferred_quality.lower().rstrip("p"))
+    except ValueError:
+        pref = 0
+    within = [r for r in full if r.quality and (not pref or r.quality <= pref)]
+    above = [r for r in full if r.quality and r not in within]
+    unknown_mp4 = [r for r in full if not r.quality and not r.is_m3u8]
+    lowest_above = [r for r in above if r.quality == min(x.quality for x in above)]
+    pool = within or unknown_mp4 or lowest_above or full
+    return max(pool, key=lambda r: (not r.is_m3u8, r.size, r.quality))
+
+
+class ProbeCache:
+    """
+    按视频 ID（+ 画质偏好）缓存选中的直链、画质与大小；直链仍在当前候选中时直接复用，无需再次探测。
+    加载时丢弃超过 ttl 秒的记录，最多保留 max_entries 条（超出时淘汰最旧的）。
+    put() 只更新内存，由 flush() 统一写回文件（每个批次结束时一次）。
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        ttl: float = PROBE_CACHE_TTL,
+        max_entries: int = PROBE_CACHE_MAX_ENTRIES,
+    ):
+        self.path = Path(path or DEFAULT_PROBE_CACHE_FILE)
+        self.max_entries = max(1, max_entries)
+        loaded: dict = {}
+        if self.path.exists():
+            try:
+                loaded = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                loaded = {}
+        cutoff = time.time() - ttl
+        fresh = [(k, v) for k, v in loaded.items() if isinstance(v, dict) and v.get("updated", 0) >= cutoff]
+        # 按更新时间排列，最旧的在前，便于淘汰
+        self._data: dict = dict(sorted(fresh, key=lambda kv: kv[1].get("updated", 0)))
+        self._dirty = self._evict() or len(fresh) != len(loaded)
+
+    def get(self, video_id: str) -> Optional[dict]:
+        return self._data.get(video_id)
+
+    def _evict(self) -> bool:
+        """超出条数上限时淘汰最旧的记录，返回是否有淘汰。"""
+        excess = len(self._data) - self.max_entries
+        for key in list(self._data)[:max(0, excess)]:
+            del self._data[key]
+        return excess > 0
+
+    def put(self, video_id: str, result: ProbeResult, sources: Optional[List[str]] = None) -> None:
+        # 重新插入到末尾，保持最旧的在前
+        self._data.pop(video_id, None)
+        self._data[video_id] = {
+            "url": result.url,
+            "quality": result.quality,
+            "size": result.size,
+            "sources": sources or [result.url],
+            "updated": int(time.time()),
+        }
+        self._evict()
+        self._dirty = True
+
+    def flush(self) -> None:
+        """把变化（新记录、过期与淘汰）写回文件。"""
+        if not self._dirty:
+            return
+        atomic_write_text(self.path, json.dumps(self._data, ensure_ascii=False, indent=1))
+        self._dirty = False
+
+
+_default_cache: Optional[ProbeCache] = None
+
+
+def get_default_cache() -> ProbeCache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ProbeCache()
+    return _default_cache
+
+
+async def select_best_source(
+    target: VideoTarget,
+    credentials: Optional[SessionCredentials],
+    preferred_quality: str,
+    cache: Optional[ProbeCache] = None,
+) -> VideoTarget:
+    """
+    探测 target 的全部候选直链，返回 direct_url 替换为最佳候选（并带上大小与等价镜像列表）的新 target。
+    只有一个候选时同样探测以取得大小；探测全部失败时保留原直链。
+    """
+    if not target.candidates:
+        return target
+    # 缓存键包含画质偏好：同一视频在不同 --quality 下选择不同
+    key = f"{video_id_from_url(target.url) or target.url}@{preferred_quality}"
+    if cache is not None:
+        hit = cache.get(key)
+        if hit and hit.get("url") in target.candidates:
+            sources = [u for u in hit.get("sources", []) if u in target.candidates] or [hit["url"]]
+            return replace(target, direct_url=hit["url"], size=hit.get("size", 0), sources=sources,
+                           is_m3u8=".m3u8" in hit["url"].lower())
+
+    results = await probe_candidates(target.candidates, credentials)
+    best = choose_best(results, preferred_quality)
+    if best is None:
+        return target
+    sources = equivalent_sources(results, best)
+    if cache is not None:
+        cache.put(key, best, sources)
+    return replace(target, direct_url=best.url, size=best.size, is_m3u8=best.is_m3u8, sources=sources)
+
+
+async def probe_size(target: VideoTarget, credentials: Optional[SessionCredentials]) -> VideoTarget:
+    """只探测 direct_url 的大小（未开启选优或选优未得到大小时，供调度器预估磁盘占用）。"""
+    if target.size or target.is_m3u8:
+        return target
+    (res,) = await probe_candidates({target.direct_url: 0}, credentials)
+    return replace(target, size=res.size) if res.ok and res.size else target
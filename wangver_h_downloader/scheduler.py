@@ -0,0 +1,155 @@
+"""
+按文件大小调度下载任务，并在启动前预留磁盘空间：
+任务按策略（fifo / sjf / priority）排序，剩余空间不足以容纳某任务时暂缓启动，
+直到运行中的任务写完释放预留；即使所有任务结束仍放不下的任务直接判定失败，避免写到一半磁盘满。
+"""
+import asyncio
+import itertools
+import os
+import shutil
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, List, Optional
+
+from .config import DEFAULT_SCHEDULE_POLICY, DEFAULT_MIN_FREE_BYTES, SCHEDULE_POLICIES
+
+DISK_RECHECK_INTERVAL = 5.0
+
+
+def allocated_bytes(path: Path) -> int:
+    """文件实际占用的磁盘空间（有 st_blocks 时按块计，稀疏文件不计空洞；否则为文件长度），不存在时为 0。"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return 0
+    blocks = getattr(st, "st_blocks", None)
+    return blocks * 512 if blocks is not None else st.st_size
+
+
+@dataclass
+class ScheduledTask:
+    """
+    调度中的任务：remaining 为仍需写入的字节数（下载过程中递减）。
+    path 为写入的 .part 文件（可选）：下载引擎预分配后磁盘剩余空间已经扣除了这部分，
+    预留量相应减去提交以来该文件新占用的空间（base 为提交时已占用的字节数），避免重复计算。
+    """
+    item: Any
+    size: int
+    priority: int
+    seq: int
+    remaining: int = 0
+    path: Optional[Path] = None
+    base: int = 0
+    rejected: Optional[str] = None  # 非空表示因磁盘空间不足被拒绝，调用方应记为失败
+
+    def reserved(self) -> int:
+        """当前仍需预留的字节数。"""
+        if self.path is None:
+            return self.remaining
+        grown = allocated_bytes(self.path) - self.base
+        return max(0, min(self.remaining, self.size - grown))
+
+
+class DownloadScheduler:
+    """
+    下载协程通过 get() 取得下一个可启动的任务，完成后调用 done()。
+    - put(item, size, priority, path): 提交任务，size 为需要写入的字节数（未知为 0，只检查最低剩余空间），
+      path 为将要写入的 .part 文件（可选，用于扣除已预分配的空间）。
+    - close(): 不再提交新任务；队列取空后 get() 返回 None。
+    - wait_backlog(limit): 提交方限速，排队任务过多时等待。
+    """
+
+    def __init__(
+        self,
+        output_dir: Path,
+        policy: str = DEFAULT_SCHEDULE_POLICY,
+        min_free_bytes: int = DEFAULT_MIN_FREE_BYTES,
+    ):
+        if policy not in SCHEDULE_POLICIES:
+            raise ValueError(f"未知调度策略: {policy}（可选 {'/'.join(SCHEDULE_POLICIES)}）")
+        self.output_dir = Path(output_dir)
+        self.policy = policy
+        self.min_free_bytes = min_free_bytes
+        self._pending: List[ScheduledTask] = []
+        self._running: List[ScheduledTask] = []
+        self._seq = itertools.count()
+        self._closed = False
+        self._changed = asyncio.Condition()
+
+    def _order_key(self, t: ScheduledTask) -> tuple:
+        if self.policy == "sjf":
+            # 大小未知的排在已知的后面
+            return (t.size <= 0, t.size, t.seq)
+        if self.policy == "priority":
+            return (-t.priority, t.seq)
+        return (t.seq,)
+
+    def free_bytes(self) -> int:
+        """当前可用于新任务的空间：磁盘剩余 - 运行中任务尚未写入的预留 - 最低保留。"""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        free = shutil.disk_usage(self.output_dir).free
+        return free - sum(t.reserved() for t in self._running) - self.min_free_bytes
+
+    def _fits(self, t: ScheduledTask, available: int) -> bool:
+        return available >= max(t.size, 0)
+
+    async def _notify(self) -> None:
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def put(self, item: Any, size: int = 0, priority: int = 0, path: Optional[Path] = None) -> None:
+        base = allocated_bytes(path) if path is not None else 0
+        self._pending.append(ScheduledTask(item, size, priority, next(self._seq), remaining=max(size, 0), path=path, base=base))
+        await self._notify()
+
+    async def close(self) -> None:
+        self._closed = True
+        await self._notify()
+
+    async def get(self) -> Optional[ScheduledTask]:
+        async with self._changed:
+            while True:
+                if self._pending:
+                    available = self.free_bytes()
+                    ordered = sorted(self._pending, key=self._order_key)
+                    for t in ordered:
+                        if self._fits(t, available):
+                            self._pending.remove(t)
+                            self._running.append(t)
+                            # 唤醒 wait_backlog：排队任务减少，解析侧可以继续
+                            self._changed.notify_all()
+                            return t
+                    if not self._running:
+                        # 没有任务在写入，空间不会再被释放：队首任务无法完成
+                        t = ordered[0]
+                        self._pending.remove(t)
+                        t.rejected = f"磁盘空间不足：需要 {t.size} 字节，可用 {max(available, 0)} 字节"
+                        return t
+                elif self._closed:
+                    return None
+                try:
+                    # 定期重查：共享卷上其它进程释放的空间也能被发现
+                    await asyncio.wait_for(self._changed.wait(), timeout=DISK_RECHECK_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def wait_backlog(self, limit: int, in_flight: Callable[[], int] = lambda: 0) -> None:
+        """
+        等待排队任务数（加上调用方尚未提交的 in_flight() 个）低于 limit：
+        解析侧据此限速，超大批量时只在内存中保留有限个已解析目标。
+        """
+        async with self._changed:
+            while len(self._pending) + in_flight() >= limit:
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout=DISK_RECHECK_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+
+    def progress(self, task: ScheduledTask, nbytes: int) -> None:
+        """下载写入 nbytes 后减少该任务的预留。"""
+        task.remaining = max(0, task.remaining - nbytes)
+
+    async def done(self, task: ScheduledTask) -> None:
+        if task in self._running:
+            self._running.remove(task)
+        await self._notify()
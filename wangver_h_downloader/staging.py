@@ -0,0 +1,81 @@
+"""
+本地暂存与后台搬运：输出目录在慢速网络存储上时，分块按随机偏移写入既慢又易产生碎片。
+启用暂存目录（--scratch-dir）后 .part 写在本地磁盘，下载完成并校验大小后交给后台搬运器：
+以大块顺序读写复制到输出目录中的临时文件，落盘后原子重命名为最终文件名，再删除暂存文件；
+暂存目录与输出目录在同一文件系统时直接重命名。网络存储上只有顺序写入。
+"""
+import asyncio
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .config import DEFAULT_MOVE_WORKERS, MOVE_BUFFER_BYTES, MOVE_MAX_PENDING
+
+# 复制中的临时文件后缀（位于输出目录，完成后原子替换为最终文件）
+MOVING_SUFFIX = ".moving"
+
+
+def move_file(src: Path, dest: Path, buffer_size: int = MOVE_BUFFER_BYTES) -> Path:
+    """
+    把 src 移到 dest（已存在则覆盖），返回 dest。同一文件系统时直接重命名；
+    否则顺序复制到 dest.moving、fsync 后原子替换，校验大小一致后删除 src。
+    """
+    src, dest = Path(src), Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    if src.stat().st_dev == dest.parent.stat().st_dev:
+        os.replace(src, dest)
+        return dest
+    size = src.stat().st_size
+    tmp = dest.with_name(dest.name + MOVING_SUFFIX)
+    try:
+        # 带缓冲的文件对象保证每次写入都完整写出（无缓冲的 write() 可能只写入一部分）
+        with open(src, "rb") as fin, open(tmp, "wb") as fout:
+            shutil.copyfileobj(fin, fout, buffer_size)
+            fout.flush()
+            os.fsync(fout.fileno())
+        copied = tmp.stat().st_size
+        if copied != size:
+            raise OSError(f"复制后大小不符: {src} {size} -> {copied}")
+        os.replace(tmp, dest)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    src.unlink()
+    return dest
+
+
+class Mover:
+    """
+    后台搬运器：submit() 把暂存目录中已完成的文件交给线程池（默认 1 个，网络存储上保持顺序写入）并返回 Future。
+    排队等待搬运的文件超过 max_pending 时 submit 等待，下载随之暂停，暂存磁盘不会被占满。
+    结束时 await drain() 等待全部搬运完成。
+    """
+
+    def __init__(self, workers: int = DEFAULT_MOVE_WORKERS, max_pending: int = MOVE_MAX_PENDING):
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="mover")
+        self._slots = asyncio.Semaphore(max(1, max_pending))
+        self._pending: set = set()
+
+    async def submit(self, src: Path, dest: Path) -> "asyncio.Future[Path]":
+        await self._slots.acquire()
+        fut = asyncio.get_running_loop().run_in_executor(self._pool, move_file, src, dest)
+        self._pending.add(fut)
+
+        def _done(f: asyncio.Future) -> None:
+            self._pending.discard(f)
+            self._slots.release()
+
+        fut.add_done_callback(_done)
+        return fut
+
+    async def move(self, src: Path, dest: Path) -> Path:
+        """提交并等待搬运完成。"""
+        return await (await self.submit(src, dest))
+
+    async def drain(self) -> None:
+        try:
+            if self._pending:
+                await asyncio.gather(*self._pending, return_exceptions=True)
+        finally:
+            self._pool.shutdown(wait=False)
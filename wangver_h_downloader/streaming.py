@@ -0,0 +1,225 @@
+"""
+边下边播（--stream）：分块调度优先下载播放位置附近的区间，本机 HTTP 服务把下载中的 .part 以 Range 方式提供给播放器
+（mpv / VLC / 浏览器）。播放器请求尚未下载的区间时，该区间被提到下载队列最前，数据到达后立即返回，
+首帧无需等待整个文件下载完成。只支持单个 mp4 直链与 httpx 引擎。
+"""
+import asyncio
+import re
+import sys
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence, Tuple
+from urllib.parse import quote
+
+from .config import STREAM_READ_BYTES
+
+_RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+def _read_at(path: Path, offset: int, n: int) -> bytes:
+    """从 path 的 offset 处读取至多 n 字节（在线程池中执行；每次重新打开，文件被重命名后按新路径读取）。"""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read(n)
+
+
+class StreamState:
+    """
+    下载与播放服务之间共享的状态：文件路径、总大小、已完成区间、当前播放位置（最近一次读取的偏移）。
+    下载引擎在首块完成后 start()，每完成一个分块 update()，完成后 finish()，失败时 fail()；
+    播放服务用 wait_readable() 等待区间就绪，并以此告知引擎当前播放位置。
+    """
+
+    def __init__(self):
+        self.path: Optional[Path] = None
+        self.total = 0
+        self.done: List[Tuple[int, int]] = []
+        self.position = 0
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+
+    def _notify(self) -> None:
+        # 唤醒当前所有等待者，之后的等待使用新的事件
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def start(self, path: Path, total: int, done: Sequence[Tuple[int, int]]) -> None:
+        self.path, self.total, self.done = path, total, list(done)
+        self._notify()
+
+    def update(self, done: Sequence[Tuple[int, int]]) -> None:
+        self.done = list(done)
+        self._notify()
+
+    def finish(self, path: Path) -> None:
+        """下载完成（或文件被重命名、移动）：此后从 path 读取。"""
+        self.path = path
+        self.total = self.total or path.stat().st_size
+        self.done = [(0, self.total - 1)] if self.total else []
+        self.finished = True
+        self._notify()
+
+    def fail(self, error: BaseException) -> None:
+        self.error = error
+        self._notify()
+
+    def readable_end(self, offset: int) -> int:
+        """从 offset 起连续已下载到的最后一个字节；offset 处尚未下载时返回 -1。"""
+        for a, b in self.done:
+            if a <= offset <= b:
+                return b
+        return -1
+
+    async def ready(self) -> None:
+        """等待得知文件总大小（首块完成）。"""
+        while not self.total and not self.finished:
+            if self.error is not None:
+                raise self.error
+            await self._changed.wait()
+
+    async def changed(self) -> None:
+        """等待下一次状态变化（如 finish() 更新文件路径）；下载已失败时抛出其异常。"""
+        if self.error is not None:
+            raise self.error
+        await self._changed.wait()
+
+    async def wait_readable(self, offset: int) -> int:
+        """把播放位置设为 offset 并等待该处数据就绪，返回连续可读的最后一个字节偏移。"""
+        self.position = offset
+        while True:
+            end = self.readable_end(offset)
+            if end >= 0:
+                return end
+            if self.error is not None:
+                raise self.error
+            await self._changed.wait()
+
+    def next_chunk(self, pending: List[Tuple[int, int]]) -> Tuple[int, int]:
+        """从 pending（按起点排序）中取出下一个要下载的分块：播放位置所在或其后的第一个，之后没有时取最前面的。"""
+        for i, (start, end) in enumerate(pending):
+            if end >= self.position:
+                return pending.pop(i)
+        return pending.pop(0)
+
+
+class StreamServer:
+    """
+    本机播放服务：任意路径都返回同一个文件，支持 HEAD、Range（含 bytes=-N）与 keep-alive；
+    读取尚未下载的区间时等待，不返回占位数据。
+    on_error：处理请求出错（播放器正常断开除外）时回调，未给出时输出到标准错误。
+    """
+
+    def __init__(
+        self,
+        state: StreamState,
+        name: str = "video.mp4",
+        host: str = "127.0.0.1",
+        on_error: Optional[Callable[[BaseException], None]] = None,
+    ):
+        self.state = state
+        self.name = name
+        self.host = host
+        self.on_error = on_error
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def url(self) -> str:
+        port = self._server.sockets[0].getsockname()[1] if self._server else 0
+        return f"http://{self.host}:{port}/{quote(self.name)}"
+
+    async def start(self, port: int = 0) -> "StreamServer":
+        self._server = await asyncio.start_server(self._handle, self.host, port)
+        return self
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                method = line.decode("latin-1").split(" ", 1)[0].upper()
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    k, _, v = h.decode("latin-1").partition(":")
+                    headers[k.strip().lower()] = v.strip()
+                if not await self._respond(method, headers, writer):
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            # 播放器断开连接（跳转、关闭）
+            pass
+        except Exception as e:
+            # 下载失败等：记录后断开，播放器会报错或重试
+            if self.on_error is not None:
+                self.on_error(e)
+            else:
+                print(f"播放服务出错: {e}", file=sys.stderr)
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _head(writer: asyncio.StreamWriter, status: str, headers: dict) -> None:
+        lines = [f"HTTP/1.1 {status}", *(f"{k}: {v}" for k, v in headers.items()), "", ""]
+        writer.write("\r\n".join(lines).encode("latin-1"))
+
+    async def _respond(self, method: str, headers: dict, writer: asyncio.StreamWriter) -> bool:
+        """处理一个请求，返回是否保持连接。"""
+        if method not in ("GET", "HEAD"):
+            self._head(writer, "405 Method Not Allowed", {"Content-Length": 0, "Allow": "GET, HEAD"})
+            await writer.drain()
+            return False
+        state = self.state
+        await state.ready()
+        total = state.total
+        start, end, partial = 0, total - 1, False
+        m = _RANGE_RE.fullmatch(headers.get("range", "").strip())
+        if m and (m.group(1) or m.group(2)):
+            partial = True
+            if m.group(1):
+                start = int(m.group(1))
+                end = min(int(m.group(2)), total - 1) if m.group(2) else total - 1
+            else:
+                start = max(0, total - int(m.group(2)))
+            if start >= total or start > end:
+                self._head(writer, "416 Range Not Satisfiable", {"Content-Range": f"bytes */{total}", "Content-Length": 0})
+                await writer.drain()
+                return True
+        head = {
+            "Content-Type": "video/mp4",
+            "Accept-Ranges": "bytes",
+            "Content-Length": end - start + 1,
+            "Connection": "keep-alive",
+        }
+        if partial:
+            head["Content-Range"] = f"bytes {start}-{end}/{total}"
+        self._head(writer, "206 Partial Content" if partial else "200 OK", head)
+        if method == "HEAD":
+            await writer.drain()
+            return True
+        loop = asyncio.get_running_loop()
+        pos = start
+        while pos <= end:
+            ready_end = await state.wait_readable(pos)
+            n = min(end, ready_end, pos + STREAM_READ_BYTES - 1) - pos + 1
+            path = state.path
+            try:
+                data = await loop.run_in_executor(None, _read_at, path, pos, n)
+            except FileNotFoundError:
+                # 文件正被重命名或搬运（.part -> 最终文件名）：等 finish() 给出新路径后重读
+                if state.path == path:
+                    await state.changed()
+                continue
+            if not data:
+                raise ConnectionError("读取到文件末尾")
+            writer.write(data)
+            await writer.drain()
+            pos += len(data)
+        return True
@@ -0,0 +1,93 @@
+"""
+增量同步状态：按列表 URL 记录已见视频 ID 及完成状态，
+重复运行同一列表时只解析、下载新增或尚未完成的视频。
+"""
+import json
+import time
+from pathlib import Path
+from typing import AsyncIterable, AsyncIterator, Iterable, List, Optional
+
+from .config import DEFAULT_SYNC_STATE_FILE, SYNC_SAVE_EVERY, SYNC_SAVE_INTERVAL
+from .file_manager import atomic_write_text
+from .parser import video_id_from_url
+
+STATUS_SEEN = "seen"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+class SyncState:
+    """
+    JSON 状态文件：{"lists": {list_url: {"updated": ts, "videos": {video_id: {"status", "title", "updated"}}}}}。
+    状态变化分批原子写回（临时文件 + os.replace）：累积 SYNC_SAVE_EVERY 条或超过 SYNC_SAVE_INTERVAL 秒写一次，
+    用完后调用 flush() 写回剩余变化；中断最多丢失最近一批记录（对应视频下次重新检查），不会损坏已有记录。
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path or DEFAULT_SYNC_STATE_FILE)
+        self._data: dict = {"lists": {}}
+        if self.path.exists():
+            try:
+                self._data = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                self._data = {"lists": {}}
+        self._data.setdefault("lists", {})
+        self._dirty = 0
+        self._saved_at = time.monotonic()
+
+    def _videos(self, list_url: str) -> dict:
+        entry = self._data["lists"].setdefault(list_url.strip(), {"updated": 0, "videos": {}})
+        return entry.setdefault("videos", {})
+
+    def save(self) -> None:
+        atomic_write_text(self.path, json.dumps(self._data, ensure_ascii=False, indent=1))
+        self._dirty = 0
+        self._saved_at = time.monotonic()
+
+    def flush(self) -> None:
+        """写回尚未保存的状态变化。"""
+        if self._dirty:
+            self.save()
+
+    def is_done(self, list_url: str, video_url: str) -> bool:
+        vid = video_id_from_url(video_url) or video_url
+        return self._videos(list_url).get(vid, {}).get("status") == STATUS_DONE
+
+    def _set(self, list_url: str, video_url: str, status: str, title: Optional[str] = None) -> None:
+        vid = video_id_from_url(video_url) or video_url
+        rec = self._videos(list_url).setdefault(vid, {})
+        # 已完成的不因再次出现在列表中而降级
+        if rec.get("status") == STATUS_DONE and status == STATUS_SEEN:
+            return
+        now = int(time.time())
+        rec["status"] = status
+        rec["updated"] = now
+        if title:
+            rec["title"] = title
+        self._data["lists"][list_url.strip()]["updated"] = now
+
+    def mark(self, list_url: str, video_url: str, status: str, title: Optional[str] = None) -> None:
+        """记录单个视频状态；累积到一批或距上次写回超时时写回文件。"""
+        self._set(list_url, video_url, status, title)
+        self._dirty += 1
+        if self._dirty >= SYNC_SAVE_EVERY or time.monotonic() - self._saved_at >= SYNC_SAVE_INTERVAL:
+            self.save()
+
+    def filter_new(self, list_url: str, video_urls: Iterable[str]) -> List[str]:
+        """返回尚未完成的视频链接，并把新出现的标记为已见。"""
+        pending = [u for u in video_urls if not self.is_done(list_url, u)]
+        for u in pending:
+            self._set(list_url, u, STATUS_SEEN)
+        self.save()
+        return pending
+
+    async def filter_new_stream(self, list_url: str, video_urls: AsyncIterable[str]) -> AsyncIterator[str]:
+        """filter_new 的流式版本，用于分页抓取结果。"""
+        try:
+            async for u in video_urls:
+                if not self.is_done(list_url, u):
+                    self.mark(list_url, u, STATUS_SEEN)
+                    yield u
+        finally:
+            if hasattr(video_urls, "aclose"):
+                await video_urls.aclose()
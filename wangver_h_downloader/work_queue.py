@@ -0,0 +1,201 @@
+"""
+多机共享任务队列：SQLite 文件放在共享存储上，多个下载实例各自领取（租约）页面 URL 或已解析目标，
+解析、下载后回报完成；实例崩溃后租约过期，任务被其它实例重新领取。
+"""
+import json
+import os
+import socket
+import sqlite3
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from .config import QUEUE_LEASE_SECONDS, QUEUE_MAX_ATTEMPTS
+from .parser import VideoTarget
+
+KIND_PAGE = "page"
+KIND_TARGET = "target"
+
+STATUS_PENDING = "pending"
+STATUS_LEASED = "leased"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    url         TEXT NOT NULL UNIQUE,
+    kind        TEXT NOT NULL,
+    payload     TEXT,
+    status      TEXT NOT NULL DEFAULT 'pending',
+    worker      TEXT,
+    lease_until REAL NOT NULL DEFAULT 0,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    error       TEXT,
+    updated     REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, lease_until);
+"""
+
+
+@dataclass
+class Job:
+    """领取到的任务：page 为待解析页面 URL；target 附带已解析目标与凭证（payload）。"""
+    id: int
+    url: str
+    kind: str
+    payload: Optional[dict]
+    attempts: int
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class SharedWorkQueue:
+    """
+    基于 SQLite 的租约队列。每个操作单独开事务（BEGIN IMMEDIATE 保证领取的原子性），
+    连接不跨线程复用，可在 asyncio.to_thread 中调用。
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        worker_id: Optional[str] = None,
+        lease_seconds: float = QUEUE_LEASE_SECONDS,
+        max_attempts: int = QUEUE_MAX_ATTEMPTS,
+    ):
+        self.path = Path(path)
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def add_pages(self, urls: Iterable[str]) -> int:
+        """加入待解析页面 URL（已存在的忽略），返回新增数量；urls 可为生成器，逐条写入。"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO jobs (url, kind, updated) VALUES (?, ?, ?)",
+                ((u, KIND_PAGE, now) for u in urls),
+            )
+            conn.execute("COMMIT")
+            return conn.total_changes - before
+
+    def add_targets(self, items: Iterable[Tuple[VideoTarget, Optional[object]]]) -> int:
+        """加入已解析目标（VideoTarget + SessionCredentials），其它实例无需浏览器即可下载。"""
+        now = time.time()
+        rows = []
+        for target, creds in items:
+            payload = {"target": asdict(target), "credentials": asdict(creds) if creds else None}
+            rows.append((target.url, KIND_TARGET, json.dumps(payload, ensure_ascii=False), now))
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            before = conn.total_changes
+            conn.executemany("INSERT OR IGNORE INTO jobs (url, kind, payload, updated) VALUES (?, ?, ?, ?)", rows)
+            conn.execute("COMMIT")
+            return conn.total_changes - before
+
+    def lease(self, limit: int = 1) -> List[Job]:
+        """领取至多 limit 个待处理或租约已过期的任务。"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT id, url, kind, payload, attempts FROM jobs "
+                "WHERE (status = ? OR (status = ? AND lease_until < ?)) AND attempts < ? "
+                "ORDER BY id LIMIT ?",
+                (STATUS_PENDING, STATUS_LEASED, now, self.max_attempts, limit),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE jobs SET status = ?, worker = ?, lease_until = ?, attempts = attempts + 1, updated = ? "
+                "WHERE id = ?",
+                [(STATUS_LEASED, self.worker_id, now + self.lease_seconds, now, r["id"]) for r in rows],
+            )
+            # 租约过期且尝试次数用尽的任务判为失败，避免一直占着队列
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = COALESCE(error, '租约过期次数过多'), updated = ? "
+                "WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                (STATUS_FAILED, now, STATUS_LEASED, now, self.max_attempts),
+            )
+            conn.execute("COMMIT")
+        return [
+            Job(r["id"], r["url"], r["kind"], json.loads(r["payload"]) if r["payload"] else None, r["attempts"] + 1)
+            for r in rows
+        ]
+
+    def heartbeat(self) -> int:
+        """续租本实例持有的全部任务，返回续租数量。"""
+        now = time.time()
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET lease_until = ?, updated = ? WHERE status = ? AND worker = ?",
+                (now + self.lease_seconds, now, STATUS_LEASED, self.worker_id),
+            )
+            return cur.rowcount
+
+    def complete(self, job_id: int, ok: bool, error: Optional[str] = None) -> None:
+        """
+        回报结果；失败且仍有尝试次数的任务退回 pending 由任意实例重试。
+        租约已被其它实例收回时，失败结果不再覆盖对方的状态（成功结果仍然记录，文件已下载完成）。
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT attempts, worker FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if not ok and row is not None and row["worker"] not in (None, self.worker_id):
+                conn.execute("COMMIT")
+                return
+            if ok:
+                status = STATUS_DONE
+            elif row is not None and row["attempts"] < self.max_attempts:
+                status = STATUS_PENDING
+            else:
+                status = STATUS_FAILED
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL, lease_until = 0, error = ?, updated = ? WHERE id = ?",
+                (status, error, now, job_id),
+            )
+            conn.execute("COMMIT")
+
+    def release(self, job_ids: Iterable[int]) -> None:
+        """退还本实例尚未完成的任务（正常退出时调用），不计入尝试次数，其它实例可立即领取。"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "UPDATE jobs SET status = ?, worker = NULL, lease_until = 0, attempts = MAX(attempts - 1, 0), "
+                "updated = ? WHERE id = ? AND status = ? AND worker = ?",
+                [(STATUS_PENDING, now, i, STATUS_LEASED, self.worker_id) for i in job_ids],
+            )
+            conn.execute("COMMIT")
+
+    def stats(self) -> dict:
+        """各状态任务数，如 {"pending": 3, "leased": 2, "done": 10}。"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {r["status"]: r["n"] for r in rows}
+
+    def has_unfinished(self) -> bool:
+        """仍有待处理或被（可能已崩溃的）实例持有的任务。"""
+        s = self.stats()
+        return bool(s.get(STATUS_PENDING) or s.get(STATUS_LEASED))